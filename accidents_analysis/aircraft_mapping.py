@@ -0,0 +1,149 @@
+"""
+Batch job resolving the accident aircraft types to the aircraft catalogue.
+
+The distinct `accidents.aircraft_type` values are resolved to the `aircraft` rows and stored
+in the `aircraft_type_mapping` table (type, aircraft id and main model, match score and
+method), the next runs resolve only the new types. Then `accidents.aircraft_id` is set from
+the mapping, so accidents are joined with the aircraft by an indexed integer key. The
+scrapping pipeline uses the same mapping for the accidents inserted later.
+
+Methods, in the order of precedence:
+    scraped - the main model scraped from the accident page is in the catalogue
+    exact   - the type is equal to a catalogue main model
+    fuzzy   - the best `FuzzyMatcher` match with ratio >= min ratio
+    none    - not resolved, retried with --retry-unmatched (e.g. after the catalogue update)
+
+Usage (from "accidents_analysis" directory, after scrapping both tables):
+    python aircraft_mapping.py --db-config ../db_config.JSON [--min-ratio 0.8]
+"""
+import argparse
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+from utils import FuzzyMatcher, get_pool, normalize_str, read_db_config
+# the scrapping project is on sys.path once utils is imported (see utils.EXTRACTION_DIR)
+from accidents_extraction.mysql_utils import create_table, select_rows
+
+MAPPING_TABLE = 'aircraft_type_mapping'
+MAPPING_TABLE_DATA = (
+    f"CREATE TABLE `{MAPPING_TABLE}` ("
+    "  `aircraft_type` varchar(200) NOT NULL,"
+    "  `aircraft_id` INT,"
+    "  `aircraft_main_model` varchar(200),"
+    "  `score` FLOAT NOT NULL,"
+    "  `method` varchar(20) NOT NULL,"
+    "  `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,"
+    "  PRIMARY KEY (`aircraft_type`),"
+    "  KEY `aircraft_id` (`aircraft_id`)"
+    ") ENGINE=InnoDB"
+)
+
+UPDATE_ACCIDENTS = (
+    f"UPDATE `accidents` a JOIN `{MAPPING_TABLE}` m ON a.`aircraft_type` = m.`aircraft_type` "
+    "SET a.`aircraft_id` = m.`aircraft_id` "
+    "WHERE NOT a.`aircraft_id` <=> m.`aircraft_id`"
+)
+
+
+def resolve_types(scraped_models: Dict[str, Counter],
+                  catalogue: Dict[str, int],
+                  min_ratio: float = 0.8) -> List[Tuple]:
+    """
+    Returns (aircraft type, aircraft id, main model, score, method) rows for the given
+    aircraft type -> counts of the scraped main models mapping and main model -> aircraft id
+    catalogue.
+    """
+    rows, unresolved = [], []
+    by_normalized_model = {normalize_str(model): model for model in catalogue}
+    for aircraft_type, models in scraped_models.items():
+        scraped = [model for model, _ in models.most_common() if model in catalogue]
+        exact = by_normalized_model.get(normalize_str(aircraft_type))
+        if scraped:
+            rows.append((aircraft_type, catalogue[scraped[0]], scraped[0], 1., 'scraped'))
+        elif exact:
+            rows.append((aircraft_type, catalogue[exact], exact, 1., 'exact'))
+        else:
+            unresolved.append(aircraft_type)
+
+    matcher = FuzzyMatcher(catalogue)
+    for aircraft_type, matches in zip(unresolved, matcher.match_many(unresolved, 1, min_ratio)):
+        if matches:
+            [(model, score)] = matches
+            rows.append((aircraft_type, catalogue[model], model, score, 'fuzzy'))
+        else:
+            rows.append((aircraft_type, None, None, 0., 'none'))
+    return rows
+
+
+def update_mapping(db_config: Dict,
+                   min_ratio: float = 0.8,
+                   retry_unmatched: bool = False,
+                   rebuild: bool = False) -> Counter:
+    """
+    Resolves the aircraft types which are not in the mapping table yet (all types if
+    `rebuild`, also the unresolved ones if `retry_unmatched`), stores them and updates
+    `accidents.aircraft_id`. Returns the number of the resolved types per method.
+    """
+    with get_pool(db_config).connection() as cnx:
+        cursor = cnx.cursor()
+        try:
+            create_table(cursor, MAPPING_TABLE, MAPPING_TABLE_DATA)
+
+            mapped = dict(select_rows(
+                cursor, f"SELECT `aircraft_type`, `method` FROM `{MAPPING_TABLE}`"
+            ))
+            if rebuild:
+                mapped = {}
+            elif retry_unmatched:
+                mapped = {t: method for t, method in mapped.items() if method != 'none'}
+
+            scraped_models = defaultdict(Counter)
+            for aircraft_type, model, count in select_rows(
+                cursor,
+                "SELECT `aircraft_type`, `aircraft_main_model`, COUNT(*) FROM `accidents` "
+                "GROUP BY `aircraft_type`, `aircraft_main_model`"
+            ):
+                if aircraft_type not in mapped:
+                    scraped_models[aircraft_type][model] += count
+            catalogue = dict(select_rows(
+                cursor, "SELECT `aircraft_main_model`, `aircraft_id` FROM `aircraft`"
+            ))
+
+            rows = resolve_types(scraped_models, catalogue, min_ratio)
+            cursor.executemany(
+                f"INSERT INTO `{MAPPING_TABLE}` "
+                "(`aircraft_type`, `aircraft_id`, `aircraft_main_model`, `score`, `method`) "
+                "VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+                "`aircraft_id` = VALUES(`aircraft_id`), "
+                "`aircraft_main_model` = VALUES(`aircraft_main_model`), "
+                "`score` = VALUES(`score`), `method` = VALUES(`method`)",
+                rows
+            )
+            cursor.execute(UPDATE_ACCIDENTS)
+            cnx.commit()
+        except Exception:
+            cnx.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    return Counter(row[-1] for row in rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db-config', type=str, required=True,
+                        help='The path of database config file in json format.')
+    parser.add_argument('--min-ratio', type=float, default=0.8,
+                        help='The minimal match ratio of the fuzzy matched types.')
+    parser.add_argument('--retry-unmatched', action='store_true',
+                        help='Resolve again the types which were not resolved before.')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Resolve again all types.')
+    args = parser.parse_args()
+
+    resolved = update_mapping(
+        read_db_config(args.db_config), args.min_ratio, args.retry_unmatched, args.rebuild
+    )
+    print(f'{sum(resolved.values())} aircraft types resolved: '
+          + ', '.join(f'{method} {count}' for method, count in sorted(resolved.items())))
@@ -0,0 +1,151 @@
+"""
+Benchmark of the derived analysis columns.
+
+Compares the row-wise `.apply` implementation of the notebook (`get_time_range`,
+`get_age_range`, `get_nature_group` and the decade lambda) with the vectorized `features`
+module on a synthetic frame shaped like the accidents table, and checks that both give the
+same values.
+
+Usage (from "accidents_analysis" directory):
+    python -m benchmarks.bench_features [--rows 1000000]
+"""
+import argparse
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+
+import features
+
+NATURES = [
+    'Passenger - Scheduled', 'Passenger - Non-Scheduled/charter/Air Taxi', 'Cargo', 'Military',
+    'Training', 'Executive', 'Private', 'Test', 'Unknown', 'Agricultural', 'Survey/research',
+    'Aerial Work (Calibration, Photo)', 'Official state flight', 'Ferry/positioning', 'Illegal',
+    None,
+]
+
+
+# notebook implementation
+def get_time_range(x) -> str or np.nan:
+    if pd.isnull(x):
+        return np.nan
+
+    if x < datetime.time(4, 0):
+        return '00:00 - 03:59'
+    elif x < datetime.time(8, 0):
+        return '04:00 - 07:59'
+    elif x < datetime.time(12, 0):
+        return '08:00 - 11:59'
+    elif x < datetime.time(16, 0):
+        return '12:00 - 15:59'
+    elif x < datetime.time(20, 0):
+        return '16:00 - 19:59'
+    else:
+        return '20:00 - 23:59'
+
+
+def get_age_range(age) -> str or np.nan:
+    if pd.isnull(age):
+        return np.nan
+
+    if age < 1:
+        return '0 - 1'
+    elif age < 3:
+        return '1 - 3'
+    elif age < 5:
+        return '3 - 5'
+    elif age < 10:
+        return '5 - 10'
+    elif age < 20:
+        return '10 - 20'
+    elif age < 30:
+        return '20 - 30'
+    elif age < 50:
+        return '30 - 50'
+    else:
+        return '> 50'
+
+
+def get_nature_group(x) -> str:
+    if pd.isnull(x):
+        return 'Unknown'
+
+    if x in ('Military', 'Unknown', 'Test', 'Cargo', 'Private', 'Official state flight', ):
+        return x
+    elif x in ('Executive', 'Training'):
+        return 'Training / Executive'
+    elif 'Passenger' in x:
+        return 'Passenger'
+    elif x in ('Agricultural', 'Survey/research', 'Aerial Work (Calibration, Photo)'):
+        return 'Scientific'
+    else:
+        return 'Other'
+
+
+def legacy_features(df: pd.DataFrame) -> pd.DataFrame:
+    output = pd.DataFrame(index=df.index)
+
+    time_of_day = df['time'].apply(lambda x: np.nan if pd.isnull(x) else str(x)[-8:])
+    time_of_day = pd.to_datetime(time_of_day, format='%H:%M:%S').dt.time
+    output['time_range'] = time_of_day.apply(get_time_range)
+
+    output['decade'] = (df['year'] // 10 * 10).apply(lambda x: f'{x}s')
+
+    age = (df['year'] - df['first_flight']).apply(lambda x: np.nan if x < 0 or np.isnan(x) else x)
+    output['aircraft_age_range'] = age.apply(get_age_range)
+
+    output['nature_group'] = df['nature'].apply(get_nature_group)
+    return output
+
+
+def vectorized_features(df: pd.DataFrame) -> pd.DataFrame:
+    output = pd.DataFrame(index=df.index)
+    output['time_range'] = features.time_range(df['time'])
+    output['decade'] = features.decade(df['year'])
+    age = features.aircraft_age(df['year'], df['first_flight'])
+    output['aircraft_age_range'] = features.age_range(age)
+    output['nature_group'] = features.nature_group(df['nature'])
+    return output
+
+
+def synthetic_accidents(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Frame with the raw columns as loaded from MySQL: TIME as timedelta, nullable values."""
+    rng = np.random.default_rng(seed)
+    seconds = rng.integers(0, 86400, n_rows).astype(float)
+    seconds[rng.random(n_rows) < 0.3] = np.nan
+    first_flight = rng.integers(1900, 2020, n_rows).astype(float)
+    first_flight[rng.random(n_rows) < 0.2] = np.nan
+    return pd.DataFrame({
+        'time': pd.to_timedelta(seconds, unit='s'),
+        'year': rng.integers(1920, 2020, n_rows),
+        'first_flight': first_flight,
+        'nature': pd.Categorical(rng.choice(np.array(NATURES, dtype=object), n_rows)),
+    })
+
+
+def check_equivalence(df: pd.DataFrame):
+    legacy, vectorized = legacy_features(df), vectorized_features(df)
+    for column in legacy:
+        expected = legacy[column].astype(object).where(legacy[column].notna(), None)
+        actual = vectorized[column].astype(object).where(vectorized[column].notna(), None)
+        assert expected.equals(actual), column
+
+
+def timed(function, df: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    function(df)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    check_equivalence(synthetic_accidents(10000))
+
+    df = synthetic_accidents(args.rows)
+    before, after = timed(legacy_features, df), timed(vectorized_features, df)
+    print(f'{args.rows:,} rows: row-wise {before:.2f}s, vectorized {after:.3f}s, '
+          f'speedup {before / after:.0f}x')
@@ -0,0 +1,92 @@
+"""
+Benchmark of the fuzzy aircraft model matching.
+
+Matches synthetic accident aircraft types (catalogue models with typos, suffixes and
+variant numbers) against a synthetic aircraft catalogue once with `str2iter_match_ratio`
+(edit distance with every candidate) and once with `FuzzyMatcher`, and checks that both
+find matches of the same ratio, also with `min_ratio` pruning for queries repeating their
+n-grams.
+
+Usage (from "accidents_analysis" directory):
+    python -m benchmarks.bench_matcher [--candidates 3000] [--queries 2000]
+"""
+import argparse
+import random
+import string
+import time
+
+from utils import FuzzyMatcher, str2iter_match_ratio
+
+MANUFACTURERS = [
+    'Boeing', 'Douglas', 'Lockheed', 'Antonov', 'Tupolev', 'Ilyushin', 'de Havilland Canada',
+    'Cessna', 'Piper', 'Beechcraft', 'Embraer', 'Fokker', 'Airbus', 'Let', 'Curtiss',
+]
+
+
+def synthetic_catalogue(n_models: int, rng: random.Random) -> list:
+    models = set()
+    while len(models) < n_models:
+        letters = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 3)))
+        models.add(f'{rng.choice(MANUFACTURERS)} {letters}-{rng.randint(1, 999)}')
+    return sorted(models)
+
+
+def synthetic_queries(catalogue: list, n_queries: int, rng: random.Random) -> list:
+    queries = []
+    for _ in range(n_queries):
+        query = list(rng.choice(catalogue))
+        for _ in range(rng.randint(0, 2)):
+            query[rng.randrange(len(query))] = rng.choice(string.ascii_letters)
+        suffix = rng.choice(['', '', 'A', '-100', '.', ' (DC-3)', 'F'])
+        queries.append(''.join(query) + suffix)
+    return queries
+
+
+# candidates and queries repeating their n-grams
+REPEATED_NGRAMS = ['aaaaaa', 'aaaaab', 'abababab', 'Tu-154 Tu-154', 'Let L-410 L-410', 'B-52B-52']
+
+
+def check_repeated_ngrams(catalogue: list):
+    """Checks the pruned `match` against `str2iter_match_ratio` for the repeated n-grams."""
+    candidates = catalogue + REPEATED_NGRAMS
+    matcher = FuzzyMatcher(candidates)
+    for query in REPEATED_NGRAMS + ['aaaaaaa', 'ababab', 'Tu-154 Tu-154 Tu-154', 'B-52B-52B']:
+        _, expected_ratio = str2iter_match_ratio(query, candidates)
+        for min_ratio in (0.5, 0.8, 0.9, 1.):
+            matches = matcher.match(query, min_ratio=min_ratio)
+            actual_ratio = matches[0][1] if matches else None
+            if expected_ratio >= min_ratio:
+                assert actual_ratio is not None and abs(expected_ratio - actual_ratio) < 1e-12, (
+                    query, min_ratio, expected_ratio, actual_ratio
+                )
+            else:
+                assert actual_ratio is None, (query, min_ratio, expected_ratio, actual_ratio)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--candidates', type=int, default=3000)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    catalogue = synthetic_catalogue(args.candidates, rng)
+    queries = synthetic_queries(catalogue, args.queries, rng)
+
+    start = time.perf_counter()
+    expected = [str2iter_match_ratio(query, catalogue) for query in queries]
+    before = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher = FuzzyMatcher(catalogue)
+    indexing = time.perf_counter() - start
+    actual = [matches[0] for matches in matcher.match_many(queries)]
+    after = time.perf_counter() - start
+
+    for query, (_, expected_ratio), (_, actual_ratio) in zip(queries, expected, actual):
+        assert abs(expected_ratio - actual_ratio) < 1e-12, (query, expected_ratio, actual_ratio)
+    check_repeated_ngrams(catalogue)
+
+    print(f'{args.queries:,} queries x {args.candidates:,} candidates: '
+          f'str2iter_match_ratio {before:.2f}s, FuzzyMatcher {after:.2f}s '
+          f'(indexing {indexing:.2f}s), speedup {before / after:.0f}x')
@@ -0,0 +1,99 @@
+"""
+Memory report of the merged accidents frame.
+
+Merges the accidents with the aircraft once as the notebook did (untyped object columns and
+`replace` of the "None" texts over the whole merged frame) and once with the schema dtypes
+applied by the loader (`utils.apply_dtypes`, one pass per column), then prints the dtype and
+the memory of every column of both frames and the time of both ways.
+
+The tables are read from the database with --db-config, synthetic tables are generated from
+the declared schema otherwise.
+
+Usage (from "accidents_analysis" directory):
+    python -m benchmarks.bench_memory [--rows 25000] [--db-config ../db_config.JSON]
+"""
+import argparse
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import TABLE_DTYPES, apply_dtypes, memory_report, read_sql_table
+from accidents_extraction.migrations import ACCIDENTS_VIEW
+import accidents_extraction.schema as schema
+
+# column type -> number of distinct values of the synthetic column
+CARDINALITIES = {'category': 50, 'string': None, 'text': None}
+
+
+def synthetic_column(column_type: str, n_rows: int, rng: np.random.Generator) -> list:
+    """Returns the values of the column as read from MySQL, "None" texts included."""
+    if column_type.startswith('int'):
+        values = rng.integers(0, 100, n_rows).tolist()
+    elif column_type == 'time':
+        values = [datetime.timedelta(seconds=int(s)) for s in rng.integers(0, 86400, n_rows)]
+    elif column_type == 'text':
+        values = [f'Narrative {i} ' + 'text ' * int(rng.integers(20, 80)) for i in range(n_rows)]
+    elif column_type == 'string':
+        values = [f'Location {i}' for i in range(n_rows)]
+    else:
+        values = [f'Value {i}' for i in rng.integers(0, CARDINALITIES[column_type], n_rows)]
+    missing = rng.random(n_rows)
+    return [None if m < 0.05 else 'None' if m < 0.1 and isinstance(v, str) else v
+            for v, m in zip(values, missing)]
+
+
+def synthetic_tables(n_rows: int):
+    rng = np.random.default_rng(0)
+    n_aircraft = max(n_rows // 10, 1)
+    df_accidents = pd.DataFrame({
+        column: synthetic_column(column_type, n_rows, rng)
+        for column, column_type in schema.ACCIDENTS.items()
+    })
+    df_aircraft = pd.DataFrame({
+        column: synthetic_column(column_type, n_aircraft, rng)
+        for column, column_type in schema.AIRCRAFT.items()
+    })
+    df_aircraft['aircraft_id'] = range(n_aircraft)
+    df_accidents['aircraft_id'] = rng.integers(0, n_aircraft, n_rows)
+    return df_accidents, df_aircraft
+
+
+def merge(df_accidents: pd.DataFrame, df_aircraft: pd.DataFrame) -> pd.DataFrame:
+    df_aircraft = df_aircraft.drop(columns=['updated_at'], errors='ignore')
+    df_aircraft.columns = [c if 'aircraft' in c else f'aircraft_{c}' for c in df_aircraft]
+    return pd.merge(left=df_accidents, right=df_aircraft, on='aircraft_id', how='left',
+                    suffixes=('_scraped', ''))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=25000,
+                        help='The number of the synthetic accidents.')
+    parser.add_argument('--db-config', type=str, default=None)
+    args = parser.parse_args()
+
+    if args.db_config:
+        df_accidents = read_sql_table(args.db_config, ACCIDENTS_VIEW, dtypes={})
+        df_aircraft = read_sql_table(args.db_config, 'aircraft', dtypes={})
+    else:
+        df_accidents, df_aircraft = synthetic_tables(args.rows)
+
+    start = time.perf_counter()
+    before = merge(df_accidents.copy(), df_aircraft.copy())
+    before = before.replace({None: np.nan, 'None': np.nan})
+    untyped_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    after = merge(
+        apply_dtypes(df_accidents.copy(), TABLE_DTYPES['accidents']),
+        apply_dtypes(df_aircraft.copy(), TABLE_DTYPES['aircraft']),
+    )
+    typed_seconds = time.perf_counter() - start
+
+    report = memory_report(before, after)
+    with pd.option_context('display.max_rows', None, 'display.width', 120):
+        print(report.to_string(float_format='{:.1f}'.format))
+    print(f'{len(after)} rows, merged in {untyped_seconds:.2f} s untyped with replace, '
+          f'{typed_seconds:.2f} s typed')
@@ -0,0 +1,138 @@
+"""
+Benchmark of the bar chart rendering.
+
+Renders the count of synthetic accidents by year and nature group (100 years x 4 groups)
+with the previous implementation of `plot_countplot` (seaborn counting the row level frame,
+one `annotate` call per bar, copied below), with the current one from the row level frame,
+from the pre-aggregated counts, without the labels and with the legend outside of the axes,
+checks that all of them plot the same bars at the same positions and prints the best render
+time (plot and save as png with the Agg backend). Some years miss a nature group, so the
+counts have empty combinations.
+
+Usage (from "accidents_analysis" directory):
+    python -m benchmarks.bench_plotting [--rows 100000] [--repeat 3]
+"""
+import argparse
+import io
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import seaborn as sns  # noqa: E402
+
+from plotting import count_rows, plot_countplot  # noqa: E402
+
+NATURE_GROUPS = ['Passenger', 'Cargo', 'Military', 'Private']
+
+
+def legacy_countplot(df, x_column, hue_column=None, title=None, figsize=(14, 8), palette=None,
+                     color="darkorange", ylims=None, ticks_rotation=90, ticks_fontsize=10,
+                     output_path=None):
+    title = title if title else f'Count of {x_column}'
+
+    plt.figure(figsize=figsize)
+    plt.title(title, fontweight='bold', fontsize=16)
+    splot = sns.countplot(x=x_column, hue=hue_column, data=df, palette=palette, color=color)
+    for p in splot.patches:
+        splot.annotate(
+            f'{p.get_height():,.0f}',
+            (p.get_x() + p.get_width() / 2., p.get_height()),
+            ha='center',
+            va='center' if ticks_rotation == 0 else 'bottom',
+            xytext=(0, 10),
+            textcoords='offset points',
+            fontweight='bold',
+            rotation=ticks_rotation,
+            fontsize=ticks_fontsize
+        )
+    plt.xticks(rotation=ticks_rotation, fontsize=ticks_fontsize, fontweight='bold')
+    plt.yticks(fontsize=ticks_fontsize, fontweight='bold')
+    plt.xlabel(x_column, fontsize=12, fontweight='bold')
+    plt.ylabel('count', fontsize=12, fontweight='bold')
+
+    if ylims:
+        plt.ylim(*ylims)
+
+    sns.despine()
+    if output_path:
+        plt.savefig(output_path, bbox_inches='tight')
+
+    plt.tight_layout()
+    plt.close()
+
+
+def synthetic_accidents(n_rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'year': rng.integers(1920, 2020, n_rows),
+        'nature_group': pd.Categorical(rng.choice(NATURE_GROUPS, n_rows), NATURE_GROUPS),
+    })
+    # no military accidents in the even years of the 1920s
+    return df[~((df['year'] < 1930) & (df['year'] % 2 == 0) & (df['nature_group'] == 'Military'))]
+
+
+def bar_positions(render) -> list:
+    """Returns the sorted (x center, height) pairs of the bars plotted by the render function."""
+    bars = []
+    original_close = plt.close
+    plt.close = lambda *args: bars.extend(
+        (round(p.get_x() + p.get_width() / 2, 6), p.get_height())
+        for p in plt.gca().patches if p.get_height() > 0
+    )
+    try:
+        render(io.BytesIO())
+    finally:
+        plt.close = original_close
+        plt.close('all')
+    return sorted(bars)
+
+
+def timed(render, repeat: int) -> float:
+    """Returns the best render time out of `repeat` runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render(io.BytesIO())
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_accidents(args.rows)
+    counts = count_rows(df, 'year', 'nature_group')
+    renders = {
+        'legacy, row level': lambda out: legacy_countplot(
+            df, 'year', 'nature_group', output_path=out),
+        'row level': lambda out: plot_countplot(
+            df, 'year', 'nature_group', output_path=out, show=False),
+        'pre-aggregated': lambda out: plot_countplot(
+            counts, 'year', 'nature_group', count_column='count', output_path=out,
+            show=False),
+        'pre-aggregated, no labels': lambda out: plot_countplot(
+            counts, 'year', 'nature_group', count_column='count', output_path=out,
+            show=False, annotate=False),
+        'pre-aggregated, no labels, legend outside': lambda out: plot_countplot(
+            counts, 'year', 'nature_group', count_column='count', output_path=out,
+            show=False, annotate=False, legend_outside=True),
+    }
+
+    expected = bar_positions(renders['legacy, row level'])
+    for name, render in renders.items():
+        assert bar_positions(render) == expected, f'{name}: different bars'
+
+    legacy = timed(renders['legacy, row level'], args.repeat)
+    print(f'{args.rows} rows, {len(expected)} bars')
+    print(f'{"render":<44}{"time, s":>10}{"speedup":>10}')
+    for name, render in renders.items():
+        seconds = legacy if name == 'legacy, row level' else timed(render, args.repeat)
+        print(f'{name:<44}{seconds:>10.2f}{legacy / seconds:>9.1f}x')
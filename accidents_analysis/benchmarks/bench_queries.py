@@ -0,0 +1,92 @@
+"""
+Benchmark of the standard notebook aggregations on the normalized accidents schema.
+
+The accidents are copied from `accidents_view` into a scratch table with the previous,
+denormalized schema (text columns, primary key only). The same aggregation queries are
+timed against the scratch table (before) and against `accidents_view`, i.e. the indexed
+accidents table joined with its lookup tables (after). The scratch table is dropped at the
+end.
+
+Usage (from "accidents_analysis" directory, needs a loaded database):
+    python -m benchmarks.bench_queries --db-config ../db_config.JSON [--repeat 5]
+"""
+import argparse
+import time
+
+from utils import get_pool, read_db_config
+from accidents_extraction.migrations import ACCIDENTS_VIEW
+
+SCRATCH_TABLE = 'bench_accidents_denormalized'
+
+# the aggregations of the notebook charts, "{table}" is replaced with the benchmarked table
+QUERIES = {
+    'accidents by year': (
+        "SELECT `year`, COUNT(*) FROM {table} "
+        "WHERE `year` > 1919 AND `year` < 2020 GROUP BY `year`"
+    ),
+    'passenger fatalities by year': (
+        "SELECT `year`, SUM(`total_fatalities`), COUNT(`total_fatalities`) FROM {table} "
+        "WHERE `year` > 1919 AND `year` < 2020 AND `nature` LIKE 'Passenger%' "
+        "GROUP BY `year`"
+    ),
+    'fatalities by phase': (
+        "SELECT `phase`, SUM(`total_fatalities`), COUNT(`total_fatalities`) FROM {table} "
+        "WHERE `year` > 1919 AND `year` < 2020 GROUP BY `phase`"
+    ),
+    'damage by phase': (
+        "SELECT `phase`, `aircraft_damage`, COUNT(*) FROM {table} "
+        "GROUP BY `phase`, `aircraft_damage`"
+    ),
+    'country, recent years by nature': (
+        "SELECT `nature`, COUNT(*), SUM(`total_fatalities`) FROM {table} "
+        "WHERE `country` = %s AND `year` BETWEEN 2000 AND 2019 GROUP BY `nature`"
+    ),
+    'one year by phase': (
+        "SELECT `phase`, SUM(`total_fatalities`), SUM(`total_occupants`) FROM {table} "
+        "WHERE `year` = 1985 GROUP BY `phase`"
+    ),
+}
+
+
+def timed_query(cursor, query: str, params, repeat: int) -> float:
+    """Returns the best time of the query out of `repeat` runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db-config', type=str, required=True)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--country', type=str, default='U.S.A.',
+                        help='The country of the country filtered query.')
+    args = parser.parse_args()
+
+    with get_pool(read_db_config(args.db_config)).connection() as cnx:
+        cursor = cnx.cursor()
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS `{SCRATCH_TABLE}`")
+            cursor.execute(
+                f"CREATE TABLE `{SCRATCH_TABLE}` (PRIMARY KEY (`id`)) ENGINE=InnoDB "
+                f"SELECT * FROM `{ACCIDENTS_VIEW}`"
+            )
+            cursor.execute(f"ANALYZE TABLE `{SCRATCH_TABLE}`, `accidents`")
+            cursor.fetchall()
+
+            print(f'{"query":<34}{"before, ms":>12}{"after, ms":>12}{"speedup":>10}')
+            for name, query in QUERIES.items():
+                params = (args.country,) if '%s' in query else None
+                before = timed_query(cursor, query.format(table=f'`{SCRATCH_TABLE}`'),
+                                     params, args.repeat)
+                after = timed_query(cursor, query.format(table=f'`{ACCIDENTS_VIEW}`'),
+                                    params, args.repeat)
+                print(f'{name:<34}{before * 1e3:>12.1f}{after * 1e3:>12.1f}'
+                      f'{before / after:>9.1f}x')
+        finally:
+            cursor.execute(f"DROP TABLE IF EXISTS `{SCRATCH_TABLE}`")
+            cursor.close()
@@ -0,0 +1,167 @@
+"""
+In-memory accidents cube.
+
+The accidents frame is aggregated once over the standard analysis dimensions into the base
+cuboid with the same measures as the `accidents_rollup` table of the database: number of
+accidents, number of accidents with known fatalities, fatalities sum and occupants sum (of
+the accidents with known fatalities). Slicing and dicing filter the base cuboid, rolling up
+sums it by fewer dimensions, so the charts never scan the row level data again. Results
+are memoized per (operation, dimensions, measure, filters) and shared by the sub-cubes.
+
+Example:
+    cube = Cube(df)
+    passenger = cube.slice('nature_group', 'Passenger')
+    plot_aggregated_barplot(passenger, 'decade', 'fatalities_sum')
+    plot_lineplot(passenger, 'year', 'death_ratio')
+    plot_category_split_plot(cube, x_column='decade', hue_column='nature_group')
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = (
+    'year', 'decade', 'month', 'weekday', 'time_range', 'phase', 'nature_group',
+    'aircraft_damage', 'aircraft_age_range',
+)
+MEASURES = ('accidents', 'fatalities_count', 'fatalities_sum', 'occupants_sum')
+
+
+def aggregate_accidents(df: pd.DataFrame, dimensions: List[str]) -> pd.DataFrame:
+    """Aggregates row level accidents into the cube measures by the given dimensions."""
+    fatalities = pd.to_numeric(df['total_fatalities'], errors='coerce').astype(float)
+    occupants = pd.to_numeric(df['total_occupants'], errors='coerce').astype(float)
+    measures = pd.DataFrame({
+        'accidents': 1,
+        'fatalities_count': fatalities.notna().astype(int),
+        'fatalities_sum': fatalities.fillna(0),
+        'occupants_sum': occupants.where(fatalities.notna()).fillna(0),
+    }, index=df.index)
+    # the missing dimension values are kept as a group of their own: every dimension is
+    # grouped by its value codes, the missing values get the last code (`groupby(dropna=
+    # False)` needs pandas 1.1)
+    codes, uniques = [], []
+    for dimension in dimensions:
+        dimension_codes, dimension_uniques = pd.factorize(df[dimension], sort=True)
+        codes.append(np.where(dimension_codes < 0, len(dimension_uniques), dimension_codes))
+        uniques.append(pd.Series(dimension_uniques))
+    aggregated = measures.groupby(codes).sum()
+
+    base = aggregated.reset_index(drop=True)
+    group_codes = (aggregated.index.get_level_values(i) for i in range(len(dimensions)))
+    for i, (dimension, dimension_codes) in enumerate(zip(dimensions, group_codes)):
+        base.insert(i, dimension, uniques[i].reindex(dimension_codes).reset_index(drop=True))
+    return base
+
+
+class Cube(object):
+    """
+    Accidents aggregated over the standard dimensions (the ones present in the frame), with
+    slice / dice / roll-up operations returning frames which the plot functions consume.
+    """
+
+    def __init__(self, df: pd.DataFrame = None, dimensions: Tuple[str] = DIMENSIONS,
+                 base: pd.DataFrame = None):
+        if base is None:
+            dimensions = [d for d in dimensions if d in df.columns]
+            base = aggregate_accidents(df, dimensions)
+        self.base = base
+        self.dimensions = [d for d in base.columns if d not in MEASURES]
+        self.filters = {}
+        self.cache = {}
+
+    @classmethod
+    def from_rollup(cls, rollup: pd.DataFrame) -> 'Cube':
+        """Creates the cube from the `accidents_rollup` table rows (see `rollup.py`)."""
+        return cls(base=rollup[[c for c in rollup.columns if c not in (
+            'fatalities_per_accident', 'death_ratio'
+        )]])
+
+    def _key(self, *args) -> tuple:
+        return args + (tuple(sorted(self.filters.items())),)
+
+    def _memoized(self, key: tuple, compute):
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
+
+    def dice(self, **filters) -> 'Cube':
+        """Returns the sub-cube with dimensions restricted to the value or list of values."""
+        unknown = set(filters) - set(self.dimensions)
+        if unknown:
+            raise ValueError(f'Unknown cube dimensions: {sorted(unknown)}.')
+
+        cube = Cube(base=self.base)
+        cube.cache = self.cache
+        cube.filters = dict(self.filters)
+        for dimension, values in filters.items():
+            values = tuple(values) if isinstance(values, (list, tuple, set)) else (values,)
+            cube.filters[dimension] = values
+        return cube
+
+    def slice(self, dimension: str, value) -> 'Cube':
+        """Returns the sub-cube with the dimension fixed to a single value."""
+        return self.dice(**{dimension: value})
+
+    @property
+    def cells(self) -> pd.DataFrame:
+        """The base cuboid cells passing the filters."""
+
+        def compute():
+            mask = pd.Series(True, index=self.base.index)
+            for dimension, values in self.filters.items():
+                mask &= self.base[dimension].isin(values)
+            return self.base[mask]
+
+        return self._memoized(self._key('cells'), compute)
+
+    def rollup(self, dimensions: List[str]) -> pd.DataFrame:
+        """
+        Returns the measures summed by the given dimensions with the derived
+        fatalities_per_accident and death_ratio (fatalities per occupant) columns.
+        """
+        dimensions = [d for d in dimensions if d]
+
+        def compute():
+            cells = self.cells
+            if dimensions:
+                df = cells.groupby(dimensions, observed=True)[list(MEASURES)].sum()
+                df = df.reset_index()
+            else:
+                df = cells[list(MEASURES)].sum().to_frame().T
+            df['fatalities_per_accident'] = df['fatalities_sum'] / df['fatalities_count']
+            df['death_ratio'] = df['fatalities_sum'] / df['occupants_sum']
+            return df
+
+        return self._memoized(self._key('rollup', tuple(dimensions)), compute)
+
+    def split(self, x_dimension: str, by_dimension: str, measure: str = 'accidents',
+              normalize: bool = True) -> pd.DataFrame:
+        """
+        Returns the measure by x (index) and by (columns), normalized to the share of every
+        `by` value in the x value if `normalize`, as the stacked split plots expect.
+        """
+
+        def compute():
+            df = self.rollup([x_dimension, by_dimension])
+            df = df.pivot(index=x_dimension, columns=by_dimension, values=measure).fillna(0)
+            if normalize:
+                df = df.div(df.sum(axis=1), axis=0)
+            return df
+
+        return self._memoized(
+            self._key('split', x_dimension, by_dimension, measure, normalize), compute
+        )
+
+    def share(self, x_dimension: str, by_dimension: str,
+              measure: str = 'accidents') -> pd.DataFrame:
+        """Returns the split as (x, by, percentage) rows, as the normalised bar plots expect."""
+
+        def compute():
+            df = self.split(x_dimension, by_dimension, measure).stack().rename('percentage')
+            return df[df > 0].reset_index()
+
+        return self._memoized(self._key('share', x_dimension, by_dimension, measure), compute)
+
+    def cache_info(self) -> Dict[str, int]:
+        return {'base_cells': len(self.base), 'memoized_results': len(self.cache)}
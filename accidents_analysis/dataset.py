@@ -0,0 +1,177 @@
+"""
+Analysis dataset: the accidents merged with the aircraft data and cleaned as in the
+"AccidentsAnalysis" notebook.
+
+Pulling both tables from the database and cleaning them takes much longer than the analysis
+itself, so the cleaned frame is saved as an Arrow IPC file snapshot, keyed by a fingerprint
+of the source tables (row count, max id and max update time). While the database does not
+change, `load_dataset` reads the snapshot instead of querying the database: the file is
+memory-mapped and converted into pandas columns in one pass, which copies the data once but
+skips the queries and the cleaning.
+
+Example:
+    from dataset import load_dataset
+    df = load_dataset('../db_config.JSON')
+"""
+import glob
+import hashlib
+import os
+from typing import Dict, Tuple
+
+import mysql.connector
+import pandas as pd
+import pyarrow as pa
+from mysql.connector import errorcode
+
+import features
+from utils import get_pool, read_db_config, read_sql_table
+from accidents_extraction.migrations import ACCIDENTS_VIEW, LOOKUP_COLUMNS
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'snapshots')
+
+# increase when the cleaning changes, so the snapshots of the previous cleaning are not used
+CLEANING_VERSION = 5
+
+# aggregates describing the state of the table, the tables without `updated_at` column
+# (loaded by older versions of the scrapper) are described by the first ones only
+FINGERPRINT_AGGREGATES = {
+    'accidents': ('COUNT(*)', 'MAX(`id`)', 'MAX(`updated_at`)'),
+    'aircraft': ('COUNT(*)', 'MAX(`updated_at`)'),
+}
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def clean_dataset(df_accidents: pd.DataFrame, df_aircraft: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merges accidents with the aircraft data and adds the derived analysis columns. The frames
+    are expected with the table dtypes applied by the loader (`utils.read_sql_table`).
+    """
+    df_aircraft = df_aircraft.drop(columns=['updated_at'], errors='ignore')
+    df_aircraft.columns = [c if 'aircraft' in c else f'aircraft_{c}' for c in df_aircraft]
+
+    if 'aircraft_id' in df_accidents and 'aircraft_id' in df_aircraft:
+        # join by the aircraft id resolved by "aircraft_mapping.py", the scraped main model
+        # is kept for the accidents which are not resolved
+        df = pd.merge(left=df_accidents, right=df_aircraft, on='aircraft_id', how='left',
+                      suffixes=('_scraped', ''))
+        df['aircraft_main_model'] = df['aircraft_main_model'].astype(object).fillna(
+            df.pop('aircraft_main_model_scraped').astype(object)
+        ).astype('category')
+    else:
+        df = pd.merge(left=df_accidents, right=df_aircraft, on='aircraft_main_model', how='left')
+    df = df.drop(columns=['updated_at'] + [f'{c}_id' for c in LOOKUP_COLUMNS], errors='ignore')
+
+    # selecting only full years
+    df = df[pd.notna(df['year'])]
+    df = df[(df['year'] > 1919) & (df['year'] < 2020)]
+
+    df['time_range'] = features.time_range(df['time'])
+    df = df.drop(columns=['time'])
+
+    df['weekday'] = pd.Categorical(df['weekday'], categories=WEEKDAYS, ordered=True)
+
+    df['year'] = df['year'].astype(int)
+    df['decade'] = features.decade(df['year'])
+
+    df['aircraft_age'] = features.aircraft_age(df['year'], df['first_flight'])
+    df['aircraft_age_range'] = features.age_range(df['aircraft_age'])
+    df = df.drop(columns=['first_flight'])
+
+    df['aircraft_damage'] = (
+        df['aircraft_damage'].astype(object).replace({'Missing': 'Unknown'}).astype('category')
+    )
+    df['nature_group'] = features.nature_group(df['nature'])
+    return df.reset_index(drop=True)
+
+
+def _table_state(cursor, table_name: str) -> Tuple:
+    aggregates = FINGERPRINT_AGGREGATES[table_name]
+    try:
+        cursor.execute(f"SELECT {', '.join(aggregates)} FROM `{table_name}`")
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_BAD_FIELD_ERROR:
+            raise
+        aggregates = [a for a in aggregates if 'updated_at' not in a]
+        cursor.execute(f"SELECT {', '.join(aggregates)} FROM `{table_name}`")
+    return cursor.fetchone()
+
+
+def tables_fingerprint(db_config: Dict) -> str:
+    """Returns fingerprint of the accidents and aircraft tables and of the cleaning version."""
+    with get_pool(db_config).connection() as cnx:
+        cursor = cnx.cursor()
+        try:
+            state = [_table_state(cursor, table) for table in sorted(FINGERPRINT_AGGREGATES)]
+        finally:
+            cursor.close()
+
+    state.append(CLEANING_VERSION)
+    return hashlib.sha1(repr(state).encode()).hexdigest()[:16]
+
+
+def write_snapshot(df: pd.DataFrame, path: str):
+    """Writes the frame into Arrow IPC file, atomically replacing the existing file."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    temp_path = f'{path}.tmp'
+    with pa.OSFile(temp_path, 'wb') as sink:
+        writer = pa.RecordBatchFileWriter(sink, table.schema)
+        writer.write_table(table)
+        writer.close()
+    os.replace(temp_path, path)
+
+
+def read_snapshot(path: str) -> pd.DataFrame:
+    """
+    Reads the frame from Arrow IPC file. The file is memory-mapped, so Arrow does not read it
+    into its own buffers, but the conversion to pandas copies the columns (the codes of the
+    categorical columns explicitly): the frame is writable and does not depend on the file,
+    the load time grows with the size of the data.
+    """
+    with pa.memory_map(path, 'r') as source:
+        df = pa.ipc.open_file(source).read_all().to_pandas()
+    # recent pyarrow versions do not copy the codes of the categorical columns, which are
+    # read-only then
+    for column in df.select_dtypes('category').columns:
+        df[column] = df[column].copy()
+    return df
+
+
+def snapshot_path(fingerprint: str, snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    return os.path.join(snapshot_dir, f'dataset-{fingerprint}.arrow')
+
+
+def ensure_snapshot(db_config_path: str,
+                    snapshot_dir: str = SNAPSHOT_DIR,
+                    refresh: bool = False) -> str:
+    """
+    Returns the path of the snapshot of the current database state. If it does not exist
+    (or `refresh`), the dataset is loaded from the database, cleaned and saved as the new
+    snapshot, replacing the outdated ones.
+    """
+    db_config = read_db_config(db_config_path)
+    path = snapshot_path(tables_fingerprint(db_config), snapshot_dir)
+    if os.path.exists(path) and not refresh:
+        return path
+
+    df = clean_dataset(
+        read_sql_table(db_config_path, ACCIDENTS_VIEW),
+        read_sql_table(db_config_path, 'aircraft'),
+    )
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    write_snapshot(df, path)
+    for outdated_path in glob.glob(snapshot_path('*', snapshot_dir)):
+        if outdated_path != path:
+            os.remove(outdated_path)
+    return path
+
+
+def load_dataset(db_config_path: str,
+                 snapshot_dir: str = SNAPSHOT_DIR,
+                 refresh: bool = False) -> pd.DataFrame:
+    """
+    Returns the cleaned analysis dataset, read from the snapshot of the current database
+    state (see `ensure_snapshot`).
+    """
+    return read_snapshot(ensure_snapshot(db_config_path, snapshot_dir, refresh))
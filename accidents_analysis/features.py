@@ -0,0 +1,88 @@
+"""
+Derived analysis columns.
+
+All features are computed for the whole column at once: numeric ranges are binned with
+`pd.cut` and text groups are resolved once per distinct value (category) and broadcast to
+the rows through the category codes. The results are ordered categoricals, so plots and
+groupbys keep the natural order of the ranges.
+"""
+import numpy as np
+import pandas as pd
+
+TIME_RANGES = [
+    '00:00 - 03:59', '04:00 - 07:59', '08:00 - 11:59',
+    '12:00 - 15:59', '16:00 - 19:59', '20:00 - 23:59',
+]
+TIME_RANGE_BINS = [h * 3600 for h in range(0, 25, 4)]
+
+AGE_RANGES = ['0 - 1', '1 - 3', '3 - 5', '5 - 10', '10 - 20', '20 - 30', '30 - 50', '> 50']
+AGE_RANGE_BINS = [-np.inf, 1, 3, 5, 10, 20, 30, 50, np.inf]
+
+NATURE_GROUPS = {
+    'Military': 'Military',
+    'Unknown': 'Unknown',
+    'Test': 'Test',
+    'Cargo': 'Cargo',
+    'Private': 'Private',
+    'Official state flight': 'Official state flight',
+    'Executive': 'Training / Executive',
+    'Training': 'Training / Executive',
+    'Agricultural': 'Scientific',
+    'Survey/research': 'Scientific',
+    'Aerial Work (Calibration, Photo)': 'Scientific',
+}
+
+
+def time_of_day_seconds(time: pd.Series) -> pd.Series:
+    """
+    Returns seconds since midnight of MySQL TIME values (timedeltas), `datetime.time` values
+    or "HH:MM:SS" strings, missing values are NaN.
+    """
+    if not pd.api.types.is_timedelta64_dtype(time):
+        time = pd.to_timedelta(time.astype(str), errors='coerce')
+    return time.dt.total_seconds() % 86400
+
+
+def time_range(time: pd.Series) -> pd.Series:
+    """Four hours range of the time of day, e.g. "08:00 - 11:59"."""
+    return pd.cut(time_of_day_seconds(time), TIME_RANGE_BINS, right=False, labels=TIME_RANGES)
+
+
+def decade(year: pd.Series) -> pd.Series:
+    """Decade of the year, e.g. "1970s"."""
+    decades = year // 10 * 10
+    if decades.empty:
+        return pd.Series(pd.Categorical([], ordered=True), index=year.index)
+
+    first = int(decades.min())
+    labels = [f'{d}s' for d in range(first, int(decades.max()) + 10, 10)]
+    codes = ((decades - first) // 10).astype(int).to_numpy()
+    return pd.Series(pd.Categorical.from_codes(codes, labels, ordered=True), index=year.index)
+
+
+def aircraft_age(year: pd.Series, first_flight: pd.Series) -> pd.Series:
+    """Years since the first flight of the aircraft model, NaN if unknown or negative."""
+    age = year.astype(float) - first_flight.astype(float)
+    return age.where(age >= 0)
+
+
+def age_range(age: pd.Series) -> pd.Series:
+    """Aircraft age range, e.g. "5 - 10"."""
+    return pd.cut(age, AGE_RANGE_BINS, right=False, labels=AGE_RANGES)
+
+
+def _nature_group(nature) -> str:
+    if pd.isnull(nature):
+        return 'Unknown'
+    if nature in NATURE_GROUPS:
+        return NATURE_GROUPS[nature]
+    return 'Passenger' if 'Passenger' in nature else 'Other'
+
+
+def nature_group(nature: pd.Series) -> pd.Series:
+    """Nature group of the flight: "Passenger", "Cargo", "Military", ..."""
+    nature = nature.astype('category')
+    groups = [_nature_group(x) for x in nature.cat.categories] + [_nature_group(None)]
+    codes = nature.cat.codes.to_numpy()  # -1 for missing, i.e. the last group
+    return pd.Series(np.array(groups, dtype=object)[codes], index=nature.index,
+                     dtype='category')
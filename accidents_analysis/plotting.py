@@ -1,11 +1,104 @@
+import inspect
 from typing import Tuple, Dict, List
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import seaborn as sns
 
+from cube import Cube
 
-def plot_countplot(df: pd.DataFrame,
+
+# the bar plots of aggregated data have no error bars, `ci` argument of seaborn < 0.12
+NO_ERROR_BARS = (
+    {'errorbar': None} if 'errorbar' in inspect.signature(sns.barplot).parameters
+    else {'ci': None}
+)
+
+
+def annotate_bars(ax, precision: int = 0, ticks_rotation: int = 90, ticks_fontsize: int = 10):
+    """
+    Labels the bars with their heights above them. With matplotlib >= 3.4 the labels of every
+    bar container (hue value) are added by one `bar_label` call.
+    """
+    text_kwargs = dict(fontweight='bold', rotation=ticks_rotation, fontsize=ticks_fontsize)
+    if not hasattr(ax, 'bar_label'):
+        for p in ax.patches:
+            ax.annotate(
+                f'{p.get_height():,.{precision}f}',
+                (p.get_x() + p.get_width() / 2., p.get_height()),
+                ha='center',
+                va='center' if ticks_rotation == 0 else 'bottom',
+                xytext=(0, 10),
+                textcoords='offset points',
+                **text_kwargs
+            )
+        return
+
+    # the bottom of the labels is at the same height as the one of the centered labels above
+    padding = 10 if ticks_rotation else max(10 - ticks_fontsize / 2, 0)
+    for container in ax.containers:
+        labels = ['' if pd.isna(v) else f'{v:,.{precision}f}' for v in container.datavalues]
+        ax.bar_label(container, labels=labels, padding=padding, **text_kwargs)
+
+
+def plot_levels(values: pd.Series) -> list:
+    """
+    Returns the levels of the values in the order seaborn plots them: the categories, the
+    sorted numbers or the values in the order of appearance.
+    """
+    if hasattr(values, 'cat'):
+        return list(values.cat.categories)
+    levels = values.dropna().unique()
+    if pd.api.types.is_numeric_dtype(values):
+        levels = np.sort(levels)
+    return list(levels)
+
+
+def count_rows(df: pd.DataFrame, x_column: str, hue_column: str = None) -> pd.DataFrame:
+    """
+    Returns the number of rows (`count` column) by x and hue columns. Every combination of
+    the x and hue levels is counted, the empty ones with 0, so the bars keep the positions
+    (and the zero height bars) of the row level count plot.
+    """
+    keys = [c for c in (x_column, hue_column) if c]
+    counts = df.groupby(keys, observed=True).size()
+    levels = [plot_levels(df[key]) for key in keys]
+    if len(keys) > 1:
+        index = pd.MultiIndex.from_product(levels, names=keys)
+    else:
+        index = pd.Index(levels[0], name=keys[0])
+    df_counts = counts.reindex(index, fill_value=0).rename('count').reset_index()
+    for key in keys:
+        if hasattr(df[key], 'cat'):
+            df_counts[key] = df_counts[key].astype(df[key].dtype)
+    return df_counts
+
+
+def place_legend(ax):
+    """
+    Places the hue legend outside of the axes, on the right. The default "best" location is
+    searched over all bars and labels, which is slow for charts with hundreds of bars.
+    """
+    if ax.get_legend() is not None:
+        ax.legend(loc='upper left', bbox_to_anchor=(1.01, 1))
+
+
+def finish_figure(show: bool = True, tight_layout: bool = False):
+    """
+    Shows the current figure (with tight layout if `tight_layout`) or, in headless rendering,
+    closes it to free its memory. The layout is tightened for showing only, the saved figure
+    is already cropped with bbox_inches='tight'.
+    """
+    if show:
+        if tight_layout:
+            plt.tight_layout()
+        plt.show()
+    else:
+        plt.close()
+
+
+def plot_countplot(df: pd.DataFrame or Cube,
                    x_column: str,
                    hue_column: str = None,
                    title: str = None,
@@ -15,25 +108,34 @@ def plot_countplot(df: pd.DataFrame,
                    ylims: Tuple = None,
                    ticks_rotation: int = 90,
                    ticks_fontsize: int = 10,
-                   output_path: str = None):
-    """Plots count plot."""
+                   output_path: str = None,
+                   show: bool = True,
+                   count_column: str = None,
+                   annotate: bool = True,
+                   legend_outside: bool = False):
+    """
+    Plots count plot. The rows are counted by x and hue columns before plotting, unless the
+    frame is already aggregated with the counts in `count_column` (one row per x and hue
+    value); the counts of a cube are taken from its `accidents` measure. Bars are labelled
+    with the counts if `annotate`. With `legend_outside` the hue legend is placed on the
+    right of the axes instead of the best location, which is faster for many bars.
+    """
     title = title if title else f'Count of {x_column}'
+    if isinstance(df, Cube):
+        df_counts, count_column = df.rollup([x_column, hue_column]), 'accidents'
+    elif count_column:
+        df_counts = df
+    else:
+        df_counts, count_column = count_rows(df, x_column, hue_column), 'count'
 
     plt.figure(figsize=figsize)
     plt.title(title, fontweight='bold', fontsize=16)
-    splot = sns.countplot(x=x_column, hue=hue_column, data=df, palette=palette, color=color)
-    for p in splot.patches:
-        splot.annotate(
-            f'{p.get_height():,.0f}',
-            (p.get_x() + p.get_width() / 2., p.get_height()),
-            ha='center',
-            va='center' if ticks_rotation == 0 else 'bottom',
-            xytext=(0, 10),
-            textcoords='offset points',
-            fontweight='bold',
-            rotation=ticks_rotation,
-            fontsize=ticks_fontsize
-        )
+    splot = sns.barplot(x=x_column, y=count_column, hue=hue_column, data=df_counts,
+                        palette=palette, color=color, **NO_ERROR_BARS)
+    if legend_outside:
+        place_legend(splot)
+    if annotate:
+        annotate_bars(splot, 0, ticks_rotation, ticks_fontsize)
     plt.xticks(rotation=ticks_rotation, fontsize=ticks_fontsize, fontweight='bold')
     plt.yticks(fontsize=ticks_fontsize, fontweight='bold')
     plt.xlabel(x_column, fontsize=12, fontweight='bold')
@@ -46,11 +148,10 @@ def plot_countplot(df: pd.DataFrame,
     if output_path:
         plt.savefig(output_path, bbox_inches='tight')
 
-    plt.tight_layout()
-    plt.show()
+    finish_figure(show, tight_layout=True)
 
 
-def plot_aggregated_barplot(df: pd.DataFrame,
+def plot_aggregated_barplot(df: pd.DataFrame or Cube,
                             x_column: str,
                             y_column: str,
                             aggregation_type: str = None,
@@ -63,8 +164,17 @@ def plot_aggregated_barplot(df: pd.DataFrame,
                             ticks_rotation: int = 90,
                             ticks_fontsize: int = 10,
                             annotation_precision: int = 0,
-                            output_path: str = None):
-    """Plots aggregated numerical column versus categories."""
+                            output_path: str = None,
+                            show: bool = True,
+                            annotate: bool = True,
+                            legend_outside: bool = False):
+    """
+    Plots aggregated numerical column versus categories. For a cube y_column is one of its
+    measures (e.g. fatalities_sum, death_ratio), already aggregated by x and hue columns.
+    Without `aggregation_type` the frame is plotted as it is (seaborn mean and error bars).
+    Bars are labelled with the values if `annotate`, the legend is placed as in
+    `plot_countplot`.
+    """
 
     def hue_aggregation():
         df_agg = (
@@ -77,14 +187,18 @@ def plot_aggregated_barplot(df: pd.DataFrame,
         df_agg.columns = df_agg.columns.droplevel(1)
         return df_agg
 
-    if hue_column:
+    error_bars = NO_ERROR_BARS
+    if isinstance(df, Cube):
+        df_aggregated = df.rollup([x_column, hue_column])
+        title = title if title else f'{y_column} by {x_column}'
+    elif hue_column and aggregation_type:
         df_aggregated = hue_aggregation()
         title = title if title else f'{aggregation_type} {y_column} by {x_column}'
     elif aggregation_type:
         df_aggregated = df.groupby(x_column).agg({y_column: aggregation_type}).reset_index()
         title = title if title else f'{aggregation_type} {y_column} by {x_column}'
     else:
-        df_aggregated = df
+        df_aggregated, error_bars = df, {}
         title = title if title else f'{y_column} by {x_column}'
 
     plt.figure(figsize=figsize)
@@ -95,38 +209,30 @@ def plot_aggregated_barplot(df: pd.DataFrame,
         hue=hue_column,
         data=df_aggregated,
         palette=hue_dict,
-        color=color
+        color=color,
+        **error_bars
     )
     sns.despine()
 
-    for p in splot.patches:
-        splot.annotate(
-            f'{p.get_height():,.{annotation_precision}f}',
-            (p.get_x() + p.get_width() / 2., p.get_height()),
-            ha='center',
-            va='center' if ticks_rotation == 0 else 'bottom',
-            xytext=(0, 10),
-            textcoords='offset points',
-            fontweight='bold',
-            rotation=ticks_rotation,
-            fontsize=ticks_fontsize
-        )
+    if legend_outside:
+        place_legend(splot)
+    if annotate:
+        annotate_bars(splot, annotation_precision, ticks_rotation, ticks_fontsize)
 
     plt.xticks(rotation=ticks_rotation, fontsize=ticks_fontsize, fontweight='bold')
     plt.yticks(fontsize=ticks_fontsize, fontweight='bold')
     plt.xlabel(x_column, fontsize=12, fontweight='bold')
     plt.ylabel(y_column, fontsize=12, fontweight='bold')
-    if output_path:
-        plt.savefig(output_path, bbox_inches='tight')
 
     if ylims:
         plt.ylim(*ylims)
 
-    plt.tight_layout()
-    plt.show()
+    if output_path:
+        plt.savefig(output_path, bbox_inches='tight')
+    finish_figure(show, tight_layout=True)
 
 
-def plot_lineplot(df: pd.DataFrame,
+def plot_lineplot(df: pd.DataFrame or Cube,
                   x_column: str,
                   y_column: str,
                   hue_column: str = None,
@@ -136,8 +242,11 @@ def plot_lineplot(df: pd.DataFrame,
                   figsize: Tuple[int, int] = (14, 8),
                   ticks_rotation: int = 90,
                   ticks_fontsize: int = 10,
-                  output_path: str = None):
+                  output_path: str = None,
+                  show: bool = True):
     title = title if title else f'{y_column} over {x_column}'
+    if isinstance(df, Cube):
+        df = df.rollup([x_column, hue_column])
 
     plt.figure(figsize=figsize)
     plt.title(title, fontweight='bold', fontsize=16)
@@ -159,11 +268,10 @@ def plot_lineplot(df: pd.DataFrame,
 
     if output_path:
         plt.savefig(output_path, bbox_inches='tight')
-    plt.tight_layout()
-    plt.show()
+    finish_figure(show, tight_layout=True)
 
 
-def plot_normalised_barplot(df: pd.DataFrame,
+def plot_normalised_barplot(df: pd.DataFrame or Cube,
                             x_column: str,
                             hue_column: str,
                             title: str = None,
@@ -173,33 +281,29 @@ def plot_normalised_barplot(df: pd.DataFrame,
                             ylims: Tuple = None,
                             ticks_rotation: int = 90,
                             ticks_fontsize: int = 10,
-                            output_path: str = None):
+                            output_path: str = None,
+                            show: bool = True,
+                            annotate: bool = True):
     """
     Plots percentage of every category from hue_column in division of categories from x_column.
+    Bars are labelled with the percentages if `annotate`.
     """
     title = title if title else f'percentage of {hue_column} in {x_column}'
     x, y, hue = x_column, "percentage", hue_column
-    normalized_df = (df[hue_column]
-                     .groupby(df[x])
-                     .value_counts(normalize=True)
-                     .rename(y)
-                     .reset_index())
+    if isinstance(df, Cube):
+        normalized_df = df.share(x, hue)
+    else:
+        normalized_df = (df[hue_column]
+                         .groupby(df[x])
+                         .value_counts(normalize=True)
+                         .rename(y)
+                         .reset_index())
 
     plt.figure(figsize=figsize)
     plt.title(title, fontweight='bold', fontsize=16)
-    ax = sns.barplot(x=x, y=y, hue=hue, data=normalized_df, palette=palette)
-    for p in ax.patches:
-        ax.annotate(
-            format(p.get_height(), '.2f'),
-            (p.get_x() + p.get_width() / 2., p.get_height()),
-            ha='center',
-            va='center' if ticks_rotation == 0 else 'bottom',
-            xytext=(0, 10),
-            textcoords='offset points',
-            fontweight='bold',
-            rotation=ticks_rotation,
-            fontsize=ticks_fontsize
-        )
+    ax = sns.barplot(x=x, y=y, hue=hue, data=normalized_df, palette=palette, **NO_ERROR_BARS)
+    if annotate:
+        annotate_bars(ax, 2, ticks_rotation, ticks_fontsize)
     sns.despine()
 
     if legend:
@@ -207,9 +311,6 @@ def plot_normalised_barplot(df: pd.DataFrame,
     else:
         ax.get_legend().set_visible(False)
 
-    if output_path:
-        plt.savefig(output_path, bbox_inches='tight')
-
     plt.xticks(rotation=ticks_rotation, fontsize=ticks_fontsize, fontweight='bold')
     plt.yticks(fontsize=ticks_fontsize, fontweight='bold')
     plt.xlabel(x, fontsize=12, fontweight='bold')
@@ -218,8 +319,9 @@ def plot_normalised_barplot(df: pd.DataFrame,
     if ylims:
         plt.ylim(*ylims)
 
-    plt.tight_layout()
-    plt.show()
+    if output_path:
+        plt.savefig(output_path, bbox_inches='tight')
+    finish_figure(show, tight_layout=True)
 
 
 def plot_distplot(df: pd.DataFrame,
@@ -230,7 +332,8 @@ def plot_distplot(df: pd.DataFrame,
                   kde: bool = True,
                   legend: bool = True,
                   figsize: Tuple[int, int] = (10, 6),
-                  output_path: str = None):
+                  output_path: str = None,
+                  show: bool = True):
     """Plots distribution of given column."""
     plt.figure(figsize=figsize)
     if hue_column:
@@ -260,16 +363,28 @@ def plot_distplot(df: pd.DataFrame,
     plt.ylabel('Density')
     if output_path:
         plt.savefig(output_path, bbox_inches='tight')
-    plt.show()
+    finish_figure(show)
 
 
-def plot_category_split_plot(df: pd.DataFrame,
+def plot_category_split_plot(df: pd.DataFrame or Cube,
                              figsize: Tuple[int, int] = (12, 6),
                              title: str = None,
                              x_label: str = None,
                              ticks_rotation: int = 90,
                              ticks_fontsize: int = 12,
-                             output_path: str = None):
+                             output_path: str = None,
+                             x_column: str = None,
+                             hue_column: str = None,
+                             show: bool = True):
+    """
+    Plots stacked shares of categories. The frame holds the shares (index - x categories,
+    columns - split categories), for a cube they are taken from its split of x_column by
+    hue_column.
+    """
+    if isinstance(df, Cube):
+        df = df.split(x_column, hue_column)
+        x_label = x_label if x_label else x_column
+
     fig = plt.figure(figsize=figsize)
     ax = fig.add_subplot(111)
 
@@ -293,4 +408,4 @@ def plot_category_split_plot(df: pd.DataFrame,
     if output_path:
         plt.savefig(output_path, bbox_inches='tight')
 
-    plt.show()
+    finish_figure(show)
@@ -0,0 +1,249 @@
+"""
+Headless renderer of the "AccidentsAnalysis" notebook charts.
+
+The dataset snapshot (see `dataset.py`) is created once, then the charts are rendered with
+the Agg backend in a pool of worker processes. Every worker reads the same snapshot
+file, builds the accidents `Cube` once and renders its share of the charts, closing every
+figure after it is saved, so the memory of the workers does not grow with the number of
+charts. The render time of every chart is reported.
+
+Usage (from "accidents_analysis" directory):
+    python report.py --db-config ../db_config.JSON --output-dir report [--format svg]
+    python report.py --snapshot data/snapshots/dataset-<fingerprint>.arrow --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import pandas as pd  # noqa: E402
+
+from cube import Cube  # noqa: E402
+from dataset import SNAPSHOT_DIR, ensure_snapshot, read_snapshot  # noqa: E402
+from features import AGE_RANGES  # noqa: E402
+from plotting import (  # noqa: E402
+    plot_aggregated_barplot,
+    plot_category_split_plot,
+    plot_countplot,
+    plot_lineplot,
+)
+
+PHASES = [
+    'Standing', 'Pushback / towing', 'Taxi', 'Takeoff',
+    'Initial climb', 'En route', 'Maneuvering', 'Approach', 'Landing',
+    'Unknown'
+]
+DAMAGES = ['Minor', 'Substantial', 'Damaged beyond repair', 'Destroyed', 'Unknown']
+
+# the cube of the worker process, built by `_init_worker`
+_cube = None
+
+
+def short_phase(phase: str) -> str:
+    """Strips the phase code, e.g. "Takeoff (TOF)" -> "Takeoff"."""
+    return phase if phase == 'Unknown' else phase[:-6]
+
+
+def phase_shares(cube: Cube) -> pd.DataFrame:
+    """Returns the percentage of the accidents and fatalities of every flight phase."""
+    df = cube.rollup(['phase']).copy()
+    df['accidents_percentage'] = df['fatalities_count'] / df['fatalities_count'].sum() * 100
+    df['fatalities_percentage'] = df['fatalities_sum'] / df['fatalities_sum'].sum() * 100
+    df['phase'] = pd.Categorical(df['phase'].map(short_phase), PHASES)
+    return df
+
+
+def plot_month_counts(cube: Cube, **kwargs):
+    df = cube.rollup(['month']).copy()
+    df['month'] = df['month'].astype(int)
+    plot_countplot(df, 'month', count_column='accidents', figsize=(12, 6), ylims=(0, 800),
+                   ticks_rotation=0, ticks_fontsize=12, **kwargs)
+
+
+def plot_phase_shares(cube: Cube, y_column: str, **kwargs):
+    plot_aggregated_barplot(phase_shares(cube), 'phase', y_column, annotation_precision=2,
+                            ylims=(0, 60), ticks_rotation=35, **kwargs)
+
+
+def plot_damage_by_phase(cube: Cube, **kwargs):
+    df = cube.split('phase', 'aircraft_damage').copy()
+    df.index = pd.CategoricalIndex(df.index.map(short_phase), PHASES)
+    df = df.sort_index().reindex(columns=DAMAGES, fill_value=0)
+    plot_category_split_plot(df, figsize=(12, 6), x_label='flight phase',
+                             ticks_fontsize=12, ticks_rotation=75, **kwargs)
+
+
+def plot_phase_by_age(cube: Cube, **kwargs):
+    df = cube.split('aircraft_age_range', 'phase').copy()
+    df.columns = df.columns.map(short_phase)
+    df = df.reindex(index=[r for r in AGE_RANGES if r in df.index],
+                    columns=[p for p in PHASES if p in df.columns])
+    plot_category_split_plot(df, figsize=(12, 6), x_label='aircraft age',
+                             ticks_fontsize=12, ticks_rotation=75, **kwargs)
+
+
+def _passenger(cube: Cube) -> Cube:
+    return cube.slice('nature_group', 'Passenger')
+
+
+# chart name -> function plotting the chart of the cube, the output path and `show` flag
+# are passed as keyword arguments
+CHARTS: Dict[str, Callable] = {
+    'accidents_by_year': lambda cube, **kw: plot_countplot(
+        cube, 'year', figsize=(18, 8), title='Count of aircraft accidents by Year',
+        ylims=(0, 1700), **kw),
+    'accidents_by_decade': lambda cube, **kw: plot_countplot(
+        cube, 'decade', figsize=(12, 6), title='Count of aircraft accidents by Decade',
+        ylims=(0, 7000), ticks_rotation=0, ticks_fontsize=12, **kw),
+    'nature_by_decade': lambda cube, **kw: plot_category_split_plot(
+        cube, x_column='decade', hue_column='nature_group', figsize=(12, 6),
+        title='Percentage of different Nature Aricraft accidents over Decades',
+        ticks_fontsize=12, ticks_rotation=0, **kw),
+    'fatalities_by_year': lambda cube, **kw: plot_aggregated_barplot(
+        cube, 'year', 'fatalities_sum', figsize=(18, 8), title='Total Fatalities by Year',
+        ylims=(0, 3800), **kw),
+    'fatalities_by_decade': lambda cube, **kw: plot_aggregated_barplot(
+        cube, 'decade', 'fatalities_sum', figsize=(12, 6), title='Total Fatalities by Decade',
+        ylims=(0, 25000), ticks_rotation=0, ticks_fontsize=12, **kw),
+    'fatalities_per_accident_by_year': lambda cube, **kw: plot_lineplot(
+        cube, 'year', 'fatalities_per_accident', figsize=(12, 6),
+        title='Fatalities per Accident over Years', ticks_rotation=0, ticks_fontsize=12,
+        **kw),
+    'death_ratio_by_year': lambda cube, **kw: plot_lineplot(
+        cube, 'year', 'death_ratio', figsize=(12, 6),
+        title='Fatalities vs People Aboard (death ratio)', ticks_rotation=0,
+        ticks_fontsize=12, **kw),
+    'death_ratio_by_time_range': lambda cube, **kw: plot_lineplot(
+        cube, 'time_range', 'death_ratio', figsize=(12, 6),
+        title='Fatalities vs People Aboard (death ratio) by Time Range', ticks_rotation=0,
+        ticks_fontsize=12, **kw),
+    'passenger_accidents_by_year': lambda cube, **kw: plot_countplot(
+        _passenger(cube), 'year', figsize=(18, 8),
+        title='Count of Passenger aircraft accidents by Year', ylims=(0, 200), **kw),
+    'passenger_accidents_by_decade': lambda cube, **kw: plot_countplot(
+        _passenger(cube), 'decade', figsize=(12, 6),
+        title='Count of Passenger aircraft accidents by Decade', ylims=(0, 1500),
+        ticks_rotation=0, ticks_fontsize=12, **kw),
+    'passenger_accidents_by_month': lambda cube, **kw: plot_month_counts(
+        _passenger(cube), title='Count of Passenger aircraft accidents by Month', **kw),
+    'passenger_accidents_by_weekday': lambda cube, **kw: plot_countplot(
+        _passenger(cube), 'weekday', figsize=(12, 6),
+        title='Count of Passenger aircraft accidents by Weekday', ylims=(0, 1200),
+        ticks_rotation=0, ticks_fontsize=11, **kw),
+    'passenger_accidents_by_time_range': lambda cube, **kw: plot_countplot(
+        _passenger(cube), 'time_range', figsize=(12, 6),
+        title='Count of Passenger aircraft accidents by Time Range', ylims=(0, 1200),
+        ticks_rotation=0, ticks_fontsize=12, **kw),
+    'passenger_fatalities_by_year': lambda cube, **kw: plot_aggregated_barplot(
+        _passenger(cube), 'year', 'fatalities_sum', figsize=(18, 8),
+        title='Total Fatalities by Year for Passenger aircraft', ylims=(0, 3000), **kw),
+    'passenger_fatalities_by_decade': lambda cube, **kw: plot_aggregated_barplot(
+        _passenger(cube), 'decade', 'fatalities_sum', figsize=(12, 6),
+        title='Total Fatalities by Decade for Passenger aircraft', ylims=(0, 20000),
+        ticks_rotation=0, ticks_fontsize=12, **kw),
+    'passenger_fatalities_per_accident_by_year': lambda cube, **kw: plot_lineplot(
+        _passenger(cube), 'year', 'fatalities_per_accident', figsize=(12, 6),
+        title='Fatalities per Accident over Years for Passenger aircraft', ticks_rotation=0,
+        ticks_fontsize=12, **kw),
+    'passenger_death_ratio_by_year': lambda cube, **kw: plot_lineplot(
+        _passenger(cube), 'year', 'death_ratio', figsize=(12, 6),
+        title='Fatalities vs People Aboard (death ratio) for Passenger aircraft',
+        ticks_rotation=0, ticks_fontsize=12, **kw),
+    'passenger_death_ratio_by_time_range': lambda cube, **kw: plot_lineplot(
+        _passenger(cube), 'time_range', 'death_ratio', figsize=(12, 6),
+        title='Fatalities vs People Aboard (death ratio) by Time Range for Passenger '
+              'aircraft', ticks_rotation=0, ticks_fontsize=12, **kw),
+    'accidents_by_phase': lambda cube, **kw: plot_phase_shares(
+        cube, 'accidents_percentage', title='Percentage of Accidents over Flight Phase', **kw),
+    'fatalities_by_phase': lambda cube, **kw: plot_phase_shares(
+        cube, 'fatalities_percentage', title='Percentage of Fatalities over Flight Phase',
+        **kw),
+    'passenger_accidents_by_phase': lambda cube, **kw: plot_phase_shares(
+        _passenger(cube), 'accidents_percentage',
+        title='Percentage of Accidents over Flight Phase for Passenger Aircraft', **kw),
+    'passenger_fatalities_by_phase': lambda cube, **kw: plot_phase_shares(
+        _passenger(cube), 'fatalities_percentage',
+        title='Percentage of Fatalities over Flight Phase for Passenger Aircraft', **kw),
+    'damage_by_phase': lambda cube, **kw: plot_damage_by_phase(
+        cube, title='Percentage of different Aircraft Damage over Flight Phase', **kw),
+    'accidents_by_aircraft_age': lambda cube, **kw: plot_countplot(
+        cube, 'aircraft_age_range', figsize=(12, 6),
+        title='Count of aircraft accidents by Aircraft age', ylims=(0, 7000),
+        ticks_rotation=0, ticks_fontsize=12, **kw),
+    'passenger_death_ratio_by_aircraft_age': lambda cube, **kw: plot_lineplot(
+        _passenger(cube), 'aircraft_age_range', 'death_ratio', figsize=(12, 6),
+        title='Fatalities vs People Aboard (death ratio) by Aircraft age for Passenger '
+              'aircraft', ticks_rotation=0, ticks_fontsize=12, **kw),
+    'phase_by_aircraft_age': lambda cube, **kw: plot_phase_by_age(
+        cube, title='Percentage of different Flight Phase over Aircraft age', **kw),
+}
+
+
+def _init_worker(snapshot_path: str):
+    global _cube
+    _cube = Cube(read_snapshot(snapshot_path))
+
+
+def render_chart(name: str, output_dir: str, output_format: str = 'png') -> Tuple[str, float]:
+    """Renders the chart of the worker cube into the output directory, returns its path and
+    render time in seconds."""
+    path = os.path.join(output_dir, f'{name}.{output_format}')
+    start = time.perf_counter()
+    CHARTS[name](_cube, output_path=path, show=False)
+    return path, time.perf_counter() - start
+
+
+def render_report(snapshot_path: str,
+                  output_dir: str,
+                  output_format: str = 'png',
+                  charts: List[str] = None,
+                  workers: int = None) -> Dict[str, Tuple[str, float]]:
+    """
+    Renders the charts (all by default) of the snapshot dataset in parallel, returns chart
+    name -> (path, render time in seconds).
+    """
+    charts = charts or list(CHARTS)
+    unknown = set(charts) - CHARTS.keys()
+    if unknown:
+        raise ValueError(f'Unknown charts: {sorted(unknown)}.')
+
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(snapshot_path,)) as executor:
+        futures = {
+            name: executor.submit(render_chart, name, output_dir, output_format)
+            for name in charts
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--db-config', type=str,
+                        help='The path of database config file in json format.')
+    source.add_argument('--snapshot', type=str,
+                        help='The path of the dataset snapshot to render instead of the '
+                             'snapshot of the current database state.')
+    parser.add_argument('--snapshot-dir', type=str, default=SNAPSHOT_DIR)
+    parser.add_argument('--output-dir', type=str, default='report')
+    parser.add_argument('--format', type=str, default='png', choices=('png', 'svg'))
+    parser.add_argument('--workers', type=int, default=None,
+                        help='The number of worker processes, the number of CPUs by default.')
+    parser.add_argument('--charts', type=str, nargs='+', default=None, choices=list(CHARTS),
+                        metavar='CHART', help='The charts to render, all by default.')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    snapshot = args.snapshot or ensure_snapshot(args.db_config, args.snapshot_dir)
+    results = render_report(snapshot, args.output_dir, args.format, args.charts, args.workers)
+
+    for name, (path, seconds) in sorted(results.items(), key=lambda r: -r[1][1]):
+        print(f'{name:<44}{seconds:>8.2f} s  {path}')
+    print(f'{len(results)} charts rendered in {time.perf_counter() - start:.2f} s, '
+          f'{sum(seconds for _, seconds in results.values()):.2f} s of render time.')
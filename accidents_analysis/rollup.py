@@ -0,0 +1,79 @@
+"""
+Queries of the pre-aggregated accidents rollup table.
+
+The scrapping pipeline keeps `accidents_rollup` (see "accidents_extraction/rollups.py") up to
+date with the number of accidents, fatalities and occupants per year, flight phase, nature
+group and time range, so the chart aggregations are answered by summing a few thousand
+rollup rows instead of scanning the accidents.
+
+Example:
+    from rollup import query_rollup
+    df = query_rollup('../db_config.JSON', ['decade'], years=(1920, 2019),
+                      filters={'nature_group': 'Passenger'})
+    plot_aggregated_barplot(df, 'decade', 'fatalities_sum')
+    plot_lineplot(df, 'decade', 'death_ratio')
+"""
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from utils import get_pool, read_db_config
+from accidents_extraction.rollups import DIMENSIONS, MEASURES, ROLLUP_TABLE
+
+# dimension -> SQL expression over the rollup table
+DIMENSION_EXPRESSIONS = dict(
+    {dimension: f'`{dimension}`' for dimension in DIMENSIONS},
+    decade="CONCAT(`year` DIV 10 * 10, 's')",
+)
+
+
+def build_rollup_query(by: List[str],
+                       years: Tuple[int, int] = None,
+                       filters: Dict = None) -> Tuple[str, List]:
+    """Builds the query summing the rollup measures by the given dimensions."""
+    unknown = set(by).union(filters or ()) - DIMENSION_EXPRESSIONS.keys()
+    if unknown:
+        raise ValueError(f'Unknown rollup dimensions: {sorted(unknown)}.')
+
+    conditions, params = [], []
+    if years:
+        conditions.append("`year` BETWEEN %s AND %s")
+        params.extend([int(years[0]), int(years[1])])
+    for dimension, values in (filters or {}).items():
+        values = [values] if isinstance(values, (str, int)) else list(values)
+        placeholders = ', '.join(['%s'] * len(values))
+        conditions.append(f"{DIMENSION_EXPRESSIONS[dimension]} IN ({placeholders})")
+        params.extend(values)
+
+    projection = ', '.join(
+        [f"{DIMENSION_EXPRESSIONS[dimension]} AS `{dimension}`" for dimension in by]
+        + [f"SUM(`{measure}`) AS `{measure}`" for measure in MEASURES]
+    )
+    query = f"SELECT {projection} FROM `{ROLLUP_TABLE}`"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if by:
+        group_by = ', '.join(f'`{dimension}`' for dimension in by)
+        query += f" GROUP BY {group_by} ORDER BY {group_by}"
+    return query, params
+
+
+def query_rollup(db_config_path: str,
+                 by: List[str],
+                 years: Tuple[int, int] = None,
+                 filters: Dict = None) -> pd.DataFrame:
+    """
+    Returns accidents, fatalities_count, fatalities_sum, occupants_sum and the derived
+    fatalities_per_accident and death_ratio (fatalities per occupant) by the dimensions in
+    `by` (year, decade, phase, nature_group, time_range) for the years in the inclusive
+    range and the dimension values in `filters` (dimension -> value or list of values).
+    Occupants are summed over the accidents with known fatalities, as in the notebook.
+    """
+    query, params = build_rollup_query(by, years, filters)
+    with get_pool(read_db_config(db_config_path)).connection() as cnx:
+        df = pd.read_sql(query, cnx, params=params or None)
+
+    df[list(MEASURES)] = df[list(MEASURES)].fillna(0).astype('int64')
+    df['fatalities_per_accident'] = df['fatalities_sum'] / df['fatalities_count']
+    df['death_ratio'] = df['fatalities_sum'] / df['occupants_sum']
+    return df
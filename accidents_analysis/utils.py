@@ -1,43 +1,301 @@
 import json
-from typing import Iterable, Tuple
+import os
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 import editdistance
-import mysql.connector
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 
+# the MySQL connection pool and the schema are shared with the scrapping project, imported
+# from PYTHONPATH or else from its directory, appended after the analysis modules so that
+# its own "utils", "logger" and "benchmarks" modules do not shadow them
+EXTRACTION_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                               'accidents_extraction'))
+if EXTRACTION_DIR not in sys.path:
+    sys.path.append(EXTRACTION_DIR)
+import accidents_extraction.schema as schema  # noqa: E402
+from accidents_extraction.mysql_utils import get_pool  # noqa: E402
 
-def sql_table_to_pandas(db_config_path: str, table_name: str, **kwargs) -> pd.DataFrame:
+# pandas dtypes of the column types declared in the scrapping project schema: low cardinality
+# texts become categoricals, counts nullable integers and times timedeltas
+PANDAS_DTYPES = {
+    'category': 'category',
+    'int8': 'Int8',
+    'int16': 'Int16',
+    'int32': 'Int32',
+    'time': 'timedelta64[ns]',
+    'string': 'object',
+    'text': 'object',
+}
+
+# text values of the missing values, stored by the previous versions of the scrapper
+NA_STRINGS = ['None']
+
+
+def pandas_dtypes(column_types: Dict[str, str]) -> Dict[str, str]:
+    return {column: PANDAS_DTYPES[column_type] for column, column_type in column_types.items()}
+
+
+# pandas dtypes applied by the loaders, the columns of the items with the database keys
+TABLE_DTYPES = {
+    'accidents': dict(pandas_dtypes(schema.ACCIDENTS), id='Int32'),
+    'aircraft': dict(pandas_dtypes(schema.AIRCRAFT), aircraft_id='Int32'),
+}
+# denormalized accidents (lookup names instead of ids), see accidents_extraction/migrations.py
+TABLE_DTYPES['accidents_view'] = TABLE_DTYPES['accidents']
+
+
+def read_db_config(db_config_path: str) -> Dict:
     with open(db_config_path, 'r') as infile:
-        db_config = json.load(infile)
+        return json.load(infile)
 
-    cnx = mysql.connector.connect(**db_config)
-    return pd.read_sql(f"SELECT * FROM {table_name}", cnx, **kwargs)
 
+def connection_pool_metrics(db_config_path: str) -> Dict:
+    """Returns the metrics (acquisitions, latency, reconnects) of the shared connection pool."""
+    return get_pool(read_db_config(db_config_path)).metrics
 
-def str2str_match_ratio(s_1: str, s_2: str) -> float:
-    """Calculates 2 string match ratio using given method."""
 
-    def _process(s: str) -> str:
-        if not s:
-            return ''
-        return ' '.join(s.split()).replace('.', '')
+def sql_table_to_pandas(db_config_path: str, table_name: str, **kwargs) -> pd.DataFrame:
+    with get_pool(read_db_config(db_config_path)).connection() as cnx:
+        return pd.read_sql(f"SELECT * FROM {table_name}", cnx, **kwargs)
+
+
+def build_select(table_name: str,
+                 columns: List[str] = None,
+                 years: Tuple[int, int] = None) -> Tuple[str, List]:
+    """Builds SELECT query with projected columns and inclusive year range predicate."""
+    projection = ', '.join(f'`{c}`' for c in columns) if columns else '*'
+    query, params = f"SELECT {projection} FROM `{table_name}`", []
+    if years:
+        query += " WHERE `year` BETWEEN %s AND %s"
+        params = [int(years[0]), int(years[1])]
+    return query, params
+
+
+def apply_dtypes(df: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    """
+    Converts the columns of the frame, which are present in dtypes mapping, column by column.
+    The missing values stored as text (NA_STRINGS) become missing values on the way: they are
+    removed from the categories of categorical columns and masked in text columns.
+    """
+    dtypes = {c: dtype for c, dtype in dtypes.items() if c in df.columns}
+    for column, dtype in dtypes.items():
+        if dtype.startswith('Int'):
+            # nullable integers can not be converted directly from float with NaN in old pandas
+            df[column] = pd.to_numeric(df[column], errors='coerce').round().astype(dtype)
+        elif dtype == 'category':
+            values = df[column].astype(dtype)
+            missing = values.cat.categories.intersection(NA_STRINGS)
+            df[column] = values.cat.remove_categories(missing) if len(missing) else values
+        elif dtype.startswith('timedelta'):
+            df[column] = pd.to_timedelta(df[column], errors='coerce')
+        elif dtype == 'object':
+            df[column] = df[column].mask(df[column].isin(NA_STRINGS))
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns dtype and memory (bytes, including the python strings) of every column of the
+    frame before and after the conversion, with the totals in the last row.
+    """
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'bytes_before': before.memory_usage(index=False, deep=True),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_after': after.memory_usage(index=False, deep=True),
+    })
+    report.loc['total'] = ['', report['bytes_before'].sum(), '', report['bytes_after'].sum()]
+    report['ratio'] = report['bytes_before'] / report['bytes_after']
+    return report
+
+
+def concat_chunks(chunks: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenates typed chunks, keeping categorical columns categorical."""
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+
+    categorical = [c for c in chunks[0].columns if chunks[0][c].dtype.name == 'category']
+    df = pd.concat([chunk.drop(columns=categorical) for chunk in chunks], ignore_index=True)
+    for column in categorical:
+        df[column] = union_categoricals([chunk[column] for chunk in chunks])
+    return df[chunks[0].columns]
+
+
+def iter_sql_table(db_config_path: str,
+                   table_name: str,
+                   columns: List[str] = None,
+                   years: Tuple[int, int] = None,
+                   chunksize: int = 10000,
+                   dtypes: Dict[str, str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Yields the table in chunks of `chunksize` rows. Only the given columns (all by default)
+    and years (inclusive range, filtered in SQL) are read, the chunks are converted with
+    `dtypes` (the table dtypes from TABLE_DTYPES by default).
+    """
+    dtypes = TABLE_DTYPES.get(table_name, {}) if dtypes is None else dtypes
+    query, params = build_select(table_name, columns, years)
+
+    with get_pool(read_db_config(db_config_path)).connection() as cnx:
+        for chunk in pd.read_sql(query, cnx, params=params or None, chunksize=chunksize):
+            yield apply_dtypes(chunk, dtypes)
+
 
-    s_1, s_2 = _process(s_1), _process(s_2)
+def read_sql_table(db_config_path: str,
+                   table_name: str,
+                   columns: List[str] = None,
+                   years: Tuple[int, int] = None,
+                   chunksize: int = 10000,
+                   dtypes: Dict[str, str] = None) -> pd.DataFrame:
+    """
+    Loads the table into a typed frame chunk by chunk, so the untyped object columns of only
+    one chunk are kept in memory at once. See `iter_sql_table` for the arguments.
+
+    Example:
+        read_sql_table('../db_config.JSON', 'accidents',
+                       columns=['year', 'phase', 'total_fatalities'], years=(1970, 2019))
+    """
+    return concat_chunks(
+        iter_sql_table(db_config_path, table_name, columns, years, chunksize, dtypes)
+    )
+
+
+def normalize_str(s: str) -> str:
+    """Collapses whitespaces and removes dots, the form in which strings are matched."""
+    if not s:
+        return ''
+    return ' '.join(s.split()).replace('.', '')
+
+
+def _match_ratio(s_1: str, s_2: str) -> float:
+    """Match ratio of 2 normalized non empty strings."""
+    return 1 - editdistance.eval(s_1, s_2) / max(len(s_1), len(s_2))
+
+
+def str2str_match_ratio(s_1: str, s_2: str) -> float:
+    """Calculates 2 string match ratio using given method."""
+    s_1, s_2 = normalize_str(s_1), normalize_str(s_2)
 
     if not s_1 or not s_2:
         return 0.
 
-    return 1 - editdistance.eval(s_1, s_2) / max(len(s_1), len(s_2))
+    return _match_ratio(s_1, s_2)
 
 
 def str2iter_match_ratio(s: str, iterable_s: Iterable) -> Tuple[str, float]:
     """
     Find the item from the given iterable of strings which has highest match ratio comparing with
     the base string and return the best match and it's match ratio.
+
+    For matching many strings against the same candidates use `FuzzyMatcher`.
+    """
+    best_match, best_ratio = '', 0.
+    s = normalize_str(s)
+    for i, x in enumerate(iterable_s):
+        x_normalized = normalize_str(x)
+        ratio = _match_ratio(s, x_normalized) if s and x_normalized else 0.
+        # on ties the last item wins, as in the previous implementation
+        if i == 0 or ratio >= best_ratio:
+            best_match, best_ratio = x, ratio
+    return best_match, best_ratio
+
+
+class FuzzyMatcher(object):
+    """
+    Finds the best matching candidates (by edit distance match ratio) for query strings.
+
+    Candidates are normalized once and indexed by their character n-grams. For a query the
+    upper bound of the match ratio of every candidate is derived from the string lengths and
+    the number of shared n-grams (one edit changes at most n n-grams), exact edit distance is
+    then computed in the order of decreasing bounds, only until no remaining candidate can
+    reach the top k.
+
+    Example:
+        matcher = FuzzyMatcher(df_aircraft['aircraft_main_model'])
+        matcher.match('Douglas DC-3', k=3)  # [(candidate, ratio), ...]
+        matcher.match_many(df_accidents['aircraft_type'])
     """
-    if all(False for _ in iterable_s):
-        return '', 0.
 
-    matches = [(x, str2str_match_ratio(s, x)) for x in iterable_s]
-    matches.sort(key=lambda x: x[1])
-    return matches[-1]
+    def __init__(self, candidates: Iterable[str], ngram_size: int = 3):
+        self.ngram_size = ngram_size
+        self.candidates, self.normalized = [], []
+        seen = set()
+        for candidate in candidates:
+            normalized = normalize_str(candidate)
+            if normalized and candidate not in seen:
+                seen.add(candidate)
+                self.candidates.append(candidate)
+                self.normalized.append(normalized)
+
+        postings = defaultdict(list)
+        n_ngrams = []
+        for i, normalized in enumerate(self.normalized):
+            ngrams = self._ngrams(normalized)
+            n_ngrams.append(len(ngrams))
+            for ngram in ngrams:
+                postings[ngram].append(i)
+
+        self.postings = {ngram: np.array(ids) for ngram, ids in postings.items()}
+        self.lengths = np.array([len(x) for x in self.normalized], dtype=float)
+        self.n_ngrams = np.array(n_ngrams, dtype=float)
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def _ngrams(self, s: str) -> set:
+        return {s[i:i + self.ngram_size] for i in range(len(s) - self.ngram_size + 1)}
+
+    def upper_bounds(self, query: str) -> np.ndarray:
+        """Upper bounds of the match ratio of every candidate with the normalized query."""
+        query_ngrams = self._ngrams(query)
+        ngrams = [self.postings[x] for x in query_ngrams if x in self.postings]
+        shared = np.bincount(np.concatenate(ngrams), minlength=len(self)) if ngrams else 0
+
+        # distinct n-grams, as the shared and the candidate counts
+        n_ngrams = len(query_ngrams)
+        min_distance = np.maximum(
+            np.abs(self.lengths - len(query)),
+            np.ceil((np.maximum(self.n_ngrams, n_ngrams) - shared) / self.ngram_size),
+        )
+        return 1 - min_distance / np.maximum(self.lengths, len(query))
+
+    def match(self, query: str, k: int = 1, min_ratio: float = 0.) -> List[Tuple[str, float]]:
+        """Returns up to k best (candidate, ratio) pairs with ratio >= min_ratio, best first."""
+        query = normalize_str(query)
+        if not query or not self.candidates:
+            return []
+
+        bounds = self.upper_bounds(query)
+        best = []  # [(ratio, candidate index)] sorted by decreasing ratio
+        for i in np.argsort(-bounds, kind='stable'):
+            if bounds[i] < min_ratio or (len(best) == k and bounds[i] <= best[-1][0]):
+                break
+            ratio = _match_ratio(query, self.normalized[i])
+            if ratio >= min_ratio:
+                best.append((ratio, i))
+                best.sort(key=lambda x: -x[0])
+                del best[k:]
+        return [(self.candidates[i], ratio) for ratio, i in best]
+
+    def match_many(self, queries: Iterable[str], k: int = 1,
+                   min_ratio: float = 0.) -> List[List[Tuple[str, float]]]:
+        """Returns `match` result for every query, repeated queries are matched once."""
+        cache = {}
+        results = []
+        for query in queries:
+            if query not in cache:
+                cache[query] = self.match(query, k, min_ratio)
+            results.append(cache[query])
+        return results
+
+    def best_match(self, query: str) -> Tuple[str, float]:
+        """Returns the best (candidate, ratio) pair or ('', 0.) as `str2iter_match_ratio`."""
+        return (self.match(query) or [('', 0.)])[0]
@@ -0,0 +1,180 @@
+"""
+Normalization of the raw accident page fields.
+
+The functions are called for every field of every scrapped accident page, so the regular
+expressions are compiled once at import and the month names and placeholder values are
+resolved with lookup tables instead of `time.strptime` / `datetime.strptime` calls.
+"""
+import re
+from typing import Dict, Tuple
+
+MULTIPLE_SPACES = re.compile(r' +')
+DIGITS = re.compile(r'\d+')
+TIME = re.compile(r'(2[0-3]|[01]?[0-9]):([0-5]?[0-9])(?::([0-5]?[0-9]))?\Z')
+
+MONTH_NAMES = (
+    'january', 'february', 'march', 'april', 'may', 'june',
+    'july', 'august', 'september', 'october', 'november', 'december',
+)
+MONTHS_BY_NAME = {name: i for i, name in enumerate(MONTH_NAMES, 1)}
+MONTHS_BY_ABBREVIATION = {name[:3]: i for i, name in enumerate(MONTH_NAMES, 1)}
+
+UNKNOWN_PHASES = frozenset(('', '()', '(CMB)', 'Unknown (UNK)'))
+UNKNOWN_NATURES = frozenset(('', '-'))
+UNKNOWN_AIRPORTS = frozenset(('', '?', '-'))
+UNKNOWN_DAMAGES = frozenset(('', 'Missing'))
+
+PEOPLE_GROUPS = (
+    ('Crew', 'crew_occupants', 'crew_fatalities'),
+    ('Passengers', 'passengers_occupants', 'passengers_fatalities'),
+    ('Total', 'total_occupants', 'total_fatalities'),
+)
+
+
+def first_int(x: str) -> int:
+    """Returns the first integer found in the string or None."""
+    match = DIGITS.search(x)
+    return int(match.group()) if match else None
+
+
+def correct_str(x: str) -> str:
+    if not x:
+        return
+    x = x.replace('é', 'e')
+    x = x.encode("ascii", errors="ignore").decode()
+    return MULTIPLE_SPACES.sub(' ', x.rstrip()).strip()
+
+
+def parse_time(x: str) -> str:
+    """Returns time in "HH:MM:SS" format or None."""
+    if not x:
+        return
+
+    # ca or c. means circa which translated from latin means approximate
+    x = x.replace('ca', '').replace('c.', '').replace(' ', '')
+
+    match = TIME.match(x)
+    if not match:
+        return
+    hours, minutes, seconds = match.groups()
+    return f'{int(hours):02d}:{int(minutes):02d}:{int(seconds or 0):02d}'
+
+
+def parse_month(x: str) -> int:
+    """Returns month number for full or 3 letters month name, None for unknown "xx" month."""
+    x = x.lower()
+    if 'xx' in x:
+        return
+
+    months = MONTHS_BY_ABBREVIATION if len(x) == 3 else MONTHS_BY_NAME
+    try:
+        return months[x]
+    except KeyError:
+        raise ValueError(f'Unknown month: {x}.')
+
+
+def parse_date(x: str) -> Tuple:
+    """Returns weekday, day, month and year from "Friday 2 August 1919" like date."""
+    x = x.split()
+    if len(x) == 3:
+        weekday, day, month, year = None, None, x[-2], x[-1]
+        try:
+            month, year = parse_month(month), int(year)
+        except ValueError:
+            month, year = None, None
+    elif len(x) == 4:
+        [weekday, day, month, year] = x
+        try:
+            day, month, year = int(day), parse_month(month), int(year)
+        except ValueError:
+            day, month, year = None, None, None
+    else:
+        weekday, day, month, year = None, None, None, None
+
+    return weekday, day, month, year
+
+
+def parse_operator(data: Dict) -> str:
+    operator = data.get('Operator', '')
+    if not operator:
+        operator = data.get('Operating for', '')
+    return operator.encode("ascii", errors="ignore").decode()
+
+
+def parse_location(x: str) -> Tuple:
+    country = x.rstrip("*")[x.rfind("(") + 1:-1]
+    country = country.strip()
+    x = x[: -(len(country) + 4)].strip()
+
+    if not country or country == 'Unknown country':
+        country = 'Unknown'
+
+    if not x:
+        x = 'Unknown'
+
+    return country, x
+
+
+def parse_phase(x: str) -> str:
+    return 'Unknown' if not x or x in UNKNOWN_PHASES else x
+
+
+def parse_nature(x: str) -> str:
+    return 'Unknown' if not x or x in UNKNOWN_NATURES else x
+
+
+def parse_airport(x: str) -> str:
+    return 'Unknown' if not x or x in UNKNOWN_AIRPORTS else x
+
+
+def parse_aircraft_damage(x: str) -> str:
+    return 'Unknown' if not x or x in UNKNOWN_DAMAGES else x
+
+
+def parse_people_data(data: Dict) -> Dict:
+    """
+    Parses "Fatalities: 2 / Occupants: 5" like crew, passengers and total values and ground
+    casualties. Missing or malformed values are returned as None.
+    """
+    output = {}
+    for name, occupants_key, fatalities_key in PEOPLE_GROUPS:
+        occupants, fatalities = None, None
+
+        parts = (data.get(name) or '').split('/')
+        if len(parts) == 2:
+            data_1, data_2 = parts
+            if 'Occupants' in data_1 and 'Fatalities' in data_2:
+                occupants, fatalities = first_int(data_1), first_int(data_2)
+            elif 'Occupants' in data_2 and 'Fatalities' in data_1:
+                occupants, fatalities = first_int(data_2), first_int(data_1)
+
+        if fatalities and not occupants:
+            occupants = fatalities
+
+        output[occupants_key] = occupants
+        output[fatalities_key] = fatalities
+
+    ground_fatalities = data.get('Ground casualties')
+    if ground_fatalities and 'Fatalities' in ground_fatalities:
+        ground_fatalities = first_int(ground_fatalities)
+    output['ground_fatalities'] = ground_fatalities
+
+    return output
+
+
+def parse_first_flight(x: str) -> int:
+    if not x:
+        return
+    try:
+        return int(x[:4])
+    except ValueError:
+        return
+
+
+def parse_airframe_hrs(x: str) -> int:
+    if not x:
+        return
+    try:
+        return int(x)
+    except ValueError:
+        return
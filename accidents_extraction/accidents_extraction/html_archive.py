@@ -0,0 +1,56 @@
+import glob
+import gzip
+import json
+import os
+from typing import Dict, Iterator
+
+
+class HtmlArchive(object):
+    """
+    Archive of the raw html pages downloaded by the spiders.
+
+    Pages are saved as JSON lines ({"url": ..., "body": ...}) into gzip files, one file per
+    page kind and year:
+        <root>/<kind>/<year>.jsonl.gz
+
+    Each run appends a new gzip member to the files, so the archive can be extended by
+    consecutive (e.g. incremental) crawls; a page archived by several runs is read once, with
+    its latest body.
+    """
+    ACCIDENT = 'accident'
+    AIRCRAFT_TYPE = 'aircraft_type'
+    AIRCRAFT_SPECS = 'aircraft_specs'
+
+    def __init__(self, root: str):
+        self.root = root
+        self.files = {}
+
+    def write(self, kind: str, url: str, body: str, year: str or int = 'all'):
+        path = os.path.join(self.root, kind, f'{year}.jsonl.gz')
+        if path not in self.files:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.files[path] = gzip.open(path, 'at', encoding='utf-8')
+        self.files[path].write(json.dumps({'url': url, 'body': body}) + '\n')
+
+    def close(self):
+        for archive_file in self.files.values():
+            archive_file.close()
+        self.files = {}
+
+    def paths(self, kind: str):
+        return sorted(glob.glob(os.path.join(self.root, kind, '*.jsonl.gz')))
+
+    def read(self, kind: str) -> Iterator[Dict]:
+        """
+        Yields archived pages of the given kind ordered by year, each url once with the last
+        archived body.
+        """
+        for path in self.paths(kind):
+            # url -> page, the pages of a file are kept in the order of their last copy
+            pages = {}
+            with gzip.open(path, 'rt', encoding='utf-8') as infile:
+                for line in infile:
+                    page = json.loads(line)
+                    pages.pop(page['url'], None)
+                    pages[page['url']] = page
+            yield from pages.values()
@@ -7,50 +7,55 @@
 
 import scrapy
 
+from .schema import ACCIDENTS, AIRCRAFT
+
 
 class Accident(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    status = scrapy.Field()
-    weekday = scrapy.Field()
-    day = scrapy.Field()
-    month = scrapy.Field()
-    year = scrapy.Field()
-    first_flight = scrapy.Field()
-    time = scrapy.Field()
-    aircraft_type = scrapy.Field()
-    aircraft_main_model = scrapy.Field()
-    operator = scrapy.Field()
-    crew_occupants = scrapy.Field()
-    crew_fatalities = scrapy.Field()
-    passengers_occupants = scrapy.Field()
-    passengers_fatalities = scrapy.Field()
-    total_occupants = scrapy.Field()
-    total_fatalities = scrapy.Field()
-    ground_fatalities = scrapy.Field()
-    phase = scrapy.Field()
-    nature = scrapy.Field()
-    aircraft_damage = scrapy.Field()
-    country = scrapy.Field()
-    location = scrapy.Field()
-    narrative = scrapy.Field()
-    probable_cause = scrapy.Field()
-    departure_airport = scrapy.Field()
-    destination_airport = scrapy.Field()
-    engines = scrapy.Field()
-    total_airframe_hrs = scrapy.Field()
+    # the column types are declared in `schema` and shared with the outputs and the analysis
+    accident_key = scrapy.Field(dtype=ACCIDENTS['accident_key'])
+    status = scrapy.Field(dtype=ACCIDENTS['status'])
+    weekday = scrapy.Field(dtype=ACCIDENTS['weekday'])
+    day = scrapy.Field(dtype=ACCIDENTS['day'])
+    month = scrapy.Field(dtype=ACCIDENTS['month'])
+    year = scrapy.Field(dtype=ACCIDENTS['year'])
+    first_flight = scrapy.Field(dtype=ACCIDENTS['first_flight'])
+    time = scrapy.Field(dtype=ACCIDENTS['time'])
+    aircraft_type = scrapy.Field(dtype=ACCIDENTS['aircraft_type'])
+    aircraft_main_model = scrapy.Field(dtype=ACCIDENTS['aircraft_main_model'])
+    operator = scrapy.Field(dtype=ACCIDENTS['operator'])
+    crew_occupants = scrapy.Field(dtype=ACCIDENTS['crew_occupants'])
+    crew_fatalities = scrapy.Field(dtype=ACCIDENTS['crew_fatalities'])
+    passengers_occupants = scrapy.Field(dtype=ACCIDENTS['passengers_occupants'])
+    passengers_fatalities = scrapy.Field(dtype=ACCIDENTS['passengers_fatalities'])
+    total_occupants = scrapy.Field(dtype=ACCIDENTS['total_occupants'])
+    total_fatalities = scrapy.Field(dtype=ACCIDENTS['total_fatalities'])
+    ground_fatalities = scrapy.Field(dtype=ACCIDENTS['ground_fatalities'])
+    phase = scrapy.Field(dtype=ACCIDENTS['phase'])
+    nature = scrapy.Field(dtype=ACCIDENTS['nature'])
+    aircraft_damage = scrapy.Field(dtype=ACCIDENTS['aircraft_damage'])
+    country = scrapy.Field(dtype=ACCIDENTS['country'])
+    location = scrapy.Field(dtype=ACCIDENTS['location'])
+    narrative = scrapy.Field(dtype=ACCIDENTS['narrative'])
+    probable_cause = scrapy.Field(dtype=ACCIDENTS['probable_cause'])
+    departure_airport = scrapy.Field(dtype=ACCIDENTS['departure_airport'])
+    destination_airport = scrapy.Field(dtype=ACCIDENTS['destination_airport'])
+    engines = scrapy.Field(dtype=ACCIDENTS['engines'])
+    total_airframe_hrs = scrapy.Field(dtype=ACCIDENTS['total_airframe_hrs'])
+    # id of the aircraft catalogue row, resolved from aircraft_type by the MySQL pipeline
+    aircraft_id = scrapy.Field(dtype=ACCIDENTS['aircraft_id'])
 
 
 class Aircraft(scrapy.Item):
-    aircraft_main_model = scrapy.Field()
-    manufacturer = scrapy.Field()
-    country = scrapy.Field()
-    icao_type_designator = scrapy.Field()
-    first_flight = scrapy.Field()
-    production_ended = scrapy.Field()
-    production_total = scrapy.Field()
-    propulsion = scrapy.Field()
-    maximum_number_of_passengers = scrapy.Field()
-    maximum_take_off_mass = scrapy.Field()
-    mass_unit = scrapy.Field()
-    icao_mass_group = scrapy.Field()
+    # the column types are declared in `schema` and shared with the outputs and the analysis
+    aircraft_main_model = scrapy.Field(dtype=AIRCRAFT['aircraft_main_model'])
+    manufacturer = scrapy.Field(dtype=AIRCRAFT['manufacturer'])
+    country = scrapy.Field(dtype=AIRCRAFT['country'])
+    icao_type_designator = scrapy.Field(dtype=AIRCRAFT['icao_type_designator'])
+    first_flight = scrapy.Field(dtype=AIRCRAFT['first_flight'])
+    production_ended = scrapy.Field(dtype=AIRCRAFT['production_ended'])
+    production_total = scrapy.Field(dtype=AIRCRAFT['production_total'])
+    propulsion = scrapy.Field(dtype=AIRCRAFT['propulsion'])
+    maximum_number_of_passengers = scrapy.Field(dtype=AIRCRAFT['maximum_number_of_passengers'])
+    maximum_take_off_mass = scrapy.Field(dtype=AIRCRAFT['maximum_take_off_mass'])
+    mass_unit = scrapy.Field(dtype=AIRCRAFT['mass_unit'])
+    icao_mass_group = scrapy.Field(dtype=AIRCRAFT['icao_mass_group'])
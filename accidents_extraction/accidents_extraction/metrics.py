@@ -0,0 +1,53 @@
+"""
+Latency histograms of the crawl metrics (see `middlewares.CrawlMetricsMiddleware`).
+"""
+import bisect
+from typing import Dict
+
+# upper bounds of the histogram buckets in milliseconds, the last bucket is unbounded
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class LatencyHistogram(object):
+    """Counts latencies in fixed logarithmic buckets, keeps their count, sum and max."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, seconds * 1e3)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """
+        Returns the upper bound (ms) of the bucket of the q-th percentile (0 < q <= 100),
+        capped by the max latency.
+        """
+        if not self.count:
+            return 0.
+        rank, cumulative = q / 100 * self.count, 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                if i < len(BUCKETS_MS):
+                    return min(float(BUCKETS_MS[i]), round(self.max * 1e3, 2))
+                break
+        return round(self.max * 1e3, 2)
+
+    def to_dict(self) -> Dict:
+        labels = [f'<={bound}ms' for bound in BUCKETS_MS] + [f'>{BUCKETS_MS[-1]}ms']
+        return {
+            'count': self.count,
+            'total_secs': round(self.total, 3),
+            'avg_ms': round(self.total / self.count * 1e3, 2) if self.count else 0.,
+            'max_ms': round(self.max * 1e3, 2),
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'buckets': {label: count for label, count in zip(labels, self.counts) if count},
+        }
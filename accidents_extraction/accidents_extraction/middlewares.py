@@ -5,7 +5,26 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import datetime
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from typing import Dict
+from urllib.parse import urlparse
+
+from itemadapter import is_item
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from twisted.internet import task
+
+from logger import logger
+from .metrics import LatencyHistogram
+from .response_store import ResponseStore
 
 
 class AccidentsExtractionSpiderMiddleware(object):
@@ -101,3 +120,477 @@ class AccidentsExtractionDownloaderMiddleware(object):
 
     def spider_opened(self, spider):
         spider.logger.info('Spider opened: %s' % spider.name)
+
+
+class ResponseCacheMiddleware(object):
+    """
+    Serves responses from the local `ResponseStore` instead of the network.
+
+    The expiration time of a stored response is defined by the first pattern of
+    RESPONSE_CACHE_EXPIRATION matching the url (RESPONSE_CACHE_EXPIRATION_SECS otherwise,
+    None means never expire). Expired responses having ETag or Last-Modified headers are
+    revalidated with a conditional request, "304 Not Modified" answer serves the stored body.
+    Requests with `dont_cache` meta key bypass the cache.
+    """
+
+    def __init__(self, store, expiration, default_expiration, fingerprinter, stats):
+        self.store = store
+        self.expiration = [(re.compile(pattern), secs) for pattern, secs in expiration]
+        self.default_expiration = default_expiration
+        self.fingerprinter = fingerprinter
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('RESPONSE_CACHE_ENABLED'):
+            raise NotConfigured
+        return cls(
+            store=ResponseStore(data_path(settings['RESPONSE_CACHE_DIR'], createdir=True)),
+            expiration=settings.getlist('RESPONSE_CACHE_EXPIRATION'),
+            default_expiration=settings.get('RESPONSE_CACHE_EXPIRATION_SECS'),
+            fingerprinter=crawler.request_fingerprinter,
+            stats=crawler.stats,
+        )
+
+    def _key(self, request) -> str:
+        return self.fingerprinter.fingerprint(request).hex()
+
+    def _expiration_secs(self, url: str):
+        for pattern, secs in self.expiration:
+            if pattern.search(url):
+                return secs
+        return self.default_expiration
+
+    def _is_fresh(self, meta) -> bool:
+        secs = self._expiration_secs(meta['url'])
+        return secs is None or time.time() - meta['stored_at'] < float(secs)
+
+    def _build_response(self, request, meta):
+        body = self.store.read_body(meta['digest'])
+        if body is None:
+            return None
+
+        headers = Headers(meta['headers'])
+        response_cls = responsetypes.from_args(headers=headers, url=meta['url'], body=body)
+        return response_cls(
+            url=meta['url'],
+            status=meta['status'],
+            headers=headers,
+            body=body,
+            request=request,
+            flags=['cached'],
+        )
+
+    def process_request(self, request, spider):
+        if request.meta.get('dont_cache'):
+            return None
+
+        meta = self.store.get(self._key(request))
+        if meta is None:
+            self.stats.inc_value('response_cache/miss')
+            return None
+
+        if self._is_fresh(meta):
+            response = self._build_response(request, meta)
+            if response is not None:
+                self.stats.inc_value('response_cache/hit')
+                return response
+
+        headers = Headers(meta['headers'])
+        if headers.get('ETag'):
+            request.headers.setdefault('If-None-Match', headers['ETag'])
+        if headers.get('Last-Modified'):
+            request.headers.setdefault('If-Modified-Since', headers['Last-Modified'])
+        self.stats.inc_value('response_cache/stale')
+        return None
+
+    def process_response(self, request, response, spider):
+        if request.meta.get('dont_cache') or 'cached' in response.flags:
+            return response
+
+        key = self._key(request)
+        if response.status == 304:
+            meta = self.store.get(key)
+            cached_response = meta and self._build_response(request, meta)
+            if cached_response is not None:
+                self.store.touch(key, meta)
+                self.stats.inc_value('response_cache/revalidated')
+                return cached_response
+            return response
+
+        if response.status == 200:
+            headers = [
+                (name.decode('latin1'), value.decode('latin1'))
+                for name, values in response.headers.items() for value in values
+            ]
+            self.store.put(key, response.url, response.status, headers, response.body)
+            self.stats.inc_value('response_cache/store')
+        return response
+
+
+class CrawlMetricsMiddleware(object):
+    """
+    Spider middleware recording the crawl throughput metrics:
+        - parse time of every spider callback (time spent producing the callback output),
+        - download latency of the requests,
+        - pipelines latency of the items (from the callback output to `item_scraped`),
+        - items/sec, responses/sec and the scheduler backlog.
+
+    Every CRAWL_METRICS_INTERVAL seconds a snapshot of the metrics is logged and written as
+    JSON into CRAWL_METRICS_FILE (if set); when the spider is closed the final summary is
+    logged, written into the file and the main values are stored in the crawl stats.
+    """
+
+    def __init__(self, crawler, interval, path):
+        self.crawler = crawler
+        self.interval = interval
+        self.path = path
+
+        self.callbacks = defaultdict(LatencyHistogram)
+        self.download_latency = LatencyHistogram()
+        self.pipelines_latency = LatencyHistogram()
+        # id of the item -> time it left the callback
+        self.pending_items = {}
+        self.counters = defaultdict(int)
+        self.start_time = None
+        self.last_snapshot = None
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('CRAWL_METRICS_ENABLED'):
+            raise NotConfigured
+        middleware = cls(
+            crawler,
+            interval=settings.getfloat('CRAWL_METRICS_INTERVAL', 60),
+            path=settings.get('CRAWL_METRICS_FILE'),
+        )
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(middleware.response_received, signal=signals.response_received)
+        crawler.signals.connect(middleware.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(middleware.item_dropped, signal=signals.item_dropped)
+        crawler.signals.connect(middleware.item_error, signal=signals.item_error)
+        return middleware
+
+    @staticmethod
+    def callback_name(response, spider) -> str:
+        """Returns the name of the spider method which parses the response."""
+        request = response.request
+        rule = request.meta.get('rule')
+        rules = getattr(spider, '_rules', None)
+        # CrawlSpider calls the callbacks of its rules from its own `_callback`
+        callback = rules[rule].callback if rule is not None and rules else request.callback
+        if callback is None:
+            return 'parse'
+        return getattr(callback, '__name__', str(callback))
+
+    def _record_output(self, output):
+        if is_item(output):
+            self.pending_items[id(output)] = time.perf_counter()
+            self.counters['items_yielded'] += 1
+        else:
+            self.counters['requests_yielded'] += 1
+
+    def process_spider_output(self, response, result, spider):
+        # only the time spent in the callback (getting the next output) is counted
+        histogram = self.callbacks[self.callback_name(response, spider)]
+        elapsed = 0.
+        iterator = iter(result)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    output = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+                self._record_output(output)
+                yield output
+        finally:
+            histogram.add(elapsed)
+
+    async def process_spider_output_async(self, response, result, spider):
+        histogram = self.callbacks[self.callback_name(response, spider)]
+        elapsed = 0.
+        iterator = result.__aiter__()
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    output = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+                self._record_output(output)
+                yield output
+        finally:
+            histogram.add(elapsed)
+
+    def response_received(self, response, request, spider):
+        self.counters['responses'] += 1
+        if 'cached' in response.flags:
+            self.counters['cached_responses'] += 1
+        elif 'download_latency' in request.meta:
+            self.download_latency.add(request.meta['download_latency'])
+
+    def _item_done(self, item, counter):
+        start = self.pending_items.pop(id(item), None)
+        if start is not None:
+            self.pipelines_latency.add(time.perf_counter() - start)
+        self.counters[counter] += 1
+
+    def item_scraped(self, item, response, spider):
+        self._item_done(item, 'items_scraped')
+
+    def item_dropped(self, item, response, exception, spider):
+        self._item_done(item, 'items_dropped')
+
+    def item_error(self, item, response, spider, failure):
+        self._item_done(item, 'item_errors')
+
+    def scheduler_backlog(self) -> int:
+        engine = self.crawler.engine
+        slot = getattr(engine, '_slot', None) or getattr(engine, 'slot', None)
+        if slot is None or slot.scheduler is None:
+            return 0
+        return len(slot.scheduler)
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        elapsed = max(now - self.start_time, 1e-9)
+        since_last = max(now - self.last_snapshot[0], 1e-9)
+        items_since_last = self.counters['items_scraped'] - self.last_snapshot[1]
+        self.last_snapshot = (now, self.counters['items_scraped'])
+
+        downloader = self.crawler.engine.downloader if self.crawler.engine else None
+        return {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'elapsed_secs': round(elapsed, 1),
+            'counters': dict(self.counters),
+            'items_per_sec': round(self.counters['items_scraped'] / elapsed, 2),
+            'items_per_sec_recent': round(items_since_last / since_last, 2),
+            'responses_per_sec': round(self.counters['responses'] / elapsed, 2),
+            'scheduler_backlog': self.scheduler_backlog(),
+            'downloads_in_progress': len(downloader.active) if downloader else 0,
+            'items_in_pipelines': len(self.pending_items),
+            'download_latency': self.download_latency.to_dict(),
+            'pipelines_latency': self.pipelines_latency.to_dict(),
+            'callbacks': {name: h.to_dict() for name, h in sorted(self.callbacks.items())},
+        }
+
+    def write_snapshot(self, snapshot: Dict):
+        if not self.path:
+            return
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as outfile:
+            json.dump(snapshot, outfile, indent=1)
+        os.replace(temp_path, self.path)
+
+    def log_snapshot(self):
+        snapshot = self.snapshot()
+        logger.info(
+            f"Crawl metrics: {snapshot['counters'].get('items_scraped', 0)} items "
+            f"({snapshot['items_per_sec_recent']} items/sec), "
+            f"scheduler backlog {snapshot['scheduler_backlog']}, "
+            f"{snapshot['downloads_in_progress']} downloads in progress."
+        )
+        self.write_snapshot(snapshot)
+
+    def spider_opened(self, spider):
+        self.start_time = time.monotonic()
+        self.last_snapshot = (self.start_time, 0)
+        self.task = task.LoopingCall(self.log_snapshot)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+
+        summary = dict(self.snapshot(), final=True, reason=reason)
+        self.write_snapshot(summary)
+
+        logger.info(
+            f"Crawl summary: {self.counters['items_scraped']} items in "
+            f"{summary['elapsed_secs']}s ({summary['items_per_sec']} items/sec), "
+            f"{self.counters['responses']} responses, "
+            f"pipelines latency avg {summary['pipelines_latency']['avg_ms']}ms "
+            f"p99 {summary['pipelines_latency']['p99_ms']}ms."
+        )
+        for name, callback in summary['callbacks'].items():
+            logger.info(
+                f"Callback {name}: {callback['count']} responses, "
+                f"{callback['total_secs']}s total, avg {callback['avg_ms']}ms, "
+                f"p99 {callback['p99_ms']}ms."
+            )
+
+        stats = self.crawler.stats
+        stats.set_value('crawl_metrics/items_per_sec', summary['items_per_sec'])
+        stats.set_value('crawl_metrics/pipelines_latency_avg_ms',
+                        summary['pipelines_latency']['avg_ms'])
+        stats.set_value('crawl_metrics/download_latency_avg_ms',
+                        summary['download_latency']['avg_ms'])
+        for name, callback in summary['callbacks'].items():
+            stats.set_value(f'crawl_metrics/callback/{name}/avg_ms', callback['avg_ms'])
+            stats.set_value(f'crawl_metrics/callback/{name}/total_secs', callback['total_secs'])
+
+
+class AdaptiveConcurrencyMiddleware(object):
+    """
+    Downloads every class of urls (ADAPTIVE_CONCURRENCY_URL_CLASSES: year index pages,
+    accident pages, aircraft type pages) in its own download slot and adapts the concurrency
+    of the slot to the observed latency and errors (additive increase, multiplicative
+    decrease):
+        - a successful response adds 1/concurrency, i.e. +1 per window of responses, up to
+          ADAPTIVE_CONCURRENCY_MAX,
+        - an error (ADAPTIVE_CONCURRENCY_ERROR_CODES status or download exception) or an
+          average latency above ADAPTIVE_CONCURRENCY_LATENCY_FACTOR times the lowest one
+          halves the concurrency, at most once per window; at concurrency 1 the download
+          delay of the slot is doubled instead (up to ADAPTIVE_CONCURRENCY_MAX_DELAY) and
+          halved back by the next successful responses.
+    Urls of no class keep the default slot of their domain. Cached responses are ignored.
+    """
+
+    def __init__(self, crawler, url_classes, start, max_concurrency, latency_factor,
+                 max_delay, error_codes):
+        self.crawler = crawler
+        self.url_classes = [(re.compile(pattern), name) for pattern, name in url_classes]
+        self.start = start
+        self.max_concurrency = max_concurrency
+        self.latency_factor = latency_factor
+        self.max_delay = max_delay
+        self.error_codes = {int(code) for code in error_codes}
+        # slot key -> state of the slot
+        self.slots: Dict[str, Dict] = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED'):
+            raise NotConfigured
+        middleware = cls(
+            crawler,
+            url_classes=settings.getlist('ADAPTIVE_CONCURRENCY_URL_CLASSES'),
+            start=settings.getint('ADAPTIVE_CONCURRENCY_START'),
+            max_concurrency=settings.getint('ADAPTIVE_CONCURRENCY_MAX'),
+            latency_factor=settings.getfloat('ADAPTIVE_CONCURRENCY_LATENCY_FACTOR'),
+            max_delay=settings.getfloat('ADAPTIVE_CONCURRENCY_MAX_DELAY'),
+            error_codes=settings.getlist('ADAPTIVE_CONCURRENCY_ERROR_CODES'),
+        )
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def _url_class(self, url: str):
+        for pattern, name in self.url_classes:
+            if pattern.search(url):
+                return name
+        return None
+
+    def _update_slot(self, key: str, state: Dict):
+        downloader = self.crawler.engine.downloader
+        # the slots created by the downloader (with the first request of the slot or again
+        # after an idle slot is removed) take their concurrency and delay from DOWNLOAD_SLOTS
+        downloader.per_slot_settings.setdefault(key, {}).update(
+            concurrency=int(state['concurrency']), delay=state['delay']
+        )
+        slot = downloader.slots.get(key)
+        if slot is not None:
+            slot.concurrency = int(state['concurrency'])
+            slot.delay = state['delay']
+
+    def process_request(self, request, spider):
+        url_class = self._url_class(request.url)
+        if url_class is None or 'download_slot' in request.meta:
+            return None
+
+        key = f'{urlparse(request.url).hostname}/{url_class}'
+        request.meta['download_slot'] = key
+        if key not in self.slots:
+            self.slots[key] = {
+                'concurrency': float(self.start),
+                'delay': 0.,
+                'latency': None,
+                'min_latency': None,
+                'window': 0,
+                'decreases': 0,
+            }
+            # before the first request of the slot is queued, so that the slot starts low
+            self._update_slot(key, self.slots[key])
+        return None
+
+    def _state(self, request):
+        return self.slots.get(request.meta.get('download_slot'))
+
+    def _increase(self, key: str, state: Dict):
+        state['window'] += 1
+        if state['delay']:
+            state['delay'] = state['delay'] / 2 if state['delay'] > 0.1 else 0.
+        else:
+            state['concurrency'] = min(
+                state['concurrency'] + 1 / state['concurrency'], self.max_concurrency
+            )
+        self._update_slot(key, state)
+
+    def _decrease(self, key: str, state: Dict, reason: str):
+        state['window'] += 1
+        # the responses of the requests sent before the previous decrease are not counted
+        if state['window'] < state['concurrency']:
+            return
+        state['window'] = 0
+        state['decreases'] += 1
+        if state['concurrency'] >= 2:
+            state['concurrency'] = max(state['concurrency'] / 2, 1.)
+        else:
+            state['delay'] = min(max(state['delay'] * 2, 0.25), self.max_delay)
+        self._update_slot(key, state)
+        self.crawler.stats.inc_value(f'adaptive_concurrency/decreases/{reason}')
+        logger.debug(
+            f"Slot {key}: {reason}, concurrency {int(state['concurrency'])}, "
+            f"delay {state['delay']:.2f}s."
+        )
+
+    def process_response(self, request, response, spider):
+        state = self._state(request)
+        if state is None or 'cached' in response.flags:
+            return response
+
+        key = request.meta['download_slot']
+        if response.status in self.error_codes:
+            self._decrease(key, state, f'status_{response.status}')
+            return response
+
+        latency = request.meta.get('download_latency')
+        if latency is None:
+            return response
+        state['latency'] = (
+            latency if state['latency'] is None else 0.7 * state['latency'] + 0.3 * latency
+        )
+        if state['min_latency'] is None or state['latency'] < state['min_latency']:
+            state['min_latency'] = state['latency']
+
+        if state['latency'] > self.latency_factor * state['min_latency']:
+            self._decrease(key, state, 'latency')
+        else:
+            self._increase(key, state)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        state = self._state(request)
+        if state is not None:
+            self._decrease(request.meta['download_slot'], state, 'exception')
+        return None
+
+    def spider_closed(self, spider, reason):
+        stats = self.crawler.stats
+        for key, state in self.slots.items():
+            stats.set_value(f'adaptive_concurrency/{key}/concurrency', int(state['concurrency']))
+            stats.set_value(f'adaptive_concurrency/{key}/delay', state['delay'])
+            stats.set_value(f'adaptive_concurrency/{key}/decreases', state['decreases'])
+            logger.info(
+                f"Slot {key}: concurrency {int(state['concurrency'])}, "
+                f"delay {state['delay']:.2f}s, {state['decreases']} decreases."
+            )
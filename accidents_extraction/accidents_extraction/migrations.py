@@ -0,0 +1,189 @@
+"""
+Schema migrations of the normalized `accidents` table.
+
+The low cardinality text columns of the accidents (country, phase, nature, ...) are stored
+in lookup tables (`id`, `name`) and referenced by `<column>_id` foreign keys, the filter
+columns are indexed and `aircraft_id` references the aircraft catalogue. The migrations
+bring the tables created by the previous versions (text columns) to this schema in place
+and are safe to run repeatedly, they are run by the pipelines when the spider is opened.
+
+The pipelines only copy the values of the text columns into the lookup tables, the text
+columns are dropped by `drop_text_columns` ("migrate_app.py"), which first checks that every
+value has its id.
+
+The denormalized form, with the names instead of the ids, is available as `accidents_view`.
+"""
+import accidents_extraction.mysql_utils as mysql_utils
+
+# accidents text column -> id type, the values are stored in "lookup_<column>" table
+LOOKUP_COLUMNS = {
+    'operator': 'INT',
+    'country': 'SMALLINT',
+    'phase': 'SMALLINT',
+    'nature': 'SMALLINT',
+    'aircraft_damage': 'SMALLINT',
+}
+
+# index name -> definition of the accidents filter columns indexes
+ACCIDENTS_INDEXES = {
+    'year': 'KEY `year` (`year`)',
+    'year_nature': 'KEY `year_nature` (`year`, `nature_id`)',
+    'year_phase': 'KEY `year_phase` (`year`, `phase_id`)',
+    'country_year': 'KEY `country_year` (`country_id`, `year`)',
+}
+
+ACCIDENTS_VIEW = 'accidents_view'
+
+# the lookup names have the size of the accidents text columns and any unicode character,
+# they are unique by their hash, as a key on the full name would exceed the InnoDB key size
+LOOKUP_NAME_DEFINITION = 'varchar(1000) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL'
+LOOKUP_HASH_DEFINITION = 'BINARY(32) AS (UNHEX(SHA2(`name`, 256))) STORED NOT NULL'
+
+
+class MigrationError(Exception):
+    pass
+
+
+def lookup_table_name(column: str) -> str:
+    return f'lookup_{column}'
+
+
+def create_lookup_table(cursor, column: str):
+    table_name = lookup_table_name(column)
+    table_data = (
+        f"CREATE TABLE `{table_name}` ("
+        f"  `id` {LOOKUP_COLUMNS[column]} NOT NULL AUTO_INCREMENT,"
+        f"  `name` {LOOKUP_NAME_DEFINITION},"
+        f"  `name_hash` {LOOKUP_HASH_DEFINITION},"
+        "  PRIMARY KEY (`id`),"
+        "  UNIQUE KEY `name_hash` (`name_hash`)"
+        ") ENGINE=InnoDB"
+    )
+    mysql_utils.create_table(cursor, table_name, table_data)
+
+    # the tables of the previous versions have `varchar(255) utf8` names with a unique key
+    if 'name_hash' not in mysql_utils.table_columns(cursor, table_name):
+        print(f"Widening '{table_name}.name' column.")
+        mysql_utils.drop_index(cursor, table_name, 'name')
+        cursor.execute(f"ALTER TABLE `{table_name}` MODIFY `name` {LOOKUP_NAME_DEFINITION}")
+        mysql_utils.add_column(cursor, table_name, 'name_hash', LOOKUP_HASH_DEFINITION)
+        mysql_utils.add_index(cursor, table_name, 'name_hash',
+                              'UNIQUE KEY `name_hash` (`name_hash`)')
+
+
+def count_unmapped(cursor, table_name: str, column: str) -> int:
+    """Returns the number of the rows with the text column value but without its id."""
+    cursor.execute(
+        f"SELECT COUNT(*) FROM `{table_name}` "
+        f"WHERE `{column}` IS NOT NULL AND `{column}_id` IS NULL"
+    )
+    return cursor.fetchone()[0]
+
+
+def normalize_column(cursor, table_name: str, column: str):
+    """
+    Copies the values of the text column into its lookup table and sets `<column>_id` column
+    of the rows without it. Does nothing if the text column is already dropped.
+    """
+    columns = mysql_utils.table_columns(cursor, table_name)
+    if column not in columns:
+        return
+
+    lookup = lookup_table_name(column)
+    id_column = f'{column}_id'
+    if id_column not in columns:
+        mysql_utils.add_column(cursor, table_name, id_column,
+                               f'{LOOKUP_COLUMNS[column]} AFTER `{column}`')
+    if not count_unmapped(cursor, table_name, column):
+        return
+
+    print(f"Copying '{table_name}.{column}' values into '{lookup}' table.")
+    # plain INSERT, so the names which do not fit raise instead of being truncated
+    cursor.execute(
+        f"INSERT INTO `{lookup}` (`name`) "
+        f"SELECT DISTINCT t.`{column}` COLLATE utf8_bin FROM `{table_name}` t "
+        f"WHERE t.`{column}` IS NOT NULL AND t.`{id_column}` IS NULL AND NOT EXISTS ("
+        f"SELECT 1 FROM `{lookup}` l WHERE l.`name_hash` = UNHEX(SHA2(t.`{column}`, 256)))"
+    )
+    cursor.execute(
+        f"UPDATE `{table_name}` t JOIN `{lookup}` l "
+        f"ON l.`name_hash` = UNHEX(SHA2(t.`{column}`, 256)) "
+        f"SET t.`{id_column}` = l.`id` WHERE t.`{id_column}` IS NULL"
+    )
+
+
+def drop_text_columns(cursor, table_name: str = 'accidents'):
+    """
+    Drops the text columns whose values are copied into the lookup tables (see
+    `normalize_column`). Raises MigrationError, before dropping anything, if any row has a
+    text value without its id.
+    """
+    columns = [
+        column for column in LOOKUP_COLUMNS
+        if column in mysql_utils.table_columns(cursor, table_name)
+    ]
+    unmapped = {column: count_unmapped(cursor, table_name, column) for column in columns}
+    unmapped = {column: n_rows for column, n_rows in unmapped.items() if n_rows}
+    if unmapped:
+        raise MigrationError(
+            f"Rows of '{table_name}' without the ids of their values, no column dropped: "
+            f"{unmapped}"
+        )
+
+    for column in columns:
+        print(f"Dropping '{table_name}.{column}' column.")
+        cursor.execute(f"ALTER TABLE `{table_name}` DROP COLUMN `{column}`")
+    create_accidents_view(cursor)
+
+
+def add_aircraft_foreign_key(cursor):
+    """Adds `accidents.aircraft_id` foreign key when both accidents and aircraft tables exist."""
+    if ('aircraft_id' in mysql_utils.table_columns(cursor, 'accidents')
+            and 'aircraft_id' in mysql_utils.table_columns(cursor, 'aircraft')):
+        mysql_utils.add_foreign_key(
+            cursor, 'accidents', 'fk_accidents_aircraft',
+            "FOREIGN KEY (`aircraft_id`) REFERENCES `aircraft` (`aircraft_id`) "
+            "ON DELETE SET NULL"
+        )
+
+
+def create_accidents_view(cursor):
+    """Creates (or replaces) the view of the accidents with the lookup names."""
+    # the text columns which are not dropped yet are replaced by the lookup names
+    columns = ', '.join(
+        f"a.`{column}`" for column in mysql_utils.table_columns(cursor, 'accidents')
+        if column not in LOOKUP_COLUMNS
+    )
+    names = ', '.join(f"`l_{column}`.`name` AS `{column}`" for column in LOOKUP_COLUMNS)
+    joins = ' '.join(
+        f"LEFT JOIN `{lookup_table_name(column)}` `l_{column}` "
+        f"ON `l_{column}`.`id` = a.`{column}_id`"
+        for column in LOOKUP_COLUMNS
+    )
+    cursor.execute(
+        f"CREATE OR REPLACE VIEW `{ACCIDENTS_VIEW}` AS "
+        f"SELECT {columns}, {names} FROM `accidents` a {joins}"
+    )
+
+
+def normalize_accidents(cursor):
+    """
+    Brings the accidents table to the normalized schema, except for dropping the text
+    columns (see `drop_text_columns`), and (re)creates the view.
+    """
+    for column in LOOKUP_COLUMNS:
+        create_lookup_table(cursor, column)
+        normalize_column(cursor, 'accidents', column)
+
+    # indexes go first, so the foreign keys use them instead of creating their own
+    for index_name, index_definition in ACCIDENTS_INDEXES.items():
+        mysql_utils.add_index(cursor, 'accidents', index_name, index_definition)
+
+    for column in LOOKUP_COLUMNS:
+        mysql_utils.add_foreign_key(
+            cursor, 'accidents', f'fk_accidents_{column}',
+            f"FOREIGN KEY (`{column}_id`) REFERENCES `{lookup_table_name(column)}` (`id`)"
+        )
+
+    add_aircraft_foreign_key(cursor)
+    create_accidents_view(cursor)
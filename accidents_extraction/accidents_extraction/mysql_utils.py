@@ -1,6 +1,16 @@
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
 import mysql.connector
+import mysql.connector.pooling
 from mysql.connector import errorcode
 
+POOL_ARGS = ('pool_name', 'pool_size', 'pool_reset_session', 'pool_acquire_timeout')
+
 
 def create_db(conx, cursor, database):
     """For given connection creates database."""
@@ -36,3 +46,240 @@ def create_table(cursor, table_name, table_data):
             print(err.msg)
     else:
         print(f"Table '{table_name}' successfully created.")
+
+
+def add_column(cursor, table_name, column_name, column_definition):
+    """For given cursor adds column to the existing table, if it does not exist yet."""
+    try:
+        cursor.execute(
+            f"ALTER TABLE `{table_name}` ADD COLUMN `{column_name}` {column_definition}"
+        )
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_DUP_FIELDNAME:
+            print(err.msg)
+    else:
+        print(f"Column '{column_name}' added to table '{table_name}'.")
+
+
+def add_index(cursor, table_name, index_name, index_definition):
+    """For given cursor adds index to the existing table, if it does not exist yet."""
+    try:
+        cursor.execute(f"ALTER TABLE `{table_name}` ADD {index_definition}")
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_DUP_KEYNAME:
+            print(err.msg)
+    else:
+        print(f"Index '{index_name}' added to table '{table_name}'.")
+
+
+def drop_index(cursor, table_name, index_name):
+    """For given cursor drops index of the existing table, if it exists."""
+    try:
+        cursor.execute(f"ALTER TABLE `{table_name}` DROP INDEX `{index_name}`")
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_CANT_DROP_FIELD_OR_KEY:
+            print(err.msg)
+    else:
+        print(f"Index '{index_name}' dropped from table '{table_name}'.")
+
+
+def add_foreign_key(cursor, table_name, constraint_name, constraint_definition):
+    """For given cursor adds foreign key to the existing table, if it does not exist yet."""
+    try:
+        cursor.execute(
+            f"ALTER TABLE `{table_name}` ADD CONSTRAINT `{constraint_name}` {constraint_definition}"
+        )
+    except mysql.connector.Error as err:
+        if err.errno not in (errorcode.ER_FK_DUP_NAME, errorcode.ER_DUP_KEY):
+            print(err.msg)
+    else:
+        print(f"Foreign key '{constraint_name}' added to table '{table_name}'.")
+
+
+def table_columns(cursor, table_name):
+    """Returns the list of the table column names or empty list if there is no such table."""
+    cursor.execute(
+        "SELECT `COLUMN_NAME` FROM `information_schema`.`COLUMNS` "
+        "WHERE `TABLE_SCHEMA` = DATABASE() AND `TABLE_NAME` = %s ORDER BY `ORDINAL_POSITION`",
+        (table_name,)
+    )
+    return [name for (name,) in cursor.fetchall()]
+
+
+def select_column_values(db_settings, table_name, column_name):
+    """Returns the set of distinct non null values of the column or empty set if no table."""
+    try:
+        conx = mysql.connector.connect(**db_settings)
+    except mysql.connector.Error as err:
+        if err.errno == errorcode.ER_BAD_DB_ERROR:
+            return set()
+        raise
+
+    cursor = conx.cursor()
+    try:
+        cursor.execute(
+            f"SELECT DISTINCT `{column_name}` FROM `{table_name}` "
+            f"WHERE `{column_name}` IS NOT NULL"
+        )
+        return {value for (value,) in cursor}
+    except mysql.connector.Error as err:
+        if err.errno == errorcode.ER_NO_SUCH_TABLE:
+            return set()
+        raise
+    finally:
+        cursor.close()
+        conx.close()
+
+
+def select_rows(cursor, query, params=None):
+    """Returns all rows of the query or empty list if the table or column does not exist."""
+    try:
+        cursor.execute(query, params)
+    except mysql.connector.Error as err:
+        if err.errno in (errorcode.ER_NO_SUCH_TABLE, errorcode.ER_BAD_FIELD_ERROR):
+            return []
+        raise
+    return cursor.fetchall()
+
+
+class LookupTable(object):
+    """
+    Name -> id cache of a lookup table with `id` and `name` columns. Names which are not in
+    the table yet are inserted on demand.
+    """
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.ids = {}
+
+    def load(self, cursor):
+        self.ids = {
+            name: id_ for id_, name in select_rows(
+                cursor, f"SELECT `id`, `name` FROM `{self.table_name}`"
+            )
+        }
+
+    def resolve(self, cursor, names):
+        """Makes sure all given (not None) names have ids in the cache."""
+        new_names = list({name for name in names if name is not None} - self.ids.keys())
+        if not new_names:
+            return
+
+        # names inserted meanwhile by another process are kept, the names which do not fit
+        # into the table raise instead of being truncated
+        cursor.executemany(
+            f"INSERT INTO `{self.table_name}` (`name`) VALUES (%s) "
+            f"ON DUPLICATE KEY UPDATE `id` = `id`",
+            [(name,) for name in new_names]
+        )
+        cursor.execute(
+            f"SELECT `id`, `name` FROM `{self.table_name}` "
+            f"WHERE `name_hash` IN ({', '.join(['UNHEX(SHA2(%s, 256))'] * len(new_names))})",
+            new_names
+        )
+        self.ids.update((name, id_) for id_, name in cursor.fetchall())
+
+    def get(self, name):
+        return self.ids.get(name)
+
+
+def connection_settings(db_config: Dict, with_database: bool = True) -> Dict:
+    """Returns db config without the pool options, to be passed to `mysql.connector.connect`."""
+    settings = {k: v for k, v in db_config.items() if k not in POOL_ARGS}
+    if not with_database:
+        settings.pop('database', None)
+    return settings
+
+
+class ConnectionPool(object):
+    """
+    Pool of MySQL connections created from the db config json (user, password, database,
+    host, ...) with optional `pool_size` (default 5) and `pool_acquire_timeout` (seconds to
+    wait for a free connection, default 30) items.
+
+    Connections are health checked on acquisition and reconnected if the server closed them.
+    Acquisition latency, reconnects and the number of acquisitions are tracked in `metrics`.
+    """
+
+    def __init__(self, db_config: Dict):
+        self.pool_size = int(db_config.get('pool_size', 5))
+        self.acquire_timeout = float(db_config.get('pool_acquire_timeout', 30))
+        name = hashlib.sha1(json.dumps(db_config, sort_keys=True).encode()).hexdigest()[:16]
+        self.pool = mysql.connector.pooling.MySQLConnectionPool(
+            pool_name=db_config.get('pool_name', name),
+            pool_size=self.pool_size,
+            pool_reset_session=db_config.get('pool_reset_session', True),
+            **connection_settings(db_config),
+        )
+
+        self.lock = threading.Lock()
+        # notified when a connection is returned to the pool, `releases` counts the returns
+        self.released = threading.Condition()
+        self.releases = 0
+        self.acquisitions = 0
+        self.reconnects = 0
+        self.acquire_seconds = 0.
+        self.max_acquire_seconds = 0.
+
+    def _get_connection(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            with self.released:
+                releases = self.releases
+            try:
+                return self.pool.get_connection()
+            except mysql.connector.errors.PoolError:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise
+                # waits for a connection returned since the attempt, or until the deadline
+                with self.released:
+                    self.released.wait_for(lambda: self.releases != releases, timeout)
+
+    @contextmanager
+    def connection(self):
+        """Yields healthy pooled connection and returns it to the pool afterwards."""
+        start = time.perf_counter()
+        conx = self._get_connection()
+        reconnected = False
+        if not conx.is_connected():
+            conx.reconnect(attempts=3, delay=1)
+            reconnected = True
+        latency = time.perf_counter() - start
+
+        with self.lock:
+            self.acquisitions += 1
+            self.reconnects += reconnected
+            self.acquire_seconds += latency
+            self.max_acquire_seconds = max(self.max_acquire_seconds, latency)
+
+        try:
+            yield conx
+        finally:
+            conx.close()
+            with self.released:
+                self.releases += 1
+                self.released.notify()
+
+    @property
+    def metrics(self) -> Dict:
+        return {
+            'pool_size': self.pool_size,
+            'acquisitions': self.acquisitions,
+            'reconnects': self.reconnects,
+            'acquire_latency_avg': self.acquire_seconds / max(self.acquisitions, 1),
+            'acquire_latency_max': self.max_acquire_seconds,
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_config: Dict) -> ConnectionPool:
+    """Returns the connection pool shared by all users of the same db config in the process."""
+    key = json.dumps(db_config, sort_keys=True)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(db_config)
+        return _pools[key]
@@ -4,28 +4,320 @@
 #
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
+import datetime
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
 import mysql.connector
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
 
-from .mysql_utils import create_db, create_table
+import accidents_extraction.items as items
+import accidents_extraction.migrations as migrations
+import accidents_extraction.rollups as rollups
+import accidents_extraction.schema as schema
+import accidents_extraction.text_index as text_index
+from logger import logger
+from .mysql_utils import (
+    LookupTable, add_column, add_index, connection_settings, create_db, create_table, get_pool,
+    select_rows
+)
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa, pq = None, None
 
-class AccidentsExtractionPipeline(object):
-    # Add database connection parameters in the constructor
-    def __init__(self, database, user, password):
-        self.conx = mysql.connector.connect(user=user, password=password, use_unicode=True)
-        self.cursor = self.conx.cursor()
+# last modification time of the row, used by the analysis snapshot cache to detect changes
+UPDATED_AT_DEFINITION = 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'
+
+# integer key of the aircraft catalogue, the accidents reference it by `aircraft_id`
+AIRCRAFT_ID_DEFINITION = 'INT NOT NULL AUTO_INCREMENT UNIQUE KEY'
+
+
+class MySQLBatchPipeline(ABC):
+    """
+    Base pipeline which buffers items and writes them to MySQL with a single `executemany`
+    call (multi-row INSERT) and a single commit per batch.
+
+    The buffer is flushed when it reaches `batch_size` items, when `flush_interval` seconds
+    have passed since the previous flush (checked with every item and every `flush_interval`
+    seconds, so the rows are written when the items stop arriving too) or when the spider is
+    closed.
+
+    Rows are upserted: a row whose natural key (`key_columns`) is already stored updates the
+    stored row instead of inserting a duplicate, so crawls can be rerun or resumed at will.
 
+    Connections are taken from the process wide pool of `mysql_utils.get_pool` for every
+    flush, the extra db settings (host, port, pool_size, ...) are passed to the pool.
+
+    Values of the `lookup_columns` are stored in lookup tables (see `migrations`), the table
+    has `<column>_id` columns instead of them.
+    """
+    table_name = None
+    item_class = None
+    key_columns = ()
+    lookup_columns = ()
+
+    # Add database connection parameters in the constructor
+    def __init__(self, database, user, password, batch_size=1, flush_interval=None,
+                 stats=None, **db_settings):
         self.database = database
         self.user = user
         self.password = password
+        self.db_settings = dict(
+            db_settings, database=database, user=user, password=password, use_unicode=True
+        )
+        self.pool = None
+
+        self.columns = list(self.item_class.fields)
+        self.db_columns = [
+            f'{column}_id' if column in self.lookup_columns else column for column in self.columns
+        ]
+        self.lookups = {
+            self.columns.index(column): LookupTable(migrations.lookup_table_name(column))
+            for column in self.lookup_columns
+        }
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = flush_interval
+        self.stats = stats
+
+        self.buffer = []
+        self.flush_task = None
+        self.start_time = time.monotonic()
+        self.last_flush = time.monotonic()
+        self.rows_written = 0
+        self.flushes = 0
+        self.flush_seconds = 0.
+        self.max_flush_latency = 0.
+
+    @abstractmethod
+    def create_table(self, cursor):
+        """Creates the table of the items, if it does not exist yet."""
+
+    def migrate_table(self, cursor):
+        """Brings the table created by the previous versions up to date."""
+        pass
+
+    def before_write(self, cursor, rows):
+        """Called with the rows of the batch transaction before they are written."""
+        pass
+
+    def after_write(self, cursor, rows):
+        """Called with the written rows before the batch transaction is committed."""
+        pass
+
+    def after_commit(self, cursor, rows):
+        """Called with the written rows after the batch transaction is committed."""
+        pass
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        db_settings = crawler.settings.getdict("DB_SETTINGS")
+        if not db_settings:
+            raise NotConfigured
+        return cls(
+            **db_settings,
+            batch_size=crawler.settings.getint('DB_BATCH_SIZE', 1),
+            flush_interval=crawler.settings.getfloat('DB_FLUSH_INTERVAL') or None,
+            stats=crawler.stats,
+        )
+
+    # Connect to the database when the spider starts
+    def open_spider(self, spider):
+        # the database may not exist yet, so it is created through a connection without it
+        conx = mysql.connector.connect(**connection_settings(self.db_settings, False))
+        cursor = conx.cursor()
+        try:
+            create_db(conx, cursor, self.database)
+        finally:
+            cursor.close()
+            conx.close()
+
+        self.pool = get_pool(self.db_settings)
+        with self.pool.connection() as conx:
+            cursor = conx.cursor()
+            try:
+                self.create_table(cursor)
+                self.migrate_table(cursor)
+                conx.commit()
+                for lookup in self.lookups.values():
+                    lookup.load(cursor)
+            finally:
+                cursor.close()
+
+        self.start_time = time.monotonic()
+        self.last_flush = time.monotonic()
+        if self.flush_interval:
+            self.flush_task = task.LoopingCall(self.flush_if_elapsed)
+            self.flush_task.start(self.flush_interval, now=False)
+
+    @property
+    def insert_command(self) -> str:
+        dummy_values = ", ".join(['%s'] * len(self.db_columns))
+        keys = ", ".join(self.db_columns)
+        updates = ", ".join(
+            f"{column} = VALUES({column})"
+            for column in self.db_columns if column not in self.key_columns
+        )
+        return (
+            f"INSERT INTO {self.table_name} ({keys}) VALUES ({dummy_values}) "
+            f"ON DUPLICATE KEY UPDATE {updates}"
+        )
+
+    # Buffer data records and insert them into the database batch by batch
+    def process_item(self, item, spider):
+        if not item:
+            return
+
+        self.buffer.append(tuple(item.get(column) for column in self.columns))
+        if len(self.buffer) >= self.batch_size or self._flush_interval_elapsed():
+            self.flush()
+        return item
+
+    def _flush_interval_elapsed(self) -> bool:
+        if not self.flush_interval:
+            return False
+        return time.monotonic() - self.last_flush >= self.flush_interval
+
+    def flush_if_elapsed(self):
+        """Flushes the buffer of the idle pipeline, called every `flush_interval` seconds."""
+        if not self._flush_interval_elapsed():
+            return
+        try:
+            self.flush()
+        except mysql.connector.Error as err:
+            # the timer keeps running, the failed batch is lost as in `process_item`
+            logger.error(f'Failed to flush rows into {self.table_name}: {err}')
+
+    def flush(self):
+        """Writes all buffered rows to the database in one transaction."""
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+
+        rows, self.buffer = self.buffer, []
+        start = time.perf_counter()
+        with self.pool.connection() as conx:
+            cursor = conx.cursor()
+            try:
+                if self.lookups:
+                    rows = self.resolve_lookups(cursor, rows)
+                    # new lookup names are kept even if the batch fails
+                    conx.commit()
+                self.before_write(cursor, rows)
+                cursor.executemany(self.insert_command, rows)
+                self.after_write(cursor, rows)
+                conx.commit()
+                self.after_commit(cursor, rows)
+            except mysql.connector.Error:
+                conx.rollback()
+                raise
+            finally:
+                cursor.close()
+        latency = time.perf_counter() - start
+
+        self.rows_written += len(rows)
+        self.flushes += 1
+        self.flush_seconds += latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self._record_stats(len(rows), latency)
+
+    def resolve_lookups(self, cursor, rows):
+        """Returns the rows with the lookup column names replaced by their ids."""
+        for i, lookup in self.lookups.items():
+            lookup.resolve(cursor, {row[i] for row in rows})
+
+        resolved_rows = []
+        for row in rows:
+            row = list(row)
+            for i, lookup in self.lookups.items():
+                row[i] = lookup.get(row[i])
+            resolved_rows.append(tuple(row))
+        return resolved_rows
+
+    def _record_stats(self, n_rows: int, latency: float):
+        logger.debug(f'Flushed {n_rows} rows into {self.table_name} in {latency:.3f}s.')
+        if self.stats is None:
+            return
+
+        prefix = f'mysql/{self.table_name}'
+        self.stats.inc_value(f'{prefix}/rows_written', n_rows)
+        self.stats.inc_value(f'{prefix}/flushes')
+        self.stats.max_value(f'{prefix}/flush_latency_max', latency)
+        self.stats.set_value(f'{prefix}/flush_latency_avg', self.flush_seconds / self.flushes)
+        self.stats.set_value(f'{prefix}/rows_per_sec', self.rows_per_sec)
+        self.stats.set_value(f'{prefix}/flush_rows_per_sec', self.flush_rows_per_sec)
 
-        self.table_name = 'accidents'
+    @property
+    def rows_per_sec(self) -> float:
+        """Write throughput measured over the wall time since the spider was opened."""
+        elapsed = time.monotonic() - self.start_time
+        if not elapsed:
+            return 0.
+        return self.rows_written / elapsed
 
-        # Implement from_crawler method and get database connection info from settings.py
+    @property
+    def flush_rows_per_sec(self) -> float:
+        """Write throughput measured over the time spent in flushes only."""
+        if not self.flush_seconds:
+            return 0.
+        return self.rows_written / self.flush_seconds
 
-    def create_table(self):
+    # When all done flush the remaining rows
+    def close_spider(self, spider):
+        if self.flush_task is not None and self.flush_task.running:
+            self.flush_task.stop()
+        self.flush()
+
+        if self.stats is not None and self.pool is not None:
+            for name, value in self.pool.metrics.items():
+                self.stats.set_value(f'mysql/pool/{name}', value)
+        if self.flushes:
+            logger.info(
+                f'{self.rows_written} rows written into {self.table_name} with '
+                f'{self.flushes} flushes: {self.rows_per_sec:,.0f} rows/sec '
+                f'({self.flush_rows_per_sec:,.0f} rows/sec in flushes), '
+                f'avg flush latency {self.flush_seconds / self.flushes:.3f}s, '
+                f'max flush latency {self.max_flush_latency:.3f}s.'
+            )
+
+
+class AccidentsExtractionPipeline(MySQLBatchPipeline):
+    table_name = 'accidents'
+    item_class = items.Accident
+    key_columns = ('accident_key',)
+    lookup_columns = tuple(migrations.LOOKUP_COLUMNS)
+    # columns which identify the accidents stored before the natural key was introduced
+    legacy_match_columns = ('year', 'month', 'day', 'aircraft_type', 'operator', 'location')
+
+    def __init__(self, *args, text_index_path=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.aircraft_ids_by_type = {}
+        self.aircraft_ids_by_model = {}
+        self.text_index_path = text_index_path
+        self.text_index = None
+        # years of the stored accidents of the batch being written
+        self.stored_years = set()
+        # whether the table has rows without natural key and the ids of the ones deleted by
+        # the batch being written
+        self.has_legacy_rows = False
+        self.deleted_ids = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = super().from_crawler(crawler)
+        pipeline.text_index_path = crawler.settings.get('TEXT_INDEX_PATH')
+        return pipeline
+
+    def create_table(self, cursor):
         table_data = (
             f"CREATE TABLE `{self.table_name}` ("
+            "  `accident_key` varchar(64),"
             "  `status` varchar(50),"
             "  `time` TIME,"
             "  `weekday` varchar(20),"
@@ -35,16 +327,17 @@ class AccidentsExtractionPipeline(object):
             "  `first_flight` SMALLINT,"
             "  `total_airframe_hrs` INT,"
             "  `aircraft_type` varchar(200) NOT NULL,"
+            "  `aircraft_id` INT,"
             "  `aircraft_main_model` varchar(200),"
-            "  `operator` varchar(100),"
-            "  `country` varchar(1000),"
+            "  `operator_id` INT,"
+            "  `country_id` SMALLINT,"
             "  `location` varchar(1000),"
-            "  `phase` varchar(1000),"
-            "  `nature` varchar(1000),"
+            "  `phase_id` SMALLINT,"
+            "  `nature_id` SMALLINT,"
             "  `engines` varchar(1000),"
             "  `narrative` TEXT,"
             "  `probable_cause` TEXT,"
-            "  `aircraft_damage` varchar(1000),"
+            "  `aircraft_damage_id` SMALLINT,"
             "  `departure_airport` varchar(1000),"
             "  `destination_airport` varchar(1000),"
             "  `crew_occupants` SMALLINT,"
@@ -54,63 +347,172 @@ class AccidentsExtractionPipeline(object):
             "  `total_occupants` SMALLINT,"
             "  `total_fatalities` SMALLINT,"
             "  `ground_fatalities` SMALLINT,"
+            f"  `updated_at` {UPDATED_AT_DEFINITION},"
             "  `id` INT(10) NOT NULL AUTO_INCREMENT,"
-            "  PRIMARY KEY (`id`)"
+            "  PRIMARY KEY (`id`),"
+            "  UNIQUE KEY `accident_key` (`accident_key`),"
+            "  KEY `aircraft_id` (`aircraft_id`)"
             ") ENGINE=InnoDB"
         )
-        create_table(self.cursor, self.table_name, table_data)
+        create_table(cursor, self.table_name, table_data)
 
-    @classmethod
-    def from_crawler(cls, crawler):
-        db_settings = crawler.settings.getdict("DB_SETTINGS")
-        if not db_settings:
-            return
-        return cls(**db_settings)
+    def migrate_table(self, cursor):
+        # rows loaded before the natural key was introduced keep NULL keys, which the unique
+        # index allows, until the crawl writes them again (see `delete_legacy_rows`)
+        add_column(cursor, self.table_name, 'accident_key', 'varchar(64) FIRST')
+        add_index(cursor, self.table_name, 'accident_key',
+                  'UNIQUE KEY `accident_key` (`accident_key`)')
+        add_column(cursor, self.table_name, 'updated_at', UPDATED_AT_DEFINITION)
+        add_column(cursor, self.table_name, 'aircraft_id', 'INT')
+        add_index(cursor, self.table_name, 'aircraft_id', 'KEY `aircraft_id` (`aircraft_id`)')
+        migrations.normalize_accidents(cursor)
+        rollups.create_rollup_table(cursor)
 
-    # Connect to the database when the spider starts
-    def open_spider(self, spider):
-        create_db(self.conx, self.cursor, self.database)
-        self.create_table()
+    def batch_keys(self, rows):
+        key = self.columns.index('accident_key')
+        return [row[key] for row in rows if row[key] is not None]
 
-    # Insert data records into the database (one item at a time)
-    def process_item(self, item, spider):
-        if not item:
+    def before_write(self, cursor, rows):
+        # an upsert may move a stored accident to another year, whose rollup rows change too
+        keys = self.batch_keys(rows)
+        self.stored_years = set()
+        if keys:
+            placeholders = ', '.join(['%s'] * len(keys))
+            cursor.execute(
+                f"SELECT DISTINCT `year` FROM `{self.table_name}` "
+                f"WHERE `accident_key` IN ({placeholders})",
+                keys
+            )
+            self.stored_years = {year for (year,) in cursor.fetchall()}
+
+    def delete_legacy_rows(self, cursor, rows):
+        """
+        Deletes the rows stored without natural key, by the versions before it, which are
+        superseded by the keyed rows of the batch: the same date, aircraft type, operator and
+        location. The first crawl after the migration (full or incremental, which crawls all
+        accidents without stored key) thus replaces them instead of duplicating them.
+        """
+        self.deleted_ids = []
+        if not self.has_legacy_rows:
             return
 
-        keys, values = zip(*item.items())
-        keys, values = list(keys), list(values)
+        key = self.columns.index('accident_key')
+        indexes = [self.columns.index(column) for column in self.legacy_match_columns]
+        match = ' AND '.join(f"`{self.db_columns[i]}` <=> %s" for i in indexes)
+        conditions, params = [], []
+        for row in rows:
+            if row[key] is not None:
+                conditions.append(f"({match})")
+                params.extend(row[i] for i in indexes)
+        if not conditions:
+            return
 
-        keys.append("id")
-        values.append(None)
+        cursor.execute(
+            f"SELECT `id` FROM `{self.table_name}` "
+            f"WHERE `accident_key` IS NULL AND ({' OR '.join(conditions)})",
+            params
+        )
+        self.deleted_ids = [id_ for (id_,) in cursor.fetchall()]
+        if self.deleted_ids:
+            placeholders = ', '.join(['%s'] * len(self.deleted_ids))
+            cursor.execute(
+                f"DELETE FROM `{self.table_name}` WHERE `id` IN ({placeholders})",
+                self.deleted_ids
+            )
+            if self.stats is not None:
+                self.stats.inc_value(f'mysql/{self.table_name}/legacy_rows_deleted',
+                                     len(self.deleted_ids))
 
-        dummy_values = ", ".join(['%s'] * len(keys))
-        keys = ", ".join(keys)
+    def after_write(self, cursor, rows):
+        # the deleted rows have the years of the batch rows, so their rollup is refreshed too
+        self.delete_legacy_rows(cursor, rows)
+        year = self.columns.index('year')
+        rollups.refresh_rollup(cursor, {row[year] for row in rows} | self.stored_years)
 
-        sql_command = f"INSERT INTO {self.table_name} ({keys}) VALUES ({dummy_values})"
-        self.cursor.execute(sql_command, values)
-        self.conx.commit()
-        return item
+    def after_commit(self, cursor, rows):
+        # the stored rows are indexed, so the index gets their ids and the upserted texts.
+        # The `updated_at` watermark is left to the batch updates ("text_index_app.py"), which
+        # index again the rows of the batches failed here, as the rows are already committed
+        if self.text_index is None:
+            return
+        keys = self.batch_keys(rows)
+        try:
+            if self.deleted_ids:
+                self.text_index.remove(self.deleted_ids)
+            if keys:
+                placeholders = ', '.join(['%s'] * len(keys))
+                text_index.index_accidents(
+                    cursor, self.text_index, f"WHERE `accident_key` IN ({placeholders})", keys
+                )
+        except sqlite3.Error as err:
+            # the unread rows of the failed batch would fail the cursor close
+            cursor.fetchall()
+            logger.error(f'Failed to update the text index {self.text_index_path}: {err}')
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        self.load_aircraft_ids()
+        self.has_legacy_rows = self.count_legacy_rows() > 0
+        if self.text_index_path:
+            self.text_index = text_index.TextIndex(self.text_index_path)
 
-    # When all done close the database connection
     def close_spider(self, spider):
-        self.conx.close()
+        super().close_spider(spider)
+        if self.text_index is not None:
+            self.text_index.optimize()
+            self.text_index.close()
 
+    def count_legacy_rows(self) -> int:
+        """Returns the number of the rows stored without natural key."""
+        with self.pool.connection() as conx:
+            cursor = conx.cursor()
+            try:
+                cursor.execute(
+                    f"SELECT COUNT(*) FROM `{self.table_name}` WHERE `accident_key` IS NULL"
+                )
+                (n_rows,) = cursor.fetchone()
+            finally:
+                cursor.close()
+        if n_rows:
+            logger.info(f'{n_rows} accidents without natural key are replaced as they are '
+                        f'crawled again.')
+        return n_rows
 
-class AircraftExtractionPipeline(object):
-    # Add database connection parameters in the constructor
-    def __init__(self, database, user, password):
-        self.conx = mysql.connector.connect(user=user, password=password, use_unicode=True)
-        self.cursor = self.conx.cursor()
+    def load_aircraft_ids(self):
+        """
+        Loads the aircraft type -> aircraft id mapping built by the analysis batch job
+        ("accidents_analysis/aircraft_mapping.py") and the aircraft main model -> aircraft id
+        mapping of the catalogue, used for the types which are not mapped yet.
+        """
+        with self.pool.connection() as conx:
+            cursor = conx.cursor()
+            try:
+                self.aircraft_ids_by_type = dict(select_rows(
+                    cursor,
+                    "SELECT `aircraft_type`, `aircraft_id` FROM `aircraft_type_mapping` "
+                    "WHERE `aircraft_id` IS NOT NULL"
+                ))
+                self.aircraft_ids_by_model = dict(select_rows(
+                    cursor, "SELECT `aircraft_main_model`, `aircraft_id` FROM `aircraft`"
+                ))
+            finally:
+                cursor.close()
 
-        self.database = database
-        self.user = user
-        self.password = password
+    def process_item(self, item, spider):
+        if item:
+            item['aircraft_id'] = (
+                self.aircraft_ids_by_type.get(item.get('aircraft_type'))
+                or self.aircraft_ids_by_model.get(item.get('aircraft_main_model'))
+            )
+        return super().process_item(item, spider)
 
-        self.table_name = 'aircraft'
 
-        # Implement from_crawler method and get database connection info from settings.py
+class AircraftExtractionPipeline(MySQLBatchPipeline):
+    table_name = 'aircraft'
+    item_class = items.Aircraft
+    key_columns = ('aircraft_main_model',)
 
-    def create_table(self):
+    def create_table(self, cursor):
         table_data = (
             f"CREATE TABLE `{self.table_name}` ("
             "  `aircraft_main_model` varchar(200) NOT NULL,"
@@ -125,36 +527,119 @@ class AircraftExtractionPipeline(object):
             "  `maximum_take_off_mass` INT,"
             "  `mass_unit` varchar(200),"
             "  `icao_mass_group` SMALLINT,"
+            f"  `updated_at` {UPDATED_AT_DEFINITION},"
+            f"  `aircraft_id` {AIRCRAFT_ID_DEFINITION},"
             "  PRIMARY KEY (`aircraft_main_model`)"
             ") ENGINE=InnoDB"
         )
-        create_table(self.cursor, self.table_name, table_data)
+        create_table(cursor, self.table_name, table_data)
+
+    def migrate_table(self, cursor):
+        add_column(cursor, self.table_name, 'updated_at', UPDATED_AT_DEFINITION)
+        add_column(cursor, self.table_name, 'aircraft_id', AIRCRAFT_ID_DEFINITION)
+        migrations.add_aircraft_foreign_key(cursor)
+
+
+class ParquetExportPipeline(object):
+    """
+    Writes items into Parquet files with the column types declared in `schema`. Accidents are
+    partitioned by year (hive style), so readers can load only the needed years and columns:
+        <output_dir>/accidents/year=<year>/part-<run>-<n>.parquet
+        <output_dir>/aircraft/part-<run>-<n>.parquet
+
+    Rows are buffered per partition and each buffer is written as a new file when it reaches
+    `row_group_size` rows and when the spider is closed.
+    """
+
+    def __init__(self, output_dir, row_group_size=5000):
+        if pa is None:
+            raise ImportError('Parquet output requires "pyarrow" package.')
+
+        self.output_dir = output_dir
+        self.row_group_size = max(int(row_group_size), 1)
+
+        self.table_name = None
+        self.columns = {}
+        self.partition_column = None
+        self.arrow_schema = None
+        self.buffers = defaultdict(list)
+        self.run_id = time.strftime('%Y%m%d%H%M%S')
+        self.n_files = 0
 
     @classmethod
     def from_crawler(cls, crawler):
-        db_settings = crawler.settings.getdict("DB_SETTINGS")
-        if not db_settings:
-            return
-        return cls(**db_settings)
+        output_dir = crawler.settings.get('PARQUET_OUTPUT_DIR')
+        if not output_dir:
+            raise NotConfigured
+        return cls(output_dir, crawler.settings.getint('PARQUET_ROW_GROUP_SIZE', 5000))
+
+    @staticmethod
+    def arrow_type(dtype: str):
+        if dtype == 'category':
+            return pa.dictionary(pa.int32(), pa.string())
+        if dtype == 'time':
+            return pa.time32('s')
+        if dtype.startswith('int'):
+            return getattr(pa, dtype)()
+        return pa.string()
+
+    @staticmethod
+    def convert(value, dtype: str):
+        """Converts scrapped value into the python value of the declared type or None."""
+        if value is None:
+            return None
+        if dtype.startswith('int'):
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+        if dtype == 'time':
+            return datetime.time(*map(int, value.split(':')))
+        return str(value)
 
-    # Connect to the database when the spider starts
     def open_spider(self, spider):
-        create_db(self.conx, self.cursor, self.database)
-        self.create_table()
+        self.table_name = spider.name
+        columns, self.partition_column = schema.TABLES[self.table_name]
+        self.columns = {
+            column: dtype for column, dtype in columns.items()
+            if column != self.partition_column
+        }
+        self.arrow_schema = pa.schema(
+            [(column, self.arrow_type(dtype)) for column, dtype in self.columns.items()]
+        )
 
-    # Insert data records into the database (one item at a time)
     def process_item(self, item, spider):
-        keys, values = zip(*item.items())
-        keys, values = list(keys), list(values)
-
-        dummy_values = ", ".join(['%s'] * len(keys))
-        keys = ", ".join(keys)
+        if not item:
+            return
 
-        sql_command = f"INSERT INTO {self.table_name} ({keys}) VALUES ({dummy_values})"
-        self.cursor.execute(sql_command, values)
-        self.conx.commit()
+        partition = item.get(self.partition_column) if self.partition_column else None
+        self.buffers[partition].append(item)
+        if len(self.buffers[partition]) >= self.row_group_size:
+            self.write(partition)
         return item
 
-    # When all done close the database connection
+    def write(self, partition):
+        rows = self.buffers.pop(partition)
+        arrays = []
+        for column, dtype in self.columns.items():
+            values = [self.convert(row.get(column), dtype) for row in rows]
+            if dtype == 'category':
+                arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, type=self.arrow_type(dtype)))
+        table = pa.Table.from_arrays(arrays, schema=self.arrow_schema)
+
+        directory = os.path.join(self.output_dir, self.table_name)
+        if self.partition_column:
+            value = '__HIVE_DEFAULT_PARTITION__' if partition is None else partition
+            directory = os.path.join(directory, f'{self.partition_column}={value}')
+        os.makedirs(directory, exist_ok=True)
+
+        path = os.path.join(directory, f'part-{self.run_id}-{self.n_files:05d}.parquet')
+        pq.write_table(table, path)
+        self.n_files += 1
+
     def close_spider(self, spider):
-        self.conx.close()
+        for partition in list(self.buffers):
+            self.write(partition)
+        logger.info(f'{self.n_files} parquet files written into {self.output_dir}.')
@@ -0,0 +1,116 @@
+import itertools
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List
+
+from scrapy.http import HtmlResponse
+
+import accidents_extraction.spiders.accidents as accidents
+import accidents_extraction.spiders.aircraft as aircraft
+from accidents_extraction.html_archive import HtmlArchive
+
+# spider instance of the worker process, its parsing methods are used without crawling
+_spider = None
+
+
+def to_response(page: Dict) -> HtmlResponse:
+    return HtmlResponse(page['url'], body=page['body'], encoding='utf-8')
+
+
+def parse_accident_page(page: Dict):
+    data, aircraft_url = _spider._parse_accident_page(to_response(page))
+    data['aircraft_main_model'] = _spider.aircraft_models.get(aircraft_url)
+    return _spider._process_accident_data(data)
+
+
+def parse_aircraft_specs_page(page: Dict):
+    return next(iter(_spider.parse_aircraft_specs(to_response(page))), None)
+
+
+# data type -> (spider class, archived page kind, page parsing function)
+PARSERS = {
+    'accident': (accidents.AccidentsSpider, HtmlArchive.ACCIDENT, parse_accident_page),
+    'aircraft': (aircraft.AircraftSpider, HtmlArchive.AIRCRAFT_SPECS, parse_aircraft_specs_page),
+}
+
+
+def _init_worker(spider_cls, aircraft_models: Dict[str, str]):
+    global _spider
+    _spider = spider_cls()
+    _spider.aircraft_models = aircraft_models
+
+
+def _parse_shard(args):
+    parse, pages = args
+    start = time.perf_counter()
+    items = [parse(page) for page in pages]
+    return os.getpid(), len(pages), time.perf_counter() - start, items
+
+
+def load_aircraft_models(archive: HtmlArchive, aircraft_models: Dict[str, str] = None):
+    """Returns aircraft type page url -> aircraft main model mapping built from the archive."""
+    aircraft_models = dict(aircraft_models or {})
+    spider = accidents.AccidentsSpider()
+    for page in archive.read(HtmlArchive.AIRCRAFT_TYPE):
+        aircraft_models[page['url']] = spider._parse_aircraft_main_model(to_response(page))
+    return aircraft_models
+
+
+class ReparseEngine(object):
+    """
+    Parses archived html pages in a pool of worker processes.
+
+    Pages are split into shards of `shard_size` pages, each shard is parsed by one worker with
+    the parsing methods of a worker local spider instance. Items are streamed back in the
+    order of the pages, so they can be fed straight into the item pipelines.
+    """
+
+    def __init__(self, data_type: str, workers: int = None, shard_size: int = 64,
+                 aircraft_models: Dict[str, str] = None):
+        self.spider_cls, self.kind, self.parse = PARSERS[data_type]
+        self.workers = workers or os.cpu_count()
+        self.shard_size = shard_size
+        self.aircraft_models = aircraft_models or {}
+
+        # worker pid -> [parsed pages, seconds spent in parsing]
+        self.worker_stats = defaultdict(lambda: [0, 0.])
+        self.n_pages = 0
+        self.duration = 0.
+
+    def _shards(self, pages: Iterable[Dict]) -> Iterator[tuple]:
+        pages = iter(pages)
+        while True:
+            shard = list(itertools.islice(pages, self.shard_size))
+            if not shard:
+                return
+            yield self.parse, shard
+
+    def run(self, pages: Iterable[Dict]) -> Iterator:
+        """Yields parsed items (None items are skipped) in the order of the given pages."""
+        start = time.perf_counter()
+        with multiprocessing.Pool(self.workers, _init_worker,
+                                  (self.spider_cls, self.aircraft_models)) as pool:
+            for pid, n_pages, seconds, items in pool.imap(_parse_shard, self._shards(pages)):
+                self.worker_stats[pid][0] += n_pages
+                self.worker_stats[pid][1] += seconds
+                self.n_pages += n_pages
+                yield from filter(None, items)
+        self.duration += time.perf_counter() - start
+
+    def run_archive(self, archive: HtmlArchive) -> Iterator:
+        return self.run(archive.read(self.kind))
+
+    def report(self) -> List[str]:
+        """Returns throughput report lines: total and per worker pages/sec."""
+        lines = [
+            f'{self.n_pages} pages parsed in {self.duration:.1f}s '
+            f'({self.n_pages / max(self.duration, 1e-9):,.0f} pages/sec, '
+            f'{self.workers} workers).'
+        ]
+        for pid, (n_pages, seconds) in sorted(self.worker_stats.items()):
+            lines.append(
+                f'worker {pid}: {n_pages} pages, {n_pages / max(seconds, 1e-9):,.0f} pages/sec.'
+            )
+        return lines
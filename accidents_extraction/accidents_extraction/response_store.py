@@ -0,0 +1,76 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Tuple
+
+
+class ResponseStore(object):
+    """
+    On-disk store of downloaded responses.
+
+    Bodies are gzip compressed and content-addressed: each body is saved once under its sha1
+    digest, no matter how many urls return it. Response metadata (url, status, headers, body
+    digest and storing time) is saved as a small JSON file under the request key.
+
+    Layout:
+        <root>/meta/<key[:2]>/<key>.json
+        <root>/objects/<digest[:2]>/<digest>.gz
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, 'meta', key[:2], f'{key}.json')
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], f'{digest}.gz')
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as outfile:
+            outfile.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key: str) -> Dict or None:
+        """Returns stored metadata for the key or None."""
+        try:
+            with open(self._meta_path(key), 'r') as infile:
+                return json.load(infile)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read_body(self, digest: str) -> bytes or None:
+        try:
+            with gzip.open(self._object_path(digest), 'rb') as infile:
+                return infile.read()
+        except (FileNotFoundError, OSError, EOFError):
+            return None
+
+    def put(self, key: str, url: str, status: int, headers: List[Tuple[str, str]],
+            body: bytes) -> Dict:
+        """Stores the response and returns its metadata."""
+        digest = hashlib.sha1(body).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            self._write_atomic(object_path, gzip.compress(body))
+
+        meta = {
+            'url': url,
+            'status': status,
+            'headers': headers,
+            'digest': digest,
+            'stored_at': time.time(),
+        }
+        self._write_atomic(self._meta_path(key), json.dumps(meta).encode())
+        return meta
+
+    def touch(self, key: str, meta: Dict) -> Dict:
+        """Marks stored response as fresh again, e.g. after "304 Not Modified" answer."""
+        meta = dict(meta, stored_at=time.time())
+        self._write_atomic(self._meta_path(key), json.dumps(meta).encode())
+        return meta
@@ -0,0 +1,98 @@
+"""
+Pre-aggregated accidents rollup table.
+
+`accidents_rollup` holds the number of accidents, the number of accidents with known
+fatalities, the fatalities sum and the occupants sum (of the accidents with known
+fatalities) per year, flight phase, nature group and time range, the dimensions of the
+analysis charts. The pipeline recomputes the rows of the years affected by every written
+batch in the same transaction, so the rollup is always consistent with the accidents.
+
+The nature groups and time ranges are the same as in "accidents_analysis/features.py".
+"""
+from typing import Iterable
+
+from .migrations import lookup_table_name
+from .mysql_utils import create_table
+
+ROLLUP_TABLE = 'accidents_rollup'
+DIMENSIONS = ('year', 'phase', 'nature_group', 'time_range')
+MEASURES = ('accidents', 'fatalities_count', 'fatalities_sum', 'occupants_sum')
+
+NATURE_GROUP = (
+    "CASE"
+    " WHEN n.`name` IS NULL THEN 'Unknown'"
+    " WHEN n.`name` IN ('Military', 'Unknown', 'Test', 'Cargo', 'Private',"
+    "  'Official state flight') THEN n.`name`"
+    " WHEN n.`name` IN ('Executive', 'Training') THEN 'Training / Executive'"
+    " WHEN n.`name` LIKE '%Passenger%' THEN 'Passenger'"
+    " WHEN n.`name` IN ('Agricultural', 'Survey/research',"
+    "  'Aerial Work (Calibration, Photo)') THEN 'Scientific'"
+    " ELSE 'Other'"
+    " END"
+)
+
+TIME_RANGE = (
+    "CASE"
+    " WHEN a.`time` IS NULL THEN 'Unknown'"
+    " WHEN HOUR(a.`time`) < 4 THEN '00:00 - 03:59'"
+    " WHEN HOUR(a.`time`) < 8 THEN '04:00 - 07:59'"
+    " WHEN HOUR(a.`time`) < 12 THEN '08:00 - 11:59'"
+    " WHEN HOUR(a.`time`) < 16 THEN '12:00 - 15:59'"
+    " WHEN HOUR(a.`time`) < 20 THEN '16:00 - 19:59'"
+    " ELSE '20:00 - 23:59'"
+    " END"
+)
+
+AGGREGATE_ACCIDENTS = (
+    f"SELECT a.`year`, COALESCE(p.`name`, 'Unknown'), {NATURE_GROUP}, {TIME_RANGE},"
+    " COUNT(*), COUNT(a.`total_fatalities`), COALESCE(SUM(a.`total_fatalities`), 0),"
+    " COALESCE(SUM(CASE WHEN a.`total_fatalities` IS NOT NULL"
+    "  THEN a.`total_occupants` END), 0) "
+    "FROM `accidents` a"
+    f" LEFT JOIN `{lookup_table_name('phase')}` p ON p.`id` = a.`phase_id`"
+    f" LEFT JOIN `{lookup_table_name('nature')}` n ON n.`id` = a.`nature_id` "
+    "WHERE a.`year` IS NOT NULL{condition} "
+    "GROUP BY 1, 2, 3, 4"
+)
+
+
+def create_rollup_table(cursor):
+    """Creates the rollup table and fills it, if it does not exist yet."""
+    table_data = (
+        f"CREATE TABLE `{ROLLUP_TABLE}` ("
+        "  `year` SMALLINT NOT NULL,"
+        "  `phase` varchar(255) CHARACTER SET utf8 COLLATE utf8_bin NOT NULL,"
+        "  `nature_group` varchar(30) NOT NULL,"
+        "  `time_range` varchar(20) NOT NULL,"
+        "  `accidents` INT NOT NULL,"
+        "  `fatalities_count` INT NOT NULL,"
+        "  `fatalities_sum` INT NOT NULL,"
+        "  `occupants_sum` INT NOT NULL,"
+        "  PRIMARY KEY (`year`, `phase`, `nature_group`, `time_range`)"
+        ") ENGINE=InnoDB"
+    )
+    create_table(cursor, ROLLUP_TABLE, table_data)
+
+    cursor.execute(f"SELECT 1 FROM `{ROLLUP_TABLE}` LIMIT 1")
+    if not cursor.fetchall():
+        refresh_rollup(cursor)
+
+
+def refresh_rollup(cursor, years: Iterable[int] = None):
+    """Recomputes the rollup rows of the given years (all years by default), no commit."""
+    if years is None:
+        cursor.execute(f"DELETE FROM `{ROLLUP_TABLE}`")
+        condition, params = '', ()
+    else:
+        years = sorted({int(year) for year in years if year is not None})
+        if not years:
+            return
+        placeholders = ', '.join(['%s'] * len(years))
+        cursor.execute(f"DELETE FROM `{ROLLUP_TABLE}` WHERE `year` IN ({placeholders})", years)
+        condition, params = f" AND a.`year` IN ({placeholders})", years
+
+    cursor.execute(
+        f"INSERT INTO `{ROLLUP_TABLE}` ({', '.join(DIMENSIONS + MEASURES)}) "
+        + AGGREGATE_ACCIDENTS.format(condition=condition),
+        params or None
+    )
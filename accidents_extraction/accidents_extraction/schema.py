@@ -0,0 +1,67 @@
+"""
+Declared column types of the scrapped tables.
+
+Types are given in a storage independent notation:
+    'string'    - free text value (short)
+    'text'      - free text value (long, e.g. narrative)
+    'category'  - low cardinality text value
+    'int8', 'int16', 'int32' - integer value
+    'time'      - time of day in "HH:MM:SS" format
+
+The item fields (see `items`) carry their type as `dtype` metadata, the Parquet output and
+the analysis loaders ("accidents_analysis/utils.py") convert the columns to these types.
+"""
+
+ACCIDENTS = {
+    'accident_key': 'string',
+    'status': 'category',
+    'weekday': 'category',
+    'day': 'int8',
+    'month': 'int8',
+    'year': 'int16',
+    'first_flight': 'int16',
+    'time': 'time',
+    'aircraft_type': 'category',
+    'aircraft_main_model': 'category',
+    'operator': 'category',
+    'crew_occupants': 'int16',
+    'crew_fatalities': 'int16',
+    'passengers_occupants': 'int16',
+    'passengers_fatalities': 'int16',
+    'total_occupants': 'int16',
+    'total_fatalities': 'int16',
+    'ground_fatalities': 'int16',
+    'phase': 'category',
+    'nature': 'category',
+    'aircraft_damage': 'category',
+    'country': 'category',
+    'location': 'string',
+    'narrative': 'text',
+    'probable_cause': 'text',
+    'departure_airport': 'category',
+    'destination_airport': 'category',
+    'engines': 'category',
+    'total_airframe_hrs': 'int32',
+    'aircraft_id': 'int32',
+}
+
+AIRCRAFT = {
+    'aircraft_main_model': 'string',
+    'manufacturer': 'category',
+    'country': 'category',
+    'icao_type_designator': 'category',
+    'first_flight': 'int16',
+    'production_ended': 'string',
+    'production_total': 'string',
+    'propulsion': 'category',
+    'maximum_number_of_passengers': 'int16',
+    'maximum_take_off_mass': 'int32',
+    'mass_unit': 'category',
+    'icao_mass_group': 'int8',
+}
+
+# table name -> (column types, partition column)
+TABLES = {
+    'accidents': (ACCIDENTS, 'year'),
+    'aircraft': (AIRCRAFT, None),
+}
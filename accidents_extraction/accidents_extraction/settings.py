@@ -21,7 +21,7 @@ NEWSPIDER_MODULE = 'accidents_extraction.spiders'
 ROBOTSTXT_OBEY = True
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-# CONCURRENT_REQUESTS = 32
+CONCURRENT_REQUESTS = 8
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
@@ -45,15 +45,59 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-# SPIDER_MIDDLEWARES = {
-#    'accidents_extraction.middlewares.AccidentsExtractionSpiderMiddleware': 543,
-# }
+SPIDER_MIDDLEWARES = {
+    # 'accidents_extraction.middlewares.AccidentsExtractionSpiderMiddleware': 543,
+    # closest to the spider, so only the callbacks are timed
+    'accidents_extraction.middlewares.CrawlMetricsMiddleware': 1000,
+}
+
+# Crawl metrics (parse time per callback, download and pipelines latency, items/sec,
+# scheduler backlog) are logged every CRAWL_METRICS_INTERVAL seconds and when the spider is
+# closed, the optional CRAWL_METRICS_FILE gets the latest JSON snapshot and the final summary.
+CRAWL_METRICS_ENABLED = True
+CRAWL_METRICS_INTERVAL = 60
+# CRAWL_METRICS_FILE = 'crawl_metrics.json'
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    'accidents_extraction.middlewares.AccidentsExtractionDownloaderMiddleware': 543,
-# }
+DOWNLOADER_MIDDLEWARES = {
+    # 'accidents_extraction.middlewares.AccidentsExtractionDownloaderMiddleware': 543,
+    # closer to the downloader than the retries (550) to see the error responses
+    'accidents_extraction.middlewares.AdaptiveConcurrencyMiddleware': 850,
+    'accidents_extraction.middlewares.ResponseCacheMiddleware': 900,
+}
+
+# Adaptive concurrency: every url class (the first matching pattern wins) is downloaded in
+# its own slot whose concurrency starts at ADAPTIVE_CONCURRENCY_START and grows by one per
+# window of successful responses up to ADAPTIVE_CONCURRENCY_MAX. Error responses, download
+# exceptions and an average latency above ADAPTIVE_CONCURRENCY_LATENCY_FACTOR times the
+# lowest one halve it; at concurrency 1 the slot delay is doubled up to
+# ADAPTIVE_CONCURRENCY_MAX_DELAY seconds instead. It replaces AutoThrottle, which applies
+# one delay to all pages of the website. CONCURRENT_REQUESTS caps the total.
+ADAPTIVE_CONCURRENCY_ENABLED = True
+ADAPTIVE_CONCURRENCY_URL_CLASSES = [
+    (r'Year=\d{4}', 'year'),  # year index pages
+    (r'/database/record\.php', 'accident'),  # accident pages
+    (r'/database/type/', 'aircraft'),  # aircraft type and specs pages
+]
+ADAPTIVE_CONCURRENCY_START = 1
+ADAPTIVE_CONCURRENCY_MAX = 4
+ADAPTIVE_CONCURRENCY_LATENCY_FACTOR = 3.0
+ADAPTIVE_CONCURRENCY_MAX_DELAY = 3
+ADAPTIVE_CONCURRENCY_ERROR_CODES = [408, 429, 500, 502, 503, 504]
+
+# Local response cache: gzip compressed, content-addressed bodies stored inside the
+# project data dir (.scrapy/RESPONSE_CACHE_DIR). The expiration of the stored responses is
+# given per url pattern in seconds, the first matching pattern wins; expired responses are
+# revalidated with conditional requests. None means never expire.
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_DIR = 'response_cache'
+RESPONSE_CACHE_EXPIRATION = [
+    (r'Year=\d{4}', 24 * 60 * 60),  # year index pages
+    (r'/database/record\.php', 30 * 24 * 60 * 60),  # accident pages
+    (r'/database/type/', 30 * 24 * 60 * 60),  # aircraft type and specs pages
+]
+RESPONSE_CACHE_EXPIRATION_SECS = 24 * 60 * 60
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -61,12 +105,36 @@ ROBOTSTXT_OBEY = True
 #    'scrapy.extensions.telnet.TelnetConsole': None,
 # }
 
+# Optional JSON file which persists the aircraft type page url -> aircraft main model
+# mapping resolved by the accidents spider between runs.
+# AIRCRAFT_MODELS_CACHE = 'aircraft_models.json'
+
+# Optional directory for archiving the raw html pages (see html_archive.HtmlArchive), which
+# can be parsed again offline with reparse_app.py.
+# HTML_ARCHIVE_DIR = 'html_archive'
+
+# Optional SQLite file of the full-text index of the accident narratives and probable causes
+# (see text_index.TextIndex), updated by the MySQL pipeline with every written batch.
+# TEXT_INDEX_PATH = 'accidents_text.sqlite'
+
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+# MySQL pipelines buffer items and write them with one multi-row INSERT and one commit per
+# batch. A batch is flushed when it reaches DB_BATCH_SIZE items or when DB_FLUSH_INTERVAL
+# seconds have passed since the previous flush (also while no items arrive). DB_BATCH_SIZE = 1
+# writes item by item.
+DB_BATCH_SIZE = 500
+DB_FLUSH_INTERVAL = 30
+
+# Parquet output (scrapping_app.py --output-type parquet) writes a new file per partition
+# each time PARQUET_ROW_GROUP_SIZE items of the partition are buffered.
+PARQUET_ROW_GROUP_SIZE = 5000
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-AUTOTHROTTLE_ENABLED = True
+# (disabled in favour of the adaptive concurrency above)
+AUTOTHROTTLE_ENABLED = False
 # The initial download delay
 AUTOTHROTTLE_START_DELAY = 1
 # The maximum download delay to be set in case of high latencies
@@ -1,15 +1,20 @@
 import datetime
+import hashlib
+import json
+import os
 import re
-import time
-from typing import Dict, Tuple
-from urllib.parse import urljoin
+from typing import Dict, List, Set, Tuple
+from urllib.parse import parse_qs, urljoin, urlparse
 
+import accidents_extraction.fields as fields
 import accidents_extraction.items as items
 import scrapy
+from accidents_extraction.html_archive import HtmlArchive
 from scrapy.linkextractors import LinkExtractor
 from scrapy.spiders import Rule, CrawlSpider
 
 from logger import logger
+from utils import read_json
 
 
 class AccidentsSpider(CrawlSpider):
@@ -41,6 +46,53 @@ class AccidentsSpider(CrawlSpider):
         )
     ]
 
+    # scheduling priorities (higher first, year pages have 0): the aircraft type pages
+    # complete the accidents waiting for them in `pending_accidents`, the accident pages of
+    # the downloaded years go before the next year pages, which bounds the accidents in memory
+    accident_priority = 10
+    aircraft_priority = 20
+
+    def __init__(self, *args, incremental: bool = False, recent_years: int = 2,
+                 known_keys: Set[str] = None, base_url: str = None, **kwargs):
+        """
+        In incremental mode all accidents of the current year and of the previous
+        `recent_years - 1` years are crawled again, while for older years only the accidents
+        whose keys are not in `known_keys` (already stored accidents) are crawled.
+        `base_url` replaces the database url of the website, e.g. for a local mirror.
+        """
+        if base_url:
+            self.base_url = base_url
+            self.start_urls = [base_url]
+        super().__init__(*args, **kwargs)
+        self.incremental = incremental
+        self.known_keys = known_keys or set()
+        self.first_recent_year = datetime.date.today().year - int(recent_years) + 1
+
+        # aircraft type page url -> aircraft main model, each type page is requested once
+        self.aircraft_models: Dict[str, str] = {}
+        # aircraft type page url -> accidents waiting for the type page to be downloaded
+        self.pending_accidents: Dict[str, List[Dict]] = {}
+        self.aircraft_models_path = None
+        self.archive = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.aircraft_models_path = crawler.settings.get('AIRCRAFT_MODELS_CACHE')
+        if spider.aircraft_models_path and os.path.exists(spider.aircraft_models_path):
+            spider.aircraft_models.update(read_json(spider.aircraft_models_path))
+            logger.info(f'{len(spider.aircraft_models)} aircraft models loaded from cache.')
+        if crawler.settings.get('HTML_ARCHIVE_DIR'):
+            spider.archive = HtmlArchive(crawler.settings['HTML_ARCHIVE_DIR'])
+        return spider
+
+    def closed(self, reason):
+        if self.archive:
+            self.archive.close()
+        if self.aircraft_models_path:
+            with open(self.aircraft_models_path, 'w') as outfile:
+                json.dump(self.aircraft_models, outfile, indent=1, sort_keys=True)
+
     def parse_accidents_for_year(self, response):
         # extracting table rows
         urls = response.xpath('//*[@id="contentcolumnfull"]/div')
@@ -54,12 +106,51 @@ class AccidentsSpider(CrawlSpider):
         else:
             logger.info(f'For year={year} {len(urls)} accidents have been found.')
 
+        urls = [urljoin(self.base_url, url) for url in urls]
+        if self.incremental and int(year) < self.first_recent_year:
+            n_urls = len(urls)
+            urls = [url for url in urls if self._parse_accident_key(url) not in self.known_keys]
+            logger.info(f'For year={year} {n_urls - len(urls)} stored accidents are skipped.')
+
         for url in urls:
-            yield scrapy.Request(urljoin(self.base_url, url), callback=self.parse_accident)
+            yield scrapy.Request(url, callback=self.parse_accident, meta={'year': year},
+                                 priority=self.accident_priority)
 
     def parse_accident(self, response):
+        if self.archive:
+            self.archive.write(
+                HtmlArchive.ACCIDENT, response.url, response.text,
+                response.meta.get('year', 'unknown')
+            )
+
+        data, aircraft_url = self._parse_accident_page(response)
+        if not aircraft_url:
+            data['aircraft_main_model'] = None
+            return self._process_accident_data(data)
+
+        if aircraft_url in self.aircraft_models:
+            data['aircraft_main_model'] = self.aircraft_models[aircraft_url]
+            return self._process_accident_data(data)
+
+        if aircraft_url in self.pending_accidents:
+            # the type page is already requested, the accident is completed with its response
+            self.pending_accidents[aircraft_url].append(data)
+            return
+
+        self.pending_accidents[aircraft_url] = [data]
+        return scrapy.Request(
+            aircraft_url,
+            callback=self.parse_aircraft_data,
+            errback=self.parse_aircraft_data_error,
+            meta={'aircraft_url': aircraft_url},
+            priority=self.aircraft_priority,
+            dont_filter=True,
+        )
+
+    def _parse_accident_page(self, response) -> Tuple[Dict, str]:
+        """Extracts raw accident data and the url of the aircraft type page."""
         aircraft_url = None
-        data = {}
+        data = {'url': response.url}
 
         table_rows = response.xpath('//*[@id="contentcolumn"]/div/table//tr')
         for row in table_rows:
@@ -78,32 +169,42 @@ class AccidentsSpider(CrawlSpider):
         cause = response.xpath('//*[@id="contentcolumn"]/div/span[3]').css('*::text').extract()
         data['ProbableCause'] = self._correct_str(''.join(cause))
 
-        if not aircraft_url:
-            data['aircraft_main_model'] = None
-            return self._process_accident_data(data)
-
-        return scrapy.Request(
-            aircraft_url,
-            callback=self.parse_aircraft_data,
-            meta={'data': data},
-            dont_filter=True,
-        )
+        return data, aircraft_url
 
     def parse_aircraft_data(self, response):
-        data = response.meta.get('data')
+        aircraft_url = response.meta['aircraft_url']
+        if self.archive:
+            self.archive.write(HtmlArchive.AIRCRAFT_TYPE, aircraft_url, response.text)
+        self.aircraft_models[aircraft_url] = self._parse_aircraft_main_model(response)
+        yield from self._complete_pending_accidents(aircraft_url)
+
+    def parse_aircraft_data_error(self, failure):
+        # the model is not cached, so that next accidents of this type request the page again
+        aircraft_url = failure.request.meta['aircraft_url']
+        logger.warn(f'Aircraft url={aircraft_url} failed: {failure.value!r}.')
+        yield from self._complete_pending_accidents(aircraft_url)
+
+    def _complete_pending_accidents(self, aircraft_url: str):
+        model = self.aircraft_models.get(aircraft_url)
+        for data in self.pending_accidents.pop(aircraft_url, []):
+            data['aircraft_main_model'] = model
+            accident = self._process_accident_data(data)
+            if accident:
+                yield accident
+
+    def _parse_aircraft_main_model(self, response) -> str:
         try:
             [model] = response.xpath('//*[@id="inside"]/div[4]').css('*::text').getall()
-            data['aircraft_main_model'] = self._correct_str(model)
+            return self._correct_str(model)
         except ValueError:
-            data['aircraft_main_model'] = None
-
-        return self._process_accident_data(data)
+            return None
 
     def _process_accident_data(self, data: Dict):
         if 'Date' not in data:
             return
 
         accident = items.Accident()
+        accident['accident_key'] = self._parse_accident_key(data['url'])
         accident['status'] = data.get('Status', None)
         accident['time'] = self._parse_time(data.get('Time', None))
         accident['weekday'], accident['day'], accident['month'], accident['year'] = (
@@ -135,165 +236,26 @@ class AccidentsSpider(CrawlSpider):
         return accident
 
     @staticmethod
-    def _correct_str(x: str) -> str:
-        if not x:
-            return
-        x = x.replace('é', 'e')
-        x = x.encode("ascii", errors="ignore").decode()
-        x = re.sub(r' +', ' ', x.rstrip()).strip()
-        return x
-
-    @staticmethod
-    def _parse_time(x: str) -> str:
-        if not x:
-            return
-
-        # ca or c. means circa which translated from latin means approximate
-        x = x.replace('ca', '').replace('c.', '').replace(' ', '')
-
-        if re.match(r'^(2[0-3]|[01]?[0-9]):([0-5]?[0-9])$', x):
-            return str(datetime.datetime.strptime(x, '%H:%M').time())
-        elif re.match(r'^(2[0-3]|[01]?[0-9]):([0-5]?[0-9]):([0-5]?[0-9])$', x):
-            return str(datetime.datetime.strptime(x, '%H:%M:%S').time())
-        else:
-            return
-
-    @staticmethod
-    def _parse_date(x: str) -> Tuple:
-
-        def get_month(month_str: str) -> int:
-            if 'xx' in month_str.lower():
-                return
-
-            if len(month_str) == 3:
-                return time.strptime(month_str, "%b").tm_mon
-            else:
-                return time.strptime(month_str, "%B").tm_mon
-
-        x = x.split()
-        if len(x) == 3:
-            weekday, day, month, year = None, None, x[-2], x[-1]
-            try:
-                month, year = get_month(month), int(year)
-            except ValueError:
-                month, year = None, None
-        elif len(x) == 4:
-            [weekday, day, month, year] = x
-            try:
-                day, month, year = int(day), get_month(month), int(year)
-            except ValueError:
-                day, month, year = None, None, None
-        else:
-            weekday, day, month, year = None, None, None, None
-
-        return weekday, day, month, year
-
-    @staticmethod
-    def _parse_operator(data: Dict) -> str:
-        operator = data.get('Operator', '')
-        if not operator:
-            operator = data.get('Operating for', '')
-        return operator.encode("ascii", errors="ignore").decode()
-
-    @staticmethod
-    def _parse_location(x: str) -> Tuple:
-        country = x.rstrip("*")[x.rfind("(") + 1:-1]
-        country = country.strip()
-        x = x[: -(len(country) + 4)].strip()
-
-        if not country or country == 'Unknown country':
-            country = 'Unknown'
-
-        if not x:
-            x = 'Unknown'
-
-        return country, x
-
-    @staticmethod
-    def _parse_phase(x: str) -> str:
-        if not x:
-            return 'Unknown'
-        elif x in ('()', '(CMB)', 'Unknown (UNK)'):
-            return 'Unknown'
-        else:
-            return x
-
-    @staticmethod
-    def _parse_nature(nature: str) -> str:
-        if not nature or nature == '-':
-            return 'Unknown'
-        else:
-            return nature
-
-    @staticmethod
-    def _parse_airport(x: str) -> str:
-        if not x or x in ('?', '-'):
-            return 'Unknown'
-        else:
-            return x
-
-    @staticmethod
-    def _parse_people_data(data: Dict) -> Dict:
-        output = {}
-        for name in ('Crew', 'Passengers', 'Total'):
-            try:
-                [data_1, data_2] = [x.strip() for x in data[name].split('/')]
-                if 'Occupants' in data_1 and 'Fatalities' in data_2:
-                    occupants_data, fatalities_data = data_1, data_2
-                elif 'Occupants' in data_2 and 'Fatalities' in data_1:
-                    occupants_data, fatalities_data = data_2, data_1
-                else:
-                    occupants_data, fatalities_data = None, None
-            except ValueError:
-                occupants_data, fatalities_data = None, None
-
-            if not occupants_data and fatalities_data:
-                occupants, fatalities = None, None
-            else:
-                occupants = list(map(int, re.findall(r'\d+', occupants_data)))
-                occupants = (occupants[0:1] or (None,))[0]
-
-                fatalities = list(map(int, re.findall(r'\d+', fatalities_data)))
-                fatalities = (fatalities[0:1] or (None,))[0]
-
-            if fatalities and not occupants:
-                occupants = fatalities
-
-            output[f'{name.lower()}_occupants'] = occupants
-            output[f'{name.lower()}_fatalities'] = fatalities
-
-        ground_fatalities = data.get('Ground casualties')
-        if ground_fatalities:
-            if 'Fatalities' in ground_fatalities:
-                ground_fatalities = list(map(int, re.findall(r'\d+', ground_fatalities)))
-                ground_fatalities = (ground_fatalities[0:1] or (None,))[0]
-        output['ground_fatalities'] = ground_fatalities
-
-        return output
-
-    @staticmethod
-    def _parse_first_flight(x: str) -> int:
-        if not x:
-            return
-        else:
-            try:
-                return int(x[:4])
-            except ValueError:
-                return
-
-    @staticmethod
-    def _parse_airframe_hrs(x: str) -> int:
-        if not x:
-            return
-        else:
-            try:
-                return int(x)
-            except ValueError:
-                return
-
-    @staticmethod
-    def _parse_aircraft_damage(x: str) -> str:
-        if not x or x == 'Missing':
-            return 'Unknown'
-        else:
-            return x
+    def _parse_accident_key(url: str) -> str:
+        """
+        Returns the natural key of the accident: the ASN record id from the accident page url
+        (e.g. "19190802-0" for "record.php?id=19190802-0") or the sha1 of the url itself.
+        """
+        record_id = parse_qs(urlparse(url).query).get('id', [None])[0]
+        if record_id:
+            return record_id
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    # field normalization helpers, see accidents_extraction.fields
+    _correct_str = staticmethod(fields.correct_str)
+    _parse_time = staticmethod(fields.parse_time)
+    _parse_date = staticmethod(fields.parse_date)
+    _parse_operator = staticmethod(fields.parse_operator)
+    _parse_location = staticmethod(fields.parse_location)
+    _parse_phase = staticmethod(fields.parse_phase)
+    _parse_nature = staticmethod(fields.parse_nature)
+    _parse_airport = staticmethod(fields.parse_airport)
+    _parse_people_data = staticmethod(fields.parse_people_data)
+    _parse_first_flight = staticmethod(fields.parse_first_flight)
+    _parse_airframe_hrs = staticmethod(fields.parse_airframe_hrs)
+    _parse_aircraft_damage = staticmethod(fields.parse_aircraft_damage)
@@ -1,8 +1,9 @@
-import re
 from typing import Dict, Tuple
 
+import accidents_extraction.fields as fields
 import accidents_extraction.items as items
 import scrapy
+from accidents_extraction.html_archive import HtmlArchive
 from scrapy.linkextractors import LinkExtractor
 from scrapy.spiders import Rule, CrawlSpider
 
@@ -31,6 +32,19 @@ class AircraftSpider(CrawlSpider):
         )
     ]
 
+    archive = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if crawler.settings.get('HTML_ARCHIVE_DIR'):
+            spider.archive = HtmlArchive(crawler.settings['HTML_ARCHIVE_DIR'])
+        return spider
+
+    def closed(self, reason):
+        if self.archive:
+            self.archive.close()
+
     def parse_aircraft(self, response):
         # extracting aircraft specifications rows
         aircraft_url = response.url
@@ -43,6 +57,9 @@ class AircraftSpider(CrawlSpider):
         yield request
 
     def parse_aircraft_specs(self, response):
+        if self.archive:
+            self.archive.write(HtmlArchive.AIRCRAFT_SPECS, response.url, response.text)
+
         data = {}
         try:
             [aircraft_type] = response.xpath('//*[@id="inside"]/div[4]').css('*::text').getall()
@@ -69,14 +86,7 @@ class AircraftSpider(CrawlSpider):
 
         yield self._process_aircraft_data(data)
 
-    @staticmethod
-    def _correct_str(x: str) -> str:
-        if not x:
-            return None
-        x = x.replace('é', 'e')
-        x = x.encode("ascii", errors="ignore").decode()
-        x = re.sub(r' +', ' ', x.rstrip()).strip()
-        return x
+    _correct_str = staticmethod(fields.correct_str)
 
     def _process_aircraft_data(self, data: Dict):
         aircraft = items.Aircraft()
@@ -0,0 +1,181 @@
+"""
+Local full-text index of the accident narratives and probable causes.
+
+The texts are indexed in a SQLite FTS5 table (porter stemmed words) stored in a local file,
+next to a table with the year and the country of every accident. Queries use the FTS5
+syntax: words, "phrases", AND / OR / NOT, NEAR(...) and column filters (e.g.
+`probable_cause: fatigue`), and return the ids of the matching MySQL `accidents` rows ordered
+by relevance, without loading the texts into memory.
+
+The index is updated by `AccidentsExtractionPipeline` for every written batch (see
+TEXT_INDEX_PATH setting) or by the batch job of "text_index_app.py" over the stored accidents.
+Only the batch job moves its `updated_at` watermark, so it also indexes the batches which the
+pipeline failed to index.
+
+Example:
+    index = TextIndex('accidents_text.sqlite')
+    ids = index.search('"engine failure" AND icing', years=(1970, 1999), country='Canada')
+"""
+import sqlite3
+from typing import Iterable, List, Tuple
+
+from .migrations import ACCIDENTS_VIEW
+
+TEXT_COLUMNS = ('narrative', 'probable_cause')
+
+# accident rows of the index: id, year, country, narrative, probable cause
+SELECT_ACCIDENTS = (
+    f"SELECT `id`, `year`, `country`, {', '.join(f'`{c}`' for c in TEXT_COLUMNS)}, "
+    f"`updated_at` FROM `{ACCIDENTS_VIEW}`"
+)
+
+
+class TextIndex(object):
+    """SQLite FTS5 index of the accident texts, keyed by the MySQL accident id."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS accidents ("
+                "  id INTEGER PRIMARY KEY,"
+                "  year INTEGER,"
+                "  country TEXT"
+                ")"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS accidents_country_year ON accidents (country, year)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS accidents_year ON accidents (year)"
+            )
+            self.connection.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS accidents_text USING fts5("
+                f"{', '.join(TEXT_COLUMNS)}, tokenize='porter unicode61')"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT)"
+            )
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM accidents").fetchone()[0]
+
+    def add(self, rows: Iterable[Tuple]):
+        """Indexes (id, year, country, narrative, probable cause) rows, replacing the stored."""
+        rows = list(rows)
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM accidents_text WHERE rowid = ?", [(row[0],) for row in rows]
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO accidents (id, year, country) VALUES (?, ?, ?)",
+                [row[:3] for row in rows]
+            )
+            self.connection.executemany(
+                "INSERT INTO accidents_text (rowid, narrative, probable_cause) VALUES (?, ?, ?)",
+                [(row[0],) + tuple(row[3:5]) for row in rows]
+            )
+
+    def remove(self, ids: Iterable[int]):
+        """Removes the accidents of the given ids from the index."""
+        rows = [(id_,) for id_ in ids]
+        with self.connection:
+            self.connection.executemany("DELETE FROM accidents_text WHERE rowid = ?", rows)
+            self.connection.executemany("DELETE FROM accidents WHERE id = ?", rows)
+
+    def search(self, query: str,
+               years: Tuple[int, int] = None,
+               country: str = None,
+               limit: int = None) -> List[int]:
+        """
+        Returns the ids of the accidents matching FTS5 query, most relevant first, within the
+        inclusive year range and the country, if given.
+        """
+        sql = (
+            "SELECT accidents_text.rowid FROM accidents_text "
+            "JOIN accidents ON accidents.id = accidents_text.rowid "
+            "WHERE accidents_text MATCH ?"
+        )
+        params = [query]
+        if years:
+            sql += " AND accidents.year BETWEEN ? AND ?"
+            params.extend([int(years[0]), int(years[1])])
+        if country:
+            sql += " AND accidents.country = ?"
+            params.append(country)
+        sql += " ORDER BY accidents_text.rank"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return [row[0] for row in self.connection.execute(sql, params)]
+
+    def get_state(self, name: str) -> str:
+        row = self.connection.execute(
+            "SELECT value FROM state WHERE name = ?", (name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, name: str, value: str):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO state (name, value) VALUES (?, ?)", (name, value)
+            )
+
+    def clear(self):
+        with self.connection:
+            for table in ('accidents', 'accidents_text', 'state'):
+                self.connection.execute(f"DELETE FROM {table}")
+
+    def optimize(self):
+        """Merges the index segments, run after indexing many rows."""
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO accidents_text (accidents_text) VALUES ('optimize')"
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+def index_accidents(cursor, text_index: TextIndex, condition: str = '', params: Tuple = (),
+                    chunksize: int = 1000) -> Tuple[int, object]:
+    """
+    Indexes the MySQL accidents matching the condition (e.g. "WHERE `year` = %s"), the rows
+    are fetched and indexed in chunks. Returns the number of indexed rows and the max update
+    time of the rows.
+    """
+    cursor.execute(f"{SELECT_ACCIDENTS} {condition}", params or None)
+    n_rows, max_updated_at = 0, None
+    while True:
+        rows = cursor.fetchmany(chunksize)
+        if not rows:
+            break
+        text_index.add(rows)
+        n_rows += len(rows)
+        for row in rows:
+            if row[5] is not None and (max_updated_at is None or row[5] > max_updated_at):
+                max_updated_at = row[5]
+    return n_rows, max_updated_at
+
+
+def update_text_index(cursor, text_index: TextIndex, rebuild: bool = False,
+                      chunksize: int = 1000) -> int:
+    """
+    Indexes the accidents updated since the previous run (all of them if `rebuild`), returns
+    the number of indexed rows.
+    """
+    if rebuild:
+        text_index.clear()
+
+    watermark = text_index.get_state('updated_at')
+    # the rows updated in the same second as the watermark are indexed again, which is safe
+    condition, params = ("WHERE `updated_at` >= %s", (watermark,)) if watermark else ('', ())
+    n_rows, max_updated_at = index_accidents(cursor, text_index, condition, params, chunksize)
+    if max_updated_at is not None:
+        text_index.set_state('updated_at', str(max_updated_at))
+    if n_rows:
+        text_index.optimize()
+    return n_rows
@@ -0,0 +1,243 @@
+"""
+Crawl time of the accidents spider against a local mock of the website.
+
+The mock server generates the database index, the year pages, the accident pages and the
+aircraft type pages from the recorded pages in "benchmarks/fixtures" (the accidents of a
+year share a small set of aircraft types). Every class of pages is served by a limited
+number of workers with a fixed service time: the requests above the workers wait (higher
+latency) and the requests above twice the workers are answered with "503 Service
+Unavailable", as an overloaded website would.
+
+The spider crawls the mock with:
+    - "current": the previous settings (AutoThrottle, one download slot, no priorities),
+    - "priorities": the previous settings with the request priorities of the spider,
+    - "adaptive": the project settings (priorities and adaptive concurrency per url class),
+each crawl in a new process, and the crawl time, items, error responses and the peak number
+of accidents waiting in memory for their aircraft type page are printed.
+
+Usage (from "accidents_extraction" directory):
+    python -m benchmarks.bench_crawl [--years 10] [--accidents 20] [--aircraft-types 30]
+"""
+import argparse
+import functools
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from typing import Dict
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, 'fixtures')
+
+# page class -> (workers, service time in seconds) of the mock server
+SERVER_CAPACITY = {
+    'index': (1, 0.02),
+    'year': (2, 0.05),
+    'accident': (4, 0.03),
+    'aircraft': (1, 0.03),
+}
+
+# settings of the crawls, over the project settings
+CRAWLS = {
+    'current': {
+        'AUTOTHROTTLE_ENABLED': True,
+        'ADAPTIVE_CONCURRENCY_ENABLED': False,
+        'CONCURRENT_REQUESTS': 16,
+    },
+    'priorities': {
+        'AUTOTHROTTLE_ENABLED': True,
+        'ADAPTIVE_CONCURRENCY_ENABLED': False,
+        'CONCURRENT_REQUESTS': 16,
+    },
+    'adaptive': {},
+}
+UNPRIORITISED_CRAWLS = {'current'}
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as infile:
+        return infile.read()
+
+
+class MockWebsite(object):
+    """Pages of the mock website: `years` years of `accidents` accidents each."""
+
+    def __init__(self, years: int, accidents: int, aircraft_types: int):
+        self.years = list(range(1990, 1990 + years))
+        self.accidents = accidents
+        self.aircraft_types = aircraft_types
+        self.year_list = read_fixture('year_list.html')
+        self.accident = read_fixture('accident.html')
+        self.aircraft_type = read_fixture('aircraft_type.html')
+
+    def page_class(self, path: str) -> str:
+        if 'Year=' in path:
+            return 'year'
+        if 'record.php' in path:
+            return 'accident'
+        if '/type/' in path:
+            return 'aircraft'
+        return 'index'
+
+    def index_page(self) -> str:
+        links = ' '.join(f'<a href="/database/dblist.php?Year={y}">{y}</a>' for y in self.years)
+        return (f'<html><body><div id="contentcolumn"><div><p></p><p></p><p>{links}</p>'
+                f'</div></div></body></html>')
+
+    def year_page(self, year: str) -> str:
+        rows = ''.join(
+            f'<tr class="list"><td class="list"><a href="/database/record.php?id={year}{i:04d}-0">'
+            f'{i}</a></td></tr>'
+            for i in range(self.accidents)
+        )
+        return re.sub(r'<tr class="list">.*</tr>', rows, self.year_list, flags=re.S)
+
+    def accident_page(self, record_id: str) -> str:
+        aircraft_type = zlib.crc32(record_id.encode()) % self.aircraft_types
+        return self.accident.replace('type.php?type=DC3', f'type.php?type=T{aircraft_type}')
+
+    def page(self, path: str) -> str:
+        page_class = self.page_class(path)
+        if page_class == 'year':
+            return self.year_page(re.search(r'Year=(\d{4})', path).group(1))
+        if page_class == 'accident':
+            return self.accident_page(re.search(r'id=([\w-]+)', path).group(1))
+        if page_class == 'aircraft':
+            return self.aircraft_type
+        return self.index_page()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    website: MockWebsite = None
+    lock = threading.Lock()
+    in_flight: Dict[str, int] = {}
+    workers: Dict[str, threading.Semaphore] = {}
+
+    def do_GET(self):
+        if self.path.startswith('/robots.txt'):
+            self.send_error(404)
+            return
+
+        page_class = self.website.page_class(self.path)
+        n_workers, service_secs = SERVER_CAPACITY[page_class]
+        with self.lock:
+            overloaded = self.in_flight.get(page_class, 0) >= 2 * n_workers
+            if not overloaded:
+                self.in_flight[page_class] = self.in_flight.get(page_class, 0) + 1
+        if overloaded:
+            self.send_error(503)
+            return
+
+        try:
+            with self.workers[page_class]:
+                time.sleep(service_secs)
+                body = self.website.page(self.path).encode('utf-8')
+        finally:
+            with self.lock:
+                self.in_flight[page_class] -= 1
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(website: MockWebsite) -> ThreadingHTTPServer:
+    MockHandler.website = website
+    for page_class, (n_workers, _) in SERVER_CAPACITY.items():
+        MockHandler.workers[page_class] = threading.Semaphore(n_workers)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_crawl(name: str, base_url: str) -> Dict:
+    """Crawls the mock website in this process, returns the crawl results."""
+    os.environ['SCRAPY_SETTINGS_MODULE'] = 'accidents_extraction.settings'
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    from accidents_extraction.spiders.accidents import AccidentsSpider
+
+    class UnprioritisedSpider(AccidentsSpider):
+        accident_priority = 0
+        aircraft_priority = 0
+
+    settings = get_project_settings()
+    settings.setdict(CRAWLS[name], priority='cmdline')
+    settings.setdict({
+        'ITEM_PIPELINES': {},
+        'ROBOTSTXT_OBEY': False,
+        'RESPONSE_CACHE_ENABLED': False,
+        'CRAWL_METRICS_ENABLED': False,
+        'AIRCRAFT_MODELS_CACHE': None,
+        'LOG_ENABLED': False,
+    }, priority='cmdline')
+
+    process = CrawlerProcess(settings)
+    logging.getLogger('scrapy').propagate = False
+    spider_cls = UnprioritisedSpider if name in UNPRIORITISED_CRAWLS else AccidentsSpider
+    crawler = process.create_crawler(spider_cls)
+    peak_pending = []
+
+    def spider_opened(spider):
+        # the root logger is configured by the crawler
+        logging.getLogger().setLevel(logging.WARNING)
+
+    def response_received(response, request, spider):
+        peak_pending.append(sum(len(a) for a in spider.pending_accidents.values()))
+
+    crawler.signals.connect(spider_opened, signal=signals.spider_opened)
+    crawler.signals.connect(response_received, signal=signals.response_received)
+    start = time.perf_counter()
+    process.crawl(crawler, base_url=base_url)
+    process.start()
+    stats = crawler.stats.get_stats()
+    return {
+        'seconds': time.perf_counter() - start,
+        'items': stats.get('item_scraped_count', 0),
+        'responses': stats.get('response_received_count', 0),
+        'errors': stats.get('downloader/response_status_count/503', 0),
+        'peak_pending': max(peak_pending, default=0),
+        # adaptive_concurrency/<host>/<url class>/concurrency
+        'slots': {key.split('/')[-2]: value for key, value in stats.items()
+                  if key.startswith('adaptive_concurrency/') and key.endswith('/concurrency')},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--accidents', type=int, default=20,
+                        help='The number of accidents per year.')
+    parser.add_argument('--aircraft-types', type=int, default=30)
+    parser.add_argument('--crawls', nargs='+', choices=list(CRAWLS), default=list(CRAWLS))
+    args = parser.parse_args()
+
+    server = start_server(MockWebsite(args.years, args.accidents, args.aircraft_types))
+    base_url = f'http://127.0.0.1:{server.server_address[1]}/database/'
+    print(f'{args.years} years x {args.accidents} accidents, '
+          f'{args.aircraft_types} aircraft types')
+    print(f'{"crawl":<12}{"time, s":>9}{"items":>7}{"responses":>11}{"503":>6}'
+          f'{"peak pending":>14}  final concurrency')
+    try:
+        for name in args.crawls:
+            # a reactor runs only once per process
+            with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as executor:
+                result = executor.submit(functools.partial(run_crawl, name, base_url)).result()
+            slots = ', '.join(f'{k} {v}' for k, v in sorted(result['slots'].items()))
+            print(f'{name:<12}{result["seconds"]:>9.1f}{result["items"]:>7}'
+                  f'{result["responses"]:>11}{result["errors"]:>6}'
+                  f'{result["peak_pending"]:>14}  {slots}')
+    finally:
+        server.shutdown()
@@ -0,0 +1,198 @@
+"""
+Micro-benchmark of the accident field parsers.
+
+Compares per-field parse cost of the previous spider implementation (string regex patterns,
+`time.strptime` / `datetime.strptime`) with `accidents_extraction.fields` over a corpus of
+field values as they appear on the accident pages, and checks that both give the same
+results.
+
+Usage (from "accidents_extraction" directory):
+    python -m benchmarks.bench_fields [--repeat 2000]
+"""
+import argparse
+import datetime
+import re
+import time
+import timeit
+from typing import Dict, Tuple
+
+import accidents_extraction.fields as fields
+
+CORPUS = {
+    'correct_str': [
+        'Boeing 737-2H4 ', 'Friday 2 August 1919', ' Fatalities: 0  /  Occupants: 4 ',
+        'Douglas C-47A-90-DL (DC-3)', 'Aérospatiale SA.330J Puma', 'Accident',
+        'near Verona  (Italy)', 'Fatalities: 14 / Occupants: 14', 'Destroyed', '',
+    ],
+    'parse_time': [
+        '14:30', 'c. 09:15', 'ca 16:00', '07:05', '23:59:59', '0:5', '24:00', 'ca. 13:00',
+        '', '12:30 UTC',
+    ],
+    'parse_date': [
+        'Friday 2 August 1919', 'Saturday 14 September 1968', 'xx Jun 1946',
+        'Monday 31 Dec 2018', 'xx xxx 1929', 'Sunday 7 May 2000', 'date unk.',
+        'Wednesday 23 January 1935', 'xx July 1955', 'Thursday 1 Sept 1983',
+    ],
+    'parse_phase': [
+        'En route (ENR)', 'Landing (LDG)', 'Takeoff (TOF)', '()', 'Unknown (UNK)', '(CMB)',
+        'Approach (APR)', 'Initial climb (ICL)', '', 'Standing (STD)',
+    ],
+    'parse_people_data': [
+        {
+            'Crew': 'Fatalities: 2 / Occupants: 2',
+            'Passengers': 'Fatalities: 0 / Occupants: 0',
+            'Total': 'Fatalities: 2 / Occupants: 2',
+            'Ground casualties': 'Fatalities: 1',
+        },
+        {
+            'Crew': 'Fatalities: 6 / Occupants: 6',
+            'Passengers': 'Fatalities: 104 / Occupants: 118',
+            'Total': 'Fatalities: 110 / Occupants: 124',
+        },
+        {
+            'Crew': 'Occupants: 3 / Fatalities: 0',
+            'Passengers': 'Occupants: / Fatalities: 0',
+            'Total': 'Fatalities: 0 / Occupants: 3',
+            'Ground casualties': 'None',
+        },
+    ],
+}
+
+
+# previous implementation of the AccidentsSpider static helpers
+def legacy_correct_str(x: str) -> str:
+    if not x:
+        return
+    x = x.replace('é', 'e')
+    x = x.encode("ascii", errors="ignore").decode()
+    x = re.sub(r' +', ' ', x.rstrip()).strip()
+    return x
+
+
+def legacy_parse_time(x: str) -> str:
+    if not x:
+        return
+
+    x = x.replace('ca', '').replace('c.', '').replace(' ', '')
+
+    if re.match(r'^(2[0-3]|[01]?[0-9]):([0-5]?[0-9])$', x):
+        return str(datetime.datetime.strptime(x, '%H:%M').time())
+    elif re.match(r'^(2[0-3]|[01]?[0-9]):([0-5]?[0-9]):([0-5]?[0-9])$', x):
+        return str(datetime.datetime.strptime(x, '%H:%M:%S').time())
+    else:
+        return
+
+
+def legacy_parse_date(x: str) -> Tuple:
+
+    def get_month(month_str: str) -> int:
+        if 'xx' in month_str.lower():
+            return
+
+        if len(month_str) == 3:
+            return time.strptime(month_str, "%b").tm_mon
+        else:
+            return time.strptime(month_str, "%B").tm_mon
+
+    x = x.split()
+    if len(x) == 3:
+        weekday, day, month, year = None, None, x[-2], x[-1]
+        try:
+            month, year = get_month(month), int(year)
+        except ValueError:
+            month, year = None, None
+    elif len(x) == 4:
+        [weekday, day, month, year] = x
+        try:
+            day, month, year = int(day), get_month(month), int(year)
+        except ValueError:
+            day, month, year = None, None, None
+    else:
+        weekday, day, month, year = None, None, None, None
+
+    return weekday, day, month, year
+
+
+def legacy_parse_phase(x: str) -> str:
+    if not x:
+        return 'Unknown'
+    elif x in ('()', '(CMB)', 'Unknown (UNK)'):
+        return 'Unknown'
+    else:
+        return x
+
+
+def legacy_parse_people_data(data: Dict) -> Dict:
+    output = {}
+    for name in ('Crew', 'Passengers', 'Total'):
+        try:
+            [data_1, data_2] = [x.strip() for x in data[name].split('/')]
+            if 'Occupants' in data_1 and 'Fatalities' in data_2:
+                occupants_data, fatalities_data = data_1, data_2
+            elif 'Occupants' in data_2 and 'Fatalities' in data_1:
+                occupants_data, fatalities_data = data_2, data_1
+            else:
+                occupants_data, fatalities_data = None, None
+        except ValueError:
+            occupants_data, fatalities_data = None, None
+
+        if not occupants_data and fatalities_data:
+            occupants, fatalities = None, None
+        else:
+            occupants = list(map(int, re.findall(r'\d+', occupants_data)))
+            occupants = (occupants[0:1] or (None,))[0]
+
+            fatalities = list(map(int, re.findall(r'\d+', fatalities_data)))
+            fatalities = (fatalities[0:1] or (None,))[0]
+
+        if fatalities and not occupants:
+            occupants = fatalities
+
+        output[f'{name.lower()}_occupants'] = occupants
+        output[f'{name.lower()}_fatalities'] = fatalities
+
+    ground_fatalities = data.get('Ground casualties')
+    if ground_fatalities:
+        if 'Fatalities' in ground_fatalities:
+            ground_fatalities = list(map(int, re.findall(r'\d+', ground_fatalities)))
+            ground_fatalities = (ground_fatalities[0:1] or (None,))[0]
+    output['ground_fatalities'] = ground_fatalities
+
+    return output
+
+
+PARSERS = {
+    'correct_str': (legacy_correct_str, fields.correct_str),
+    'parse_time': (legacy_parse_time, fields.parse_time),
+    'parse_date': (legacy_parse_date, fields.parse_date),
+    'parse_phase': (legacy_parse_phase, fields.parse_phase),
+    'parse_people_data': (legacy_parse_people_data, fields.parse_people_data),
+}
+
+
+def check_equivalence():
+    for name, (legacy, new) in PARSERS.items():
+        for value in CORPUS[name]:
+            assert legacy(value) == new(value), (name, value, legacy(value), new(value))
+
+
+def run(repeat: int):
+    print(f'{"field":<20}{"before, us":>12}{"after, us":>12}{"speedup":>10}')
+    for name, (legacy, new) in PARSERS.items():
+        corpus = CORPUS[name]
+        costs = []
+        for parser in (legacy, new):
+            seconds = min(timeit.repeat(
+                lambda: [parser(value) for value in corpus], number=repeat, repeat=3
+            ))
+            costs.append(seconds / (repeat * len(corpus)) * 1e6)
+        print(f'{name:<20}{costs[0]:>12.2f}{costs[1]:>12.2f}{costs[0] / costs[1]:>9.1f}x')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    check_equivalence()
+    run(args.repeat)
@@ -0,0 +1,250 @@
+"""
+Benchmark and regression check of the spider callbacks.
+
+Recorded pages from "benchmarks/fixtures" are loaded into `HtmlResponse` objects (a new
+response per call, so the html is parsed every time) and fed into the spider callbacks
+offline, including the item construction. Every callback is also run by the spiders with
+the previous field parsers (legacy helpers of "bench_fields"). For every callback it reports
+calls/sec, items/sec, the time relative to the legacy spiders, the memory blocks allocated
+per call (tracemalloc blocks alive with the callback outputs), peak traced memory and
+memory retained after the run (growing retained memory points to a leak, e.g. an unbounded
+cache).
+
+Results are compared with the stored baselines and the script exits with code 1 when a
+callback is slower relative to the legacy spiders, allocates more or uses more memory than
+its baseline by more than the tolerance. The relative time and the allocations do not
+depend on the speed of the machine, absolute calls/sec are only reported. Run with
+--update-baselines after an accepted performance change.
+
+Usage (from "accidents_extraction" directory):
+    python -m benchmarks.bench_parsers [--calls 300] [--tolerance 0.25] [--update-baselines]
+"""
+import argparse
+import copy
+import gc
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+import scrapy
+from scrapy.http import HtmlResponse
+
+from accidents_extraction.spiders.accidents import AccidentsSpider
+from accidents_extraction.spiders.aircraft import AircraftSpider
+from benchmarks import bench_fields
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, 'fixtures')
+BASELINES_PATH = os.path.join(BENCHMARKS_DIR, 'baselines.json')
+# interleaved timing rounds of a callback and of its legacy version
+ROUNDS = 7
+
+BASE_URL = 'https://aviation-safety.net/database/'
+YEAR_URL = f'{BASE_URL}dblist.php?Year=1968'
+ACCIDENT_URL = f'{BASE_URL}record.php?id=19680103-0'
+AIRCRAFT_TYPE_URL = f'{BASE_URL}type/type.php?type=DC3'
+AIRCRAFT_SPECS_URL = f'{BASE_URL}type/DC3/specs'
+
+
+def read_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as infile:
+        return infile.read()
+
+
+class Fixtures(object):
+    """Recorded pages, each call creates a fresh response."""
+
+    def __init__(self):
+        self.year_list = read_fixture('year_list.html')
+        self.accident = read_fixture('accident.html')
+        self.aircraft_type = read_fixture('aircraft_type.html')
+        self.aircraft_specs = read_fixture('aircraft_specs.html')
+
+    @staticmethod
+    def response(url: str, body: bytes, **meta) -> HtmlResponse:
+        request = scrapy.Request(url, meta=meta)
+        return HtmlResponse(url, body=body, encoding='utf-8', request=request)
+
+
+class LegacyAccidentsSpider(AccidentsSpider):
+    """The accidents spider with the previous field parsers."""
+    _correct_str = staticmethod(bench_fields.legacy_correct_str)
+    _parse_time = staticmethod(bench_fields.legacy_parse_time)
+    _parse_date = staticmethod(bench_fields.legacy_parse_date)
+    _parse_phase = staticmethod(bench_fields.legacy_parse_phase)
+    _parse_people_data = staticmethod(bench_fields.legacy_parse_people_data)
+
+
+class LegacyAircraftSpider(AircraftSpider):
+    """The aircraft spider with the previous field parsers."""
+    _correct_str = staticmethod(bench_fields.legacy_correct_str)
+
+
+def build_cases(fixtures: Fixtures, accidents_spider: AccidentsSpider,
+                aircraft_spider: AircraftSpider) -> Dict[str, Callable]:
+    """Returns callback name -> function running the callback once and returning outputs."""
+    accident_data, _ = accidents_spider._parse_accident_page(
+        fixtures.response(ACCIDENT_URL, fixtures.accident)
+    )
+
+    def reset_aircraft_cache():
+        accidents_spider.aircraft_models.clear()
+        accidents_spider.pending_accidents.clear()
+
+    def parse_accidents_for_year():
+        response = fixtures.response(YEAR_URL, fixtures.year_list)
+        return list(accidents_spider.parse_accidents_for_year(response))
+
+    def parse_accident():
+        reset_aircraft_cache()
+        return [accidents_spider.parse_accident(fixtures.response(ACCIDENT_URL, fixtures.accident))]
+
+    def parse_aircraft_data():
+        reset_aircraft_cache()
+        accidents_spider.pending_accidents[AIRCRAFT_TYPE_URL] = [copy.copy(accident_data)]
+        response = fixtures.response(
+            AIRCRAFT_TYPE_URL, fixtures.aircraft_type, aircraft_url=AIRCRAFT_TYPE_URL
+        )
+        return list(accidents_spider.parse_aircraft_data(response))
+
+    def accident_end_to_end():
+        reset_aircraft_cache()
+        request = accidents_spider.parse_accident(
+            fixtures.response(ACCIDENT_URL, fixtures.accident)
+        )
+        response = fixtures.response(request.url, fixtures.aircraft_type, **request.meta)
+        return list(request.callback(response))
+
+    def parse_aircraft_specs():
+        response = fixtures.response(AIRCRAFT_SPECS_URL, fixtures.aircraft_specs)
+        return list(aircraft_spider.parse_aircraft_specs(response))
+
+    return {
+        'parse_accidents_for_year': parse_accidents_for_year,
+        'parse_accident': parse_accident,
+        'parse_aircraft_data': parse_aircraft_data,
+        'accident_end_to_end': accident_end_to_end,
+        'parse_aircraft_specs': parse_aircraft_specs,
+    }
+
+
+def timed(run: Callable, calls: int) -> float:
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(calls):
+        run()
+    return time.perf_counter() - start
+
+
+def count_allocations(run: Callable, calls: int) -> float:
+    """Returns the memory blocks allocated per call and alive with the callback outputs."""
+    gc.collect()
+    outputs = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(calls):
+        outputs.append(run())
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocations = sum(
+        max(stat.count_diff, 0) for stat in after.compare_to(before, 'filename')
+    )
+    return allocations / calls
+
+
+def measure(run: Callable, legacy_run: Callable, calls: int) -> Dict[str, float]:
+    outputs = run()
+    legacy_run()
+    n_items = sum(isinstance(x, scrapy.Item) for x in outputs)
+
+    # median of interleaved runs, so that both implementations see the same machine load
+    durations, ratios = [], []
+    for _ in range(ROUNDS):
+        durations.append(timed(run, calls))
+        ratios.append(durations[-1] / timed(legacy_run, calls))
+    duration = statistics.median(durations)
+
+    gc.collect()
+    tracemalloc.start()
+    for _ in range(calls):
+        run()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'calls_per_sec': calls / duration,
+        'items_per_sec': calls * n_items / duration,
+        'relative_time': statistics.median(ratios),
+        'allocations_per_call': count_allocations(run, calls),
+        'peak_kib': peak / 1024,
+        'retained_kib': retained / 1024,
+    }
+
+
+def compare(name: str, result: Dict, baseline: Dict, tolerance: float):
+    """Returns the list of regressions of the result against the baseline."""
+    regressions = []
+    if result['relative_time'] > baseline['relative_time'] * (1 + tolerance):
+        regressions.append(
+            f'{name}: {result["relative_time"]:.2f} of the legacy time, '
+            f'baseline {baseline["relative_time"]:.2f}'
+        )
+    # small absolute values are dominated by noise
+    limits = {
+        'allocations_per_call': max(baseline['allocations_per_call'] * (1 + tolerance),
+                                    baseline['allocations_per_call'] + 16),
+    }
+    for metric in ('peak_kib', 'retained_kib'):
+        limits[metric] = max(baseline[metric] * (1 + tolerance), baseline[metric] + 64)
+    for metric, limit in limits.items():
+        if result[metric] > limit:
+            regressions.append(
+                f'{name}: {metric} {result[metric]:,.0f}, baseline {baseline[metric]:,.0f}'
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative slowdown / memory growth against baselines.')
+    parser.add_argument('--update-baselines', action='store_true')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH, 'r') as infile:
+            baselines = json.load(infile)
+
+    fixtures = Fixtures()
+    cases = build_cases(fixtures, AccidentsSpider(), AircraftSpider())
+    legacy_cases = build_cases(fixtures, LegacyAccidentsSpider(), LegacyAircraftSpider())
+
+    results, regressions = {}, []
+    print(f'{"callback":<26}{"calls/sec":>11}{"items/sec":>11}{"vs legacy":>11}'
+          f'{"allocs/call":>13}{"peak KiB":>10}{"retained KiB":>14}')
+    for name, run in cases.items():
+        result = results[name] = measure(run, legacy_cases[name], args.calls)
+        print(f'{name:<26}{result["calls_per_sec"]:>11,.0f}{result["items_per_sec"]:>11,.0f}'
+              f'{result["relative_time"]:>11.2f}{result["allocations_per_call"]:>13,.0f}'
+              f'{result["peak_kib"]:>10,.0f}{result["retained_kib"]:>14,.1f}')
+        if name in baselines and not args.update_baselines:
+            regressions.extend(compare(name, result, baselines[name], args.tolerance))
+
+    if args.update_baselines:
+        with open(BASELINES_PATH, 'w') as outfile:
+            json.dump(results, outfile, indent=2, sort_keys=True)
+        print(f'Baselines saved into {BASELINES_PATH}.')
+
+    if regressions:
+        print('Regressions:\n' + '\n'.join(regressions))
+        sys.exit(1)
@@ -0,0 +1,38 @@
+import argparse
+
+import mysql.connector
+
+import accidents_extraction.migrations as migrations
+from accidents_extraction.mysql_utils import connection_settings, table_columns
+from utils import read_json
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Completes the migration of the accidents table to the normalized schema: '
+                    'copies the values of the text columns (operator, country, phase, nature, '
+                    'aircraft damage) into the lookup tables and drops the text columns, once '
+                    'every value has its id.'
+    )
+    parser.add_argument('--db-config', required=True, help='Config json file for MySQL database.')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only prints the number of the rows without the ids of their values.')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    conx = mysql.connector.connect(**connection_settings(read_json(args.db_config)))
+    cursor = conx.cursor()
+    try:
+        migrations.normalize_accidents(cursor)
+        conx.commit()
+        for column in migrations.LOOKUP_COLUMNS:
+            if column in table_columns(cursor, 'accidents'):
+                print(f"'{column}': {migrations.count_unmapped(cursor, 'accidents', column)} "
+                      f"rows without id.")
+        if not args.dry_run:
+            migrations.drop_text_columns(cursor)
+    finally:
+        cursor.close()
+        conx.close()
@@ -0,0 +1,107 @@
+import argparse
+import logging
+import os
+
+from accidents_extraction.html_archive import HtmlArchive
+from accidents_extraction.pipelines import AccidentsExtractionPipeline, AircraftExtractionPipeline
+from accidents_extraction.reparse import ReparseEngine, load_aircraft_models
+from scrapy.exporters import JsonItemExporter
+from scrapy.settings import Settings
+
+from logger import logger
+from utils import read_json
+
+logging.getLogger('scrapy').propagate = False
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Parses the html pages archived by "scrapping_app.py --archive-dir" again '
+                    'and reloads the results, without downloading anything.'
+    )
+    parser.add_argument('--data-type', choices=['accident', 'aircraft'], required=True,
+                        help='Defines to parse "accident" or "aircraft" data.')
+    parser.add_argument('--archive-dir', required=True, help='The html archive directory.')
+    parser.add_argument('--output-type', choices=['mysql_db', 'json'], required=True)
+    parser.add_argument('--db-config', help='Config json file for MySQL database.')
+    parser.add_argument('--output-json-path',
+                        help='The output json path, if the output type is "json".')
+    parser.add_argument('--aircraft-models',
+                        help='Aircraft models cache json (see AIRCRAFT_MODELS_CACHE setting) '
+                             'used for the aircraft type pages missing in the archive.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='The number of parsing processes.')
+    parser.add_argument('--shard-size', type=int, default=64,
+                        help='The number of pages sent to a worker at once.')
+    return parser.parse_args()
+
+
+class JsonWriter(object):
+    """Minimal item pipeline counterpart writing items into json file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def open_spider(self, spider):
+        self.file = open(self.path, 'wb')
+        self.exporter = JsonItemExporter(self.file)
+        self.exporter.start_exporting()
+
+    def process_item(self, item, spider):
+        self.exporter.export_item(item)
+        return item
+
+    def close_spider(self, spider):
+        self.exporter.finish_exporting()
+        self.file.close()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    settings = Settings()
+    settings.setmodule('accidents_extraction.settings', priority='project')
+
+    if args.output_type == 'json':
+        if not args.output_json_path:
+            raise ValueError('Please provide output json path')
+        writer_cls = None
+    else:
+        if not args.db_config:
+            raise ValueError('Please provide db config file.')
+        writer_cls = (
+            AccidentsExtractionPipeline if args.data_type == 'accident'
+            else AircraftExtractionPipeline
+        )
+
+    archive = HtmlArchive(args.archive_dir)
+    aircraft_models = {}
+    if args.data_type == 'accident':
+        aircraft_models = load_aircraft_models(
+            archive, read_json(args.aircraft_models) if args.aircraft_models else None
+        )
+        logger.info(f'{len(aircraft_models)} aircraft models loaded.')
+
+    if writer_cls:
+        writer = writer_cls(
+            **read_json(args.db_config),
+            batch_size=settings.getint('DB_BATCH_SIZE', 1),
+        )
+    else:
+        writer = JsonWriter(args.output_json_path)
+
+    engine = ReparseEngine(
+        args.data_type,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        aircraft_models=aircraft_models,
+    )
+    writer.open_spider(None)
+    try:
+        for item in engine.run_archive(archive):
+            writer.process_item(item, None)
+    finally:
+        writer.close_spider(None)
+
+    for line in engine.report():
+        logger.info(line)
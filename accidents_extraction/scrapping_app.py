@@ -7,6 +7,7 @@ import accidents_extraction.spiders.aircraft as aircraft
 from scrapy.crawler import CrawlerProcess
 from scrapy.settings import Settings
 
+from accidents_extraction.mysql_utils import select_column_values
 from utils import read_json
 
 logging.getLogger('scrapy').propagate = False
@@ -16,10 +17,22 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--data-type', choices=['accident', 'aircraft'], required=True,
                         help='Defines to scrap "accident" or "aircraft" data.')
-    parser.add_argument('--output-type', choices=['mysql_db', 'json'], required=True)
+    parser.add_argument('--output-type', choices=['mysql_db', 'json', 'jsonl', 'parquet'],
+                        required=True)
     parser.add_argument('--db-config', help='Config json file for MySQL database.')
     parser.add_argument('--output-json-path',
-                        help='The output json path, if the output type is "json".')
+                        help='The output json path, if the output type is "json" or "jsonl".')
+    parser.add_argument('--output-dir',
+                        help='The output directory, if the output type is "parquet".')
+    parser.add_argument('--archive-dir',
+                        help='Directory for archiving the raw html pages, which can be parsed '
+                             'again offline with "reparse_app.py".')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Crawls again only the recent years and the accidents which are '
+                             'not stored yet. Only for "accident" data and "mysql_db" output.')
+    parser.add_argument('--recent-years', type=int, default=2,
+                        help='The number of recent years (including the current one) which '
+                             'are fully crawled again in incremental mode.')
     return parser.parse_args()
 
 
@@ -30,15 +43,35 @@ settings.setmodule(settings_module_path, priority='project')
 
 if __name__ == "__main__":
     args = parse_args()
-    if args.output_type == 'json':
+    if args.output_type in ('json', 'jsonl'):
         if not args.output_json_path:
             raise ValueError('Please provide output json path')
 
+        # the project settings (response cache, crawl metrics, adaptive concurrency) apply to
+        # the feed output too, "jsonlines" feed streams one item per line instead of one big
+        # json array
+        settings.set('FEED_FORMAT', 'json' if args.output_type == 'json' else 'jsonlines')
+        settings.set('FEED_URI', args.output_json_path)
+        if args.archive_dir:
+            settings.set('HTML_ARCHIVE_DIR', args.archive_dir)
         process = CrawlerProcess(
-            settings={
-                'FEED_FORMAT': 'json',
-                'FEED_URI': args.output_json_path
-            },
+            settings=settings
+        )
+
+    elif args.output_type == 'parquet':
+        if not args.output_dir:
+            raise ValueError('Please provide output directory.')
+
+        settings.set('PARQUET_OUTPUT_DIR', args.output_dir)
+        settings.set(
+            'ITEM_PIPELINES',
+            {'accidents_extraction.pipelines.ParquetExportPipeline': 300},
+            priority='cmdline',
+        )
+        if args.archive_dir:
+            settings.set('HTML_ARCHIVE_DIR', args.archive_dir)
+        process = CrawlerProcess(
+            settings=settings
         )
 
     else:
@@ -46,12 +79,30 @@ if __name__ == "__main__":
             raise ValueError('Please provide db config file.')
 
         settings.set('DB_SETTINGS', read_json(args.db_config))
+        if args.archive_dir:
+            settings.set('HTML_ARCHIVE_DIR', args.archive_dir)
         process = CrawlerProcess(
             settings=settings
         )
 
+    if args.incremental and args.data_type != 'accident':
+        raise ValueError('Incremental mode is supported only for "accident" data.')
+
     if args.data_type == 'accident':
-        process.crawl(accidents.AccidentsSpider)
+        if args.incremental:
+            if args.output_type != 'mysql_db':
+                raise ValueError('Incremental mode is supported only for "mysql_db" output.')
+            known_keys = select_column_values(
+                settings.getdict('DB_SETTINGS'), 'accidents', 'accident_key'
+            )
+            process.crawl(
+                accidents.AccidentsSpider,
+                incremental=True,
+                recent_years=args.recent_years,
+                known_keys=known_keys,
+            )
+        else:
+            process.crawl(accidents.AccidentsSpider)
     else:
         process.crawl(aircraft.AircraftSpider)
     process.start()  # the script will block here until the crawling is finished
@@ -0,0 +1,54 @@
+import argparse
+import time
+
+from accidents_extraction.mysql_utils import get_pool
+from accidents_extraction.text_index import TextIndex, update_text_index
+from utils import read_json
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Builds the local full-text index of the accident narratives and probable '
+                    'causes and searches it.'
+    )
+    parser.add_argument('--index-path', default='accidents_text.sqlite',
+                        help='The index SQLite file (see TEXT_INDEX_PATH setting).')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser(
+        'build', help='Indexes the accidents stored in MySQL database since the previous build.'
+    )
+    build.add_argument('--db-config', required=True, help='Config json file for MySQL database.')
+    build.add_argument('--rebuild', action='store_true', help='Indexes all accidents again.')
+    build.add_argument('--chunksize', type=int, default=1000,
+                       help='The number of accidents fetched and indexed at once.')
+
+    search = subparsers.add_parser('search', help='Prints the ids of the matching accidents.')
+    search.add_argument('query', help='FTS5 query, e.g. \'"engine failure" AND icing\'.')
+    search.add_argument('--years', type=int, nargs=2, metavar=('FROM', 'TO'),
+                        help='The inclusive range of the accident years.')
+    search.add_argument('--country', help='The accident country.')
+    search.add_argument('--limit', type=int, help='The maximal number of accidents.')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    text_index = TextIndex(args.index_path)
+    try:
+        start = time.perf_counter()
+        if args.command == 'build':
+            with get_pool(read_json(args.db_config)).connection() as cnx:
+                cursor = cnx.cursor()
+                try:
+                    n_rows = update_text_index(cursor, text_index, args.rebuild, args.chunksize)
+                finally:
+                    cursor.close()
+            print(f'{n_rows} accidents indexed in {time.perf_counter() - start:.1f} s, '
+                  f'{len(text_index)} accidents in {args.index_path}.')
+        else:
+            ids = text_index.search(args.query, args.years, args.country, args.limit)
+            print(' '.join(map(str, ids)))
+            print(f'{len(ids)} accidents found in {(time.perf_counter() - start) * 1e3:.1f} ms.')
+    finally:
+        text_index.close()